@@ -1,46 +1,38 @@
+import argparse
 import os
-import sqlite3
-import numpy as np
 import json
 from pathlib import Path
-from project.processor import DocumentProcessor
 from project.pydantic_models import ProcessingConfig
+from project.chunk_store import ChunkStore
+from project.records import chunk_dicts
+from project.milvus import MilvusVectorStore
+from project.text_codec import compact_text
 
 DATA_DIR = r"D:\genai\RAG\test"
-BATCH_SIZE = 20
 NDJSON_FILE = r"chunks_bulk.ndjson"
 SQLITE_DB = r"rag_chunks.db"
+# Per-file budgets; files over them are killed and quarantined
+FILE_TIMEOUT_SECONDS = 300
+FILE_MAX_RSS_MB = 4096
+# Set PROFILE_DIR to keep cProfile (and tracemalloc) output of the slowest files
+PROFILE_DIR = None
+PROFILE_SLOWEST = 5
+TRACE_MEMORY = False
+# Memory replicas to load the collection with once ingest is finalized
+REPLICA_NUMBER = 1
+# Compress SQLite chunk text with per-content-type zstd dictionaries after ingest
+# (needs 'zstandard'; see text_codec.py)
+COMPRESS_TEXT = False
 
 def get_all_files(directory, extensions=None):
     extensions = extensions or [".json", ".txt", ".csv", ".tsv"]
     return [str(p) for p in Path(directory).rglob("*") if p.suffix.lower() in extensions]
 
 def convert_chunks_to_dicts(document, chunks):
-    dicts = []
-    for i, chunk in enumerate(chunks):
-        dicts.append({
-            "chunk_id": f"{document.id}_chunk_{i}",
-            "doc_id": document.id,  # always use doc_id!
-            "chunk_index": i,
-            "chunk_text": chunk.content,
-            "chunk_size": len(chunk.content),
-            "chunk_tokens": len(chunk.content.split()),
-            "chunk_method": getattr(chunk, "chunking_method", "recursive").value if hasattr(getattr(chunk, "chunking_method", "recursive"), "value") else str(getattr(chunk, "chunking_method", "recursive")),
-            "chunk_overlap": 50,
-            "start_position": None,
-            "end_position": None,
-            "domain": getattr(document, "domain", "general"),
-            "content_type": getattr(document, "file_type", "unknown").value if hasattr(getattr(document, "file_type", "unknown"), "value") else str(getattr(document, "file_type", "unknown")),
-            "embedding_model": "sentence-transformers/all-mpnet-base-v2",
-            "vector_id": None,
-            "embedding_timestamp": None,
-            "created_at": None,
-            "embedding_vector": chunk.embedding
-        })
-    return dicts
+    return chunk_dicts(document, chunks)
 
-def append_ndjson(chunk_dicts, path):
-    with open(path, "a", encoding="utf-8") as f:
+def append_ndjson(chunk_dicts, path, sync=False):
+    with open(path, "a", encoding="utf-8", newline="\n") as f:
         for chunk in chunk_dicts:
             out = {k: chunk[k] for k in [
                 "chunk_id", "doc_id", "chunk_index", "chunk_text", "chunk_size",
@@ -50,55 +42,83 @@ def append_ndjson(chunk_dicts, path):
                 "created_at", "embedding_vector"
             ]}
             f.write(json.dumps(out) + "\n")
+        if sync:
+            # Lines must be on disk before the checkpoint that covers them
+            f.flush()
+            os.fsync(f.fileno())
 
-def bulk_insert_sqlite_chunks(chunk_dicts, db_path=SQLITE_DB):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    chunk_rows = []
-    for chunk in chunk_dicts:
-        chunk_rows.append((
-            chunk['chunk_id'], chunk['doc_id'], chunk['chunk_index'],
-            chunk['chunk_text'], chunk['chunk_size'], chunk['chunk_tokens'],
-            chunk['chunk_method'], chunk['chunk_overlap'],
-            chunk.get('start_position'), chunk.get('end_position'),
-            chunk['domain'], chunk['content_type'], chunk['embedding_model'],
-            np.array(chunk['embedding_vector'], dtype='float32').tobytes(),
-            chunk.get('vector_id'), chunk.get('embedding_timestamp'),
-            chunk.get('created_at')
-        ))
-    cur.executemany("""INSERT OR IGNORE INTO chunks (
-        chunk_id, doc_id, chunk_index, chunk_text, chunk_size, chunk_tokens,
-        chunk_method, chunk_overlap, start_position, end_position, domain,
-        content_type, embedding_model, embedding_vector, vector_id,
-        embedding_timestamp, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        chunk_rows)
-    conn.commit()
-    conn.close()
-    print(f"Inserted {len(chunk_rows)} chunks into SQLite.")
+def bulk_insert_sqlite_chunks(chunk_dicts, db_path=SQLITE_DB, store=None):
+    if store is not None:
+        return store.insert_chunks(chunk_dicts)
+    with ChunkStore(db_path) as store:
+        return store.insert_chunks(chunk_dicts)
+
+def _budget_kwargs():
+    return dict(timeout=FILE_TIMEOUT_SECONDS, max_rss_mb=FILE_MAX_RSS_MB, profile_dir=PROFILE_DIR,
+                profile_slowest=PROFILE_SLOWEST, trace_memory=TRACE_MEMORY)
+
+def main(argv=None):
+    """Ingest DATA_DIR; resumable, optionally split across several workers/nodes.
+
+    Single node (default) writes SQLITE_DB and NDJSON_FILE directly and
+    resumes from its checkpoints after a crash. Distributed runs give each
+    worker its own output under OUTPUT_DIR, sharded by stable hash
+    (--shard i/n) or leased from a shared queue (--enqueue, then --queue on
+    every worker); --merge folds the outputs into SQLITE_DB and NDJSON_FILE.
+    """
+    from project.distributed_ingest import (
+        IngestWorker, IngestCoordinator, WorkQueue, default_worker_id, file_key, QUEUE_DB, OUTPUT_DIR
+    )
+    parser = argparse.ArgumentParser(description="Bulk ingest into SQLite, NDJSON and Milvus")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--shard", help="static hash shard as index/count, e.g. 0/4")
+    parser.add_argument("--queue", nargs="?", const=QUEUE_DB, help="lease files from a shared queue DB")
+    parser.add_argument("--enqueue", action="store_true", help="add DATA_DIR files to the queue and exit")
+    parser.add_argument("--merge", action="store_true", help="merge worker outputs and exit")
+    parser.add_argument("--worker-id", help="defaults to the host name (plus shard index)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    if args.enqueue:
+        queue = WorkQueue(args.queue or QUEUE_DB)
+        IngestCoordinator.enqueue(queue, args.data_dir)
+        queue.close()
+        return
+    if args.merge:
+        IngestCoordinator(args.output_dir, SQLITE_DB, NDJSON_FILE).merge()
+        # One flush + compaction + index barrier once every worker is done
+        MilvusVectorStore.finalize_ingest(replica_number=REPLICA_NUMBER)
+        if COMPRESS_TEXT:
+            compact_text(SQLITE_DB, vacuum=True)
+        return
 
-def main():
-    if os.path.exists(NDJSON_FILE):
-        os.remove(NDJSON_FILE)
     config = ProcessingConfig()
-    processor = DocumentProcessor(config)
-    file_list = get_all_files(DATA_DIR)
-    print(f"Found {len(file_list)} files.")
-    for batch_start in range(0, len(file_list), BATCH_SIZE):
-        batch_files = file_list[batch_start:batch_start+BATCH_SIZE]
-        all_chunk_dicts = []
-        for file_path in batch_files:
-            print(f"Processing {file_path}")
-            try:
-                document, chunks = processor.process_document(file_path)
-                chunk_dicts = convert_chunks_to_dicts(document, chunks)
-                all_chunk_dicts.extend(chunk_dicts)
-            except Exception as e:
-                print(f"Error: {e} for {file_path}")
-        if all_chunk_dicts:
-            append_ndjson(all_chunk_dicts, NDJSON_FILE)
-            bulk_insert_sqlite_chunks(all_chunk_dicts, db_path=SQLITE_DB)
-        print(f"Batch: {batch_start//BATCH_SIZE + 1} processed.")
-    print("All batches processed. NDJSON ready for Milvus.")
+    if args.shard or args.queue:
+        index = int(args.shard.split("/")[0]) if args.shard else None
+        worker = IngestWorker(args.worker_id or default_worker_id(index), args.data_dir, args.output_dir,
+                              config=config, **_budget_kwargs())
+    else:
+        worker = IngestWorker(args.worker_id or "local", args.data_dir, db_path=SQLITE_DB,
+                              ndjson_path=NDJSON_FILE, config=config, **_budget_kwargs())
+    try:
+        if args.queue:
+            queue = WorkQueue(args.queue)
+            worker.run_queue(queue)
+            queue.close()
+        else:
+            keys = [file_key(path, args.data_dir) for path in get_all_files(args.data_dir)]
+            print(f"Found {len(keys)} files.")
+            index, count = map(int, args.shard.split("/")) if args.shard else (0, 1)
+            worker.run_files(keys, index, count)
+    finally:
+        worker.close()
+    print(f"{worker.processed} files processed this run.")
+    if not (args.shard or args.queue):
+        # One flush + compaction + index barrier for the whole run
+        MilvusVectorStore.finalize_ingest(replica_number=REPLICA_NUMBER)
+        if COMPRESS_TEXT:
+            compact_text(SQLITE_DB, vacuum=True)
+        print("All files processed. NDJSON ready for Milvus.")
 
 if __name__ == "__main__":
     main()
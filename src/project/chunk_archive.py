@@ -0,0 +1,190 @@
+import json
+import os
+import struct
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Union, Tuple
+from project.pydantic_models import Chunk, ChunkingMethod
+from project.records import ChunkRecord
+from project.compression import compress, decompress
+
+ARCHIVE_FORMAT = 1
+BLOCK_HEADER = struct.Struct("<II")  # payload length, record count
+
+def _to_record(chunk: Union[Chunk, ChunkRecord]) -> Dict[str, Any]:
+    method = chunk.chunking_method
+    return {
+        "id": chunk.id,
+        "doc_id": chunk.doc_id,
+        "content": chunk.content,
+        "chunk_index": chunk.chunk_index,
+        "chunking_method": method.value if hasattr(method, "value") else str(method),
+        "metadata": chunk.metadata,
+        "embedding": chunk.embedding,
+    }
+
+def _from_record(record: Dict[str, Any]) -> ChunkRecord:
+    return ChunkRecord(
+        id=record["id"],
+        doc_id=record["doc_id"],
+        content=record["content"],
+        chunk_index=record["chunk_index"],
+        chunking_method=ChunkingMethod(record["chunking_method"]),
+        extra=record.get("metadata") or None,
+        embedding=record.get("embedding")
+    )
+
+class ChunkArchiveWriter:
+    """Append-only chunk archive: blocks of JSON lines, optionally compressed per block.
+
+    A sidecar `<archive>.idx` (JSON lines) records every block's offset and
+    the chunk_id/doc_id of its records, so readers can seek to one chunk.
+    Reopening an archive cuts off whatever an interrupted write left after
+    the last indexed block, so appended blocks stay readable.
+    """
+
+    def __init__(self, path: str, codec: str = "none", block_size: int = 256):
+        self.path = Path(path)
+        self.index_path = Path(f"{path}.idx")
+        self.block_size = block_size
+        if self.index_path.exists():
+            # Appending must keep the codec the archive was created with
+            self.codec = self._truncate_torn_tail()
+        else:
+            self.codec = codec
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"format": ARCHIVE_FORMAT, "codec": codec}) + "\n")
+        self._data = open(self.path, 'ab')
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        self._pending: List[Dict[str, Any]] = []
+        self.written = 0
+
+    def _truncate_torn_tail(self) -> str:
+        """Trim both files back to the last block the index records; returns the codec"""
+        with open(self.index_path, 'rb') as f:
+            header = f.readline()
+            index_end, data_end = f.tell(), 0
+            for line in f:
+                try:
+                    block = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    block = None
+                if block is None:
+                    break
+                index_end += len(line)
+                data_end = block["offset"] + BLOCK_HEADER.size + block["length"]
+        if self.index_path.stat().st_size > index_end:
+            print(f"Dropping a torn index entry from {self.index_path}")
+            os.truncate(self.index_path, index_end)
+        if self.path.exists() and self.path.stat().st_size > data_end:
+            print(f"Dropping {self.path.stat().st_size - data_end} unindexed bytes from {self.path}")
+            os.truncate(self.path, data_end)
+        return json.loads(header)["codec"]
+
+    def append(self, chunk: Union[Chunk, ChunkRecord]):
+        self._pending.append(_to_record(chunk))
+        if len(self._pending) >= self.block_size:
+            self.flush()
+
+    def extend(self, chunks):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def flush(self):
+        if not self._pending:
+            return
+        raw = "\n".join(json.dumps(r, ensure_ascii=False) for r in self._pending).encode("utf-8")
+        payload = compress(raw, self.codec)
+        offset = self._data.tell()
+        self._data.write(BLOCK_HEADER.pack(len(payload), len(self._pending)))
+        self._data.write(payload)
+        self._data.flush()
+        # Index entry only after the block is on disk
+        self._index.write(json.dumps({
+            "offset": offset,
+            "length": len(payload),
+            "records": [[r["id"], r["doc_id"]] for r in self._pending],
+        }) + "\n")
+        self._index.flush()
+        self.written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ChunkArchiveReader:
+    """Lazy reader: iterate blocks sequentially or seek to single chunks via the index"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.index_path = Path(f"{path}.idx")
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            self.codec = json.loads(f.readline())["codec"]
+        self._by_chunk: Optional[Dict[str, Tuple[int, int, int]]] = None
+        self._by_doc: Optional[Dict[str, List[str]]] = None
+
+    def _load_index(self):
+        if self._by_chunk is not None:
+            return
+        self._by_chunk, self._by_doc = {}, {}
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                block = json.loads(line)
+                for position, (chunk_id, doc_id) in enumerate(block["records"]):
+                    self._by_chunk[chunk_id] = (block["offset"], block["length"], position)
+                    self._by_doc.setdefault(doc_id, []).append(chunk_id)
+
+    def _read_block(self, f, offset: int, length: int) -> List[str]:
+        f.seek(offset + BLOCK_HEADER.size)
+        return decompress(f.read(length), self.codec).decode("utf-8").split("\n")
+
+    def __iter__(self) -> Iterator[ChunkRecord]:
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    return
+                length, _count = BLOCK_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return  # truncated tail from an interrupted write
+                for line in decompress(payload, self.codec).decode("utf-8").split("\n"):
+                    yield _from_record(json.loads(line))
+
+    def get(self, chunk_id: str) -> Optional[ChunkRecord]:
+        self._load_index()
+        location = self._by_chunk.get(chunk_id)
+        if location is None:
+            return None
+        offset, length, position = location
+        with open(self.path, 'rb') as f:
+            return _from_record(json.loads(self._read_block(f, offset, length)[position]))
+
+    def iter_document(self, doc_id: str) -> Iterator[ChunkRecord]:
+        """Chunks of one document, reading each needed block once"""
+        self._load_index()
+        blocks: Dict[Tuple[int, int], List[int]] = {}
+        for chunk_id in self._by_doc.get(doc_id, []):
+            offset, length, position = self._by_chunk[chunk_id]
+            blocks.setdefault((offset, length), []).append(position)
+        with open(self.path, 'rb') as f:
+            for (offset, length), positions in sorted(blocks.items()):
+                lines = self._read_block(f, offset, length)
+                for position in positions:
+                    yield _from_record(json.loads(lines[position]))
+
+    def chunk_ids(self) -> List[str]:
+        self._load_index()
+        return list(self._by_chunk)
+
+    def doc_ids(self) -> List[str]:
+        self._load_index()
+        return list(self._by_doc)
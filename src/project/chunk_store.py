@@ -0,0 +1,559 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+import numpy as np
+from project.pydantic_models import Document
+from project.sqlite_steup import create_tables
+
+SQLITE_DB = r"rag_chunks.db"
+
+CHUNK_COLUMNS = [
+    "chunk_id", "doc_id", "chunk_index", "chunk_text", "chunk_size", "chunk_tokens",
+    "chunk_method", "chunk_overlap", "start_position", "end_position", "domain",
+    "content_type", "embedding_model", "embedding_vector", "vector_id",
+    "embedding_timestamp", "created_at"
+]
+
+HYDRATE_COLUMNS = [
+    "chunk_id", "doc_id", "chunk_index", "chunk_text", "chunk_size", "chunk_tokens",
+    "chunk_method", "domain", "content_type", "embedding_model"
+]
+
+# Compressed chunk_text (see text_codec.py); selected after the columns above, never returned
+TEXT_Z_COLUMNS = ["chunk_text_z", "text_dict_id"]
+
+class ChunkStore:
+    """SQLite chunk store with one persistent writer and per-thread readers.
+
+    WAL mode lets lookups run while ingest is writing; writes are grouped
+    into explicit transactions of `batch_size` rows. Chunk text is
+    compressed on write once its content_type has a trained dictionary and
+    decompressed on read (ChunkTextCodec); callers always see plain text.
+    """
+
+    def __init__(self, db_path: str = SQLITE_DB, batch_size: int = 5000,
+                 cache_size_mb: int = 64, mmap_size_mb: int = 256):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        # Every reader handed out, whichever thread owns it, so close() reaches them all
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        create_tables(self._writer)
+        from project.text_codec import ChunkTextCodec
+        self.codec = ChunkTextCodec(self)
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            # Safe with WAL: a crash can lose the last commit, never corrupt the DB
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_mb * 1024}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size_mb * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Read-only connection owned by the calling thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect(readonly=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    _INSERT_CHUNKS = (
+        f"INSERT OR IGNORE INTO chunks ({', '.join(CHUNK_COLUMNS + TEXT_Z_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in CHUNK_COLUMNS + TEXT_Z_COLUMNS)})"
+    )
+
+    def insert_chunks(self, chunk_dicts: List[Dict[str, Any]]) -> int:
+        """Insert chunk dicts (bulk_upload format) in batched transactions"""
+        sql = self._INSERT_CHUNKS
+        inserted = 0
+        with self._write_lock:
+            for i in range(0, len(chunk_dicts), self.batch_size):
+                rows = [self._chunk_row(chunk) for chunk in chunk_dicts[i:i + self.batch_size]]
+                with self._writer:
+                    cur = self._writer.executemany(sql, rows)
+                inserted += cur.rowcount
+        print(f"Inserted {inserted} chunks into SQLite.")
+        return inserted
+
+    def _chunk_row(self, chunk: Dict[str, Any]) -> tuple:
+        vector = chunk.get("embedding_vector")
+        text, text_z, dict_id = self.codec.encode(chunk['chunk_text'], chunk['content_type'])
+        return (
+            chunk['chunk_id'], chunk['doc_id'], chunk['chunk_index'],
+            text, chunk['chunk_size'], chunk['chunk_tokens'],
+            chunk['chunk_method'], chunk['chunk_overlap'],
+            chunk.get('start_position'), chunk.get('end_position'),
+            chunk['domain'], chunk['content_type'], chunk['embedding_model'],
+            np.asarray(vector, dtype='float32').tobytes() if vector is not None else None,
+            chunk.get('vector_id'), chunk.get('embedding_timestamp'),
+            chunk.get('created_at'), text_z, dict_id
+        )
+
+    def _decoded(self, columns: List[str], row: tuple) -> Dict[str, Any]:
+        """Row selected as `columns + TEXT_Z_COLUMNS` as a dict with plain chunk_text"""
+        record = dict(zip(columns, row))
+        text_z, dict_id = row[len(columns):]
+        if text_z is not None:
+            record["chunk_text"] = self.codec.decode(text_z, dict_id)
+        return record
+
+    def sample_texts(self, limit: int, content_type: Optional[str] = None) -> List[str]:
+        """Random chunk texts (e.g. for dictionary training or benchmark queries)"""
+        where = "WHERE content_type = ?" if content_type is not None else ""
+        rows = self.reader().execute(
+            f"SELECT chunk_text, {', '.join(TEXT_Z_COLUMNS)} FROM chunks {where} ORDER BY RANDOM() LIMIT ?",
+            ([content_type] if content_type is not None else []) + [limit]
+        ).fetchall()
+        return [self._decoded(["chunk_text"], row)["chunk_text"] for row in rows]
+
+    @staticmethod
+    def _document_row(document: Document, source_path: str, domain: str, status: str,
+                      error_message: Optional[str]) -> Dict[str, Any]:
+        path = Path(source_path)
+        content = document.content
+        total_words = len(content.split())
+        now = datetime.now().isoformat()
+        return {
+            "doc_id": document.id,
+            "source_path": str(path),
+            "filename": path.name,
+            "file_extension": path.suffix.lower().lstrip("."),
+            "file_size": os.path.getsize(path) if path.exists() else 0,
+            "domain": domain,
+            "content_type": document.file_type.value,
+            "processing_status": status,
+            "error_message": error_message,
+            "total_chars": len(content),
+            "total_words": total_words,
+            "estimated_tokens": int(total_words * 1.3),
+            "domain_metadata": json.dumps(document.metadata, default=str),
+            "last_processed": now,
+            "updated_at": now,
+        }
+
+    @staticmethod
+    def _upsert_document_row(conn: sqlite3.Connection, row: Dict[str, Any]):
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{k}" for k in row)
+        updates = ", ".join(f"{k}=excluded.{k}" for k in row if k != "doc_id")
+        conn.execute(
+            f"INSERT INTO documents ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT(doc_id) DO UPDATE SET {updates}",
+            row
+        )
+
+    def upsert_document(self, document: Document, source_path: str, domain: str = "general",
+                        status: str = "processed", error_message: Optional[str] = None):
+        """Record (or refresh) the documents row for an ingested file"""
+        row = self._document_row(document, source_path, domain, status, error_message)
+        with self._write_lock, self._writer:
+            self._upsert_document_row(self._writer, row)
+
+    def checkpoint_file(self, file_key: str, worker_id: str, ndjson_offset: int,
+                        document: Optional[Document] = None, source_path: str = None,
+                        chunk_dicts: List[Dict[str, Any]] = (), status: str = "done"):
+        """Commit a file's chunks, document row and checkpoint in one transaction.
+
+        `ndjson_offset` is the NDJSON size after this file's lines; a resumed
+        run truncates the NDJSON back to the last committed offset.
+        """
+        with self.transaction() as conn:
+            if chunk_dicts:
+                conn.executemany(self._INSERT_CHUNKS, [self._chunk_row(chunk) for chunk in chunk_dicts])
+            if document is not None:
+                self._upsert_document_row(
+                    conn, self._document_row(document, source_path, document.domain, "processed", None)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_checkpoints "
+                "(file_key, doc_id, chunk_count, status, ndjson_offset, worker_id, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_key, document.id if document is not None else None, len(chunk_dicts), status,
+                 ndjson_offset, worker_id, datetime.now().isoformat())
+            )
+
+    def checkpoints(self) -> Dict[str, str]:
+        """file_key -> status of every checkpointed file"""
+        return dict(self.reader().execute("SELECT file_key, status FROM ingest_checkpoints"))
+
+    def ndjson_checkpoint(self, worker_id: str) -> int:
+        """NDJSON size after the last file this worker committed"""
+        row = self.reader().execute(
+            "SELECT MAX(ndjson_offset) FROM ingest_checkpoints WHERE worker_id = ?", (worker_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def merge_from(self, db_path: str) -> Dict[str, int]:
+        """Fold another store (e.g. one ingest worker's output) into this one"""
+        counts = {}
+        chunk_columns = ", ".join(CHUNK_COLUMNS + ["chunk_text_z"])
+        with self._write_lock:
+            self._writer.execute("ATTACH DATABASE ? AS src", (str(db_path),))
+            try:
+                with self._writer:
+                    # Dictionary ids are per DB: copy the source's dictionaries and remap.
+                    # They go below main's versions, so main's newest stays the one writes use.
+                    dict_ids = {None: None}
+                    for dict_id, content_type, level, sample_count, dict_hash, data in self._writer.execute(
+                        "SELECT dict_id, content_type, level, sample_count, dict_hash, dict_data FROM src.zstd_dicts"
+                    ).fetchall():
+                        self._writer.execute(
+                            "INSERT OR IGNORE INTO main.zstd_dicts "
+                            "(content_type, version, level, sample_count, dict_hash, dict_data) "
+                            "SELECT ?, COALESCE(MIN(version), 1) - 1, ?, ?, ?, ? FROM main.zstd_dicts "
+                            "WHERE content_type = ?",
+                            (content_type, level, sample_count, dict_hash, data, content_type)
+                        )
+                        dict_ids[dict_id] = self._writer.execute(
+                            "SELECT dict_id FROM main.zstd_dicts WHERE dict_hash = ?", (dict_hash,)
+                        ).fetchone()[0]
+                    counts["chunks"] = 0
+                    for src_id, main_id in dict_ids.items():
+                        cur = self._writer.execute(
+                            f"INSERT OR IGNORE INTO main.chunks ({chunk_columns}, text_dict_id) "
+                            f"SELECT {chunk_columns}, ? FROM src.chunks WHERE text_dict_id IS ?",
+                            (main_id, src_id)
+                        )
+                        counts["chunks"] += cur.rowcount
+                    for table in ("documents", "quarantine", "ingest_checkpoints", "ingest_attempts"):
+                        # By name: an older source DB can have another column order or fewer columns
+                        src_columns = {row[1] for row in self._writer.execute(f"PRAGMA src.table_info({table})")}
+                        columns = ", ".join(
+                            row[1] for row in self._writer.execute(f"PRAGMA main.table_info({table})")
+                            if row[1] in src_columns
+                        )
+                        if not columns:
+                            counts[table] = 0
+                            continue
+                        cur = self._writer.execute(
+                            f"INSERT OR REPLACE INTO main.{table} ({columns}) SELECT {columns} FROM src.{table}"
+                        )
+                        counts[table] = cur.rowcount
+            finally:
+                self._writer.execute("DETACH DATABASE src")
+        if len(dict_ids) > 1:
+            self.codec.reload()
+        return counts
+
+    @contextmanager
+    def transaction(self):
+        """Writer connection inside one transaction (committed on exit)"""
+        with self._write_lock, self._writer:
+            yield self._writer
+
+    def get_chunks(self, chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Chunk text and scalar metadata (no vectors) keyed by chunk_id"""
+        ids = list(dict.fromkeys(chunk_ids))
+        found = {}
+        # Stay below SQLite's bound-parameter limit on very large id lists
+        for i in range(0, len(ids), 900):
+            part = ids[i:i + 900]
+            placeholders = ", ".join("?" for _ in part)
+            cur = self.reader().execute(
+                f"SELECT {', '.join(HYDRATE_COLUMNS + TEXT_Z_COLUMNS)} FROM chunks "
+                f"WHERE chunk_id IN ({placeholders})",
+                part
+            )
+            for row in cur:
+                found[row[0]] = self._decoded(HYDRATE_COLUMNS, row)
+        return found
+
+    def get_windows(self, windows: List[tuple]) -> List[Dict[str, Any]]:
+        """Chunks for (doc_id, first_index, last_index) windows in one query per 300 windows.
+
+        Served by the (doc_id, chunk_index) index.
+        """
+        rows = []
+        for i in range(0, len(windows), 300):
+            part = windows[i:i + 300]
+            where = " OR ".join("(doc_id = ? AND chunk_index BETWEEN ? AND ?)" for _ in part)
+            params = [value for window in part for value in window]
+            cur = self.reader().execute(
+                f"SELECT {', '.join(HYDRATE_COLUMNS + TEXT_Z_COLUMNS)} FROM chunks WHERE {where}", params
+            )
+            rows.extend(self._decoded(HYDRATE_COLUMNS, row) for row in cur)
+        return rows
+
+    def documents_for_path(self, source_path: str, include_children: bool = False) -> List[Dict[str, Any]]:
+        """doc_id/domain of documents ingested from a path (or anything below it)"""
+        path = str(Path(source_path))
+        sql = "SELECT doc_id, domain FROM documents WHERE source_path = ?"
+        params = [path]
+        if include_children:
+            # Exact, case-sensitive prefix; LIKE would treat _ and % in the path as wildcards
+            prefix = path.rstrip(os.sep) + os.sep
+            sql += " OR substr(source_path, 1, ?) = ?"
+            params.extend([len(prefix), prefix])
+        rows = self.reader().execute(sql, params).fetchall()
+        return [{"doc_id": doc_id, "domain": domain} for doc_id, domain in rows]
+
+    def processed_paths(self) -> Dict[str, str]:
+        """source_path -> last_processed for successfully ingested documents"""
+        rows = self.reader().execute(
+            "SELECT source_path, MAX(last_processed) FROM documents "
+            "WHERE processing_status = 'processed' GROUP BY source_path"
+        ).fetchall()
+        return dict(rows)
+
+    def clear_dedup(self, domain: str = None):
+        """Forget dedup fingerprints, buckets, duplicate links and stats (of one domain, or all).
+
+        For when the Milvus side is cleared: the canonicals those rows
+        point at are gone, so they must not swallow the next ingest.
+        """
+        doc_filter, params = "", ()
+        if domain is not None:
+            doc_filter = ("WHERE doc_id IN (SELECT doc_id FROM documents WHERE domain = ? "
+                          "UNION SELECT doc_id FROM chunks WHERE domain = ?)")
+            params = (domain, domain)
+        with self.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM minhash_bands WHERE chunk_id IN (SELECT chunk_id FROM chunk_fingerprints {doc_filter})",
+                params
+            )
+            for table in ("chunk_fingerprints", "chunk_duplicates", "dedup_stats"):
+                conn.execute(f"DELETE FROM {table} {doc_filter}", params)
+
+    def delete_documents(self, doc_ids: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Remove documents, their chunks and dedup bookkeeping.
+
+        Returns the deleted chunk_ids and the chunk rows promoted in place of
+        deleted canonicals (see _promote_duplicates), which the caller still
+        has to add to Milvus.
+        """
+        if not doc_ids:
+            return [], []
+        placeholders = ", ".join("?" for _ in doc_ids)
+        with self.transaction() as conn:
+            chunk_ids = [row[0] for row in conn.execute(
+                f"SELECT chunk_id FROM chunks WHERE doc_id IN ({placeholders})", doc_ids
+            )]
+            promoted = self._promote_duplicates(conn, doc_ids)
+            conn.execute(
+                f"DELETE FROM minhash_bands WHERE chunk_id IN "
+                f"(SELECT chunk_id FROM chunk_fingerprints WHERE doc_id IN ({placeholders}))",
+                doc_ids
+            )
+            for table in ("chunk_fingerprints", "chunk_duplicates", "dedup_stats", "chunks", "documents"):
+                conn.execute(f"DELETE FROM {table} WHERE doc_id IN ({placeholders})", doc_ids)
+            rows = [
+                self._decoded(CHUNK_COLUMNS, row) for row in conn.execute(
+                    f"SELECT {', '.join(CHUNK_COLUMNS + TEXT_Z_COLUMNS)} FROM chunks "
+                    f"WHERE chunk_id IN ({', '.join('?' for _ in promoted)})", promoted
+                )
+            ] if promoted else []
+        for row in rows:
+            row["embedding_vector"] = None  # re-embedded on insert
+        return chunk_ids, rows
+
+    @staticmethod
+    def _promote_duplicates(conn: sqlite3.Connection, doc_ids: List[str]) -> List[str]:
+        """Keep chunks deduplicated against a deleted canonical reachable.
+
+        Duplicates in surviving documents are re-pointed at another stored
+        copy of the same text if there is one; otherwise the first duplicate
+        takes over the canonical's text, fingerprint and bands under its own
+        chunk_id. Returns the chunk_ids of the promoted chunks.
+        """
+        placeholders = ", ".join("?" for _ in doc_ids)
+        promoted = []
+        canonicals = conn.execute(
+            f"SELECT chunk_id, content_hash, minhash FROM chunk_fingerprints WHERE doc_id IN ({placeholders})",
+            doc_ids
+        ).fetchall()
+        for canonical, content_hash, minhash in canonicals:
+            duplicates = conn.execute(
+                f"SELECT chunk_id, doc_id, chunk_index FROM chunk_duplicates "
+                f"WHERE canonical_chunk_id = ? AND doc_id NOT IN ({placeholders}) ORDER BY created_at, chunk_id",
+                [canonical] + doc_ids
+            ).fetchall()
+            if not duplicates:
+                continue
+            other = conn.execute(
+                f"SELECT chunk_id FROM chunk_fingerprints WHERE content_hash = ? AND doc_id NOT IN ({placeholders}) "
+                f"LIMIT 1",
+                [content_hash] + doc_ids
+            ).fetchone()
+            if other is not None:
+                conn.execute("UPDATE chunk_duplicates SET canonical_chunk_id = ? WHERE canonical_chunk_id = ?",
+                             (other[0], canonical))
+                continue
+            chunk_id, doc_id, chunk_index = duplicates[0]
+            copied = [column for column in CHUNK_COLUMNS + TEXT_Z_COLUMNS
+                      if column not in ("chunk_id", "doc_id", "chunk_index", "domain", "created_at")]
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO chunks (chunk_id, doc_id, chunk_index, domain, {', '.join(copied)}) "
+                f"SELECT ?, ?, ?, COALESCE((SELECT domain FROM documents WHERE doc_id = ?), domain), "
+                f"{', '.join(copied)} FROM chunks WHERE chunk_id = ?",
+                (chunk_id, doc_id, chunk_index, doc_id, canonical)
+            )
+            if cur.rowcount == 0:
+                # The canonical's text was never kept in SQLite; nothing to promote from
+                print(f"Cannot promote a duplicate of {canonical}: chunk text not stored")
+                conn.execute("DELETE FROM chunk_duplicates WHERE canonical_chunk_id = ?", (canonical,))
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO chunk_fingerprints (chunk_id, doc_id, content_hash, minhash) "
+                "VALUES (?, ?, ?, ?)",
+                (chunk_id, doc_id, content_hash, minhash)
+            )
+            conn.execute("UPDATE minhash_bands SET chunk_id = ? WHERE chunk_id = ?", (chunk_id, canonical))
+            conn.execute("DELETE FROM chunk_duplicates WHERE chunk_id = ?", (chunk_id,))
+            conn.execute("UPDATE chunk_duplicates SET canonical_chunk_id = ? WHERE canonical_chunk_id = ?",
+                         (chunk_id, canonical))
+            promoted.append(chunk_id)
+        return promoted
+
+    def iter_chunks(self, batch_size: int = 1000, domain: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """All chunk rows in batches, paged by rowid so each page is an index seek"""
+        last = 0
+        where = "rowid > ?" + (" AND domain = ?" if domain is not None else "")
+        while True:
+            params = [last] + ([domain] if domain is not None else []) + [batch_size]
+            rows = self.reader().execute(
+                f"SELECT rowid, {', '.join(CHUNK_COLUMNS + TEXT_Z_COLUMNS)} FROM chunks "
+                f"WHERE {where} ORDER BY rowid LIMIT ?",
+                params
+            ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [self._decoded(CHUNK_COLUMNS, row[1:]) for row in rows]
+
+    def record_attempt(self, doc_id: str, source_path: str):
+        """Remember a doc_id before its chunks are written, so a crashed attempt can be cleaned up"""
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO ingest_attempts (doc_id, source_path) VALUES (?, ?)",
+                         (doc_id, str(Path(source_path))))
+
+    def attempted_doc_ids(self) -> set:
+        return {row[0] for row in self.reader().execute("SELECT doc_id FROM ingest_attempts")}
+
+    def quarantine_file(self, source_path: str, reason: str, stage: Optional[str], elapsed: float,
+                        peak_rss_mb: float, error_message: Optional[str] = None):
+        """Record a file that blew its ingest budget or failed; counts repeat attempts"""
+        path = Path(source_path)
+        st = path.stat() if path.exists() else None
+        row = {
+            "source_path": str(path),
+            "file_size": st.st_size if st else None,
+            "file_mtime": st.st_mtime if st else None,
+            "reason": reason,
+            "stage": stage,
+            "elapsed_seconds": round(elapsed, 3),
+            "peak_rss_mb": round(peak_rss_mb, 1),
+            "error_message": error_message,
+            "updated_at": datetime.now().isoformat(),
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{k}" for k in row)
+        updates = ", ".join(f"{k}=excluded.{k}" for k in row if k != "source_path")
+        with self._write_lock, self._writer:
+            self._writer.execute(
+                f"INSERT INTO quarantine ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(source_path) DO UPDATE SET {updates}, attempts = attempts + 1",
+                row
+            )
+
+    def quarantined_paths(self) -> set:
+        """Quarantined files that have not changed since they were quarantined"""
+        paths = set()
+        for source_path, size, mtime in self.reader().execute(
+            "SELECT source_path, file_size, file_mtime FROM quarantine"
+        ):
+            try:
+                st = os.stat(source_path)
+            except OSError:
+                continue
+            if st.st_size == size and st.st_mtime == mtime:
+                paths.add(source_path)
+        return paths
+
+    def release_quarantine(self, source_paths: List[str]):
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "DELETE FROM quarantine WHERE source_path = ?", [(str(Path(p)),) for p in source_paths]
+            )
+
+    def count_chunks(self, doc_id: Optional[str] = None) -> int:
+        if doc_id is None:
+            row = self.reader().execute("SELECT COUNT(*) FROM chunks").fetchone()
+        else:
+            row = self.reader().execute("SELECT COUNT(*) FROM chunks WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ChunkHydrator:
+    """Resolve Milvus hit ids to chunk rows: LRU cache first, then one SQLite IN query"""
+
+    def __init__(self, store: ChunkStore, max_entries: int = 10000):
+        self.store = store
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, chunk_ids: List[str], cached_only: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Rows by chunk_id; `cached_only` skips SQLite for ids not in the LRU"""
+        found = {}
+        missing = []
+        with self._lock:
+            for chunk_id in chunk_ids:
+                row = self._cache.get(chunk_id)
+                if row is None:
+                    missing.append(chunk_id)
+                else:
+                    self._cache.move_to_end(chunk_id)
+                    found[chunk_id] = row
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing and not cached_only:
+            loaded = self.store.get_chunks(missing)
+            found.update(loaded)
+            with self._lock:
+                for chunk_id, row in loaded.items():
+                    self._cache[chunk_id] = row
+                    self._cache.move_to_end(chunk_id)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return found
+
+    def invalidate(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._cache.pop(chunk_id, None)
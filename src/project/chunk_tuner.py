@@ -0,0 +1,215 @@
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import numpy as np
+from project.pydantic_models import ProcessingConfig, ChunkingMethod, FileType, Document
+from project.doc_reader import DocumentLoader
+from project.chunker import ChunkingService
+from project.embedder import EmbeddingService
+
+# HNSW graph degree used for chunk collections (milvus.py index params)
+HNSW_M = 16
+TUNED_CONFIG = "chunk_config.json"
+
+# Candidate grids per file type. Character sizes for the text splitters,
+# token sizes for token/sentence, neighbour windows for JSON (the JSON
+# chunker's overlap joins that many preceding splits), KiB for CSV/TSV.
+CHAR_SIZES = [256, 512, 1024, 2048]
+TOKEN_SIZES = [64, 128, 256]
+OVERLAP_FRACTIONS = [0.0, 0.1, 0.25]
+JSON_WINDOWS = [0, 1, 2]
+CSV_MAX_KB = [1, 2, 4, 8]
+
+def candidates(file_type: FileType) -> List[Dict[str, Any]]:
+    """ProcessingConfig overrides to try for one file type"""
+    if file_type in (FileType.CSV, FileType.TSV):
+        return [{"csv_max_kb": kb} for kb in CSV_MAX_KB]
+    if file_type == FileType.JSON:
+        return [{"chunking_method": ChunkingMethod.JSON.value, "chunk_size": size, "chunk_overlap": window}
+                for size in CHAR_SIZES for window in JSON_WINDOWS]
+    grid = []
+    for method in (ChunkingMethod.RECURSIVE, ChunkingMethod.CHARACTER, ChunkingMethod.TOKEN,
+                   ChunkingMethod.SENTENCE):
+        sizes = TOKEN_SIZES if method in (ChunkingMethod.TOKEN, ChunkingMethod.SENTENCE) else CHAR_SIZES
+        for size in sizes:
+            for fraction in OVERLAP_FRACTIONS:
+                grid.append({"chunking_method": method.value, "chunk_size": size,
+                             "chunk_overlap": int(size * fraction)})
+    return grid
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class ChunkTuner:
+    """Sweep chunking settings per file type against a labelled query set.
+
+    Each query names the file it is answered from and, optionally, the
+    answer text. A chunk is relevant when it comes from that file and
+    contains the answer (or lies within it); without an answer, any
+    chunk of the file counts. For every candidate the sample files of
+    that type are chunked and embedded. Chunks are ranked for each query
+    by brute-force cosine (numpy), and the tuner records recall@k, MRR,
+    chunk count, embed time, estimated HNSW index memory and how many
+    chunks run past the embedder's max sequence length. Candidates with
+    such chunks are never recommended: the model only embeds their
+    prefix, so containing the answer says nothing about retrieving it.
+    The recommendation is the cheapest remaining candidate (fewest
+    chunks) within `tolerance` of the best recall.
+    """
+
+    def __init__(self, corpus_dir: str, queries: List[Dict[str, Any]], k: int = 5, tolerance: float = 0.02,
+                 base_config: ProcessingConfig = None, max_files: int = 50):
+        self.corpus_dir = Path(corpus_dir)
+        self.queries = queries
+        self.k = k
+        self.tolerance = tolerance
+        self.base_config = base_config or ProcessingConfig()
+        self.max_files = max_files
+        self.embedder = EmbeddingService(self.base_config.embedding_model)
+        self.documents: Dict[str, Document] = {}  # path relative to corpus_dir -> document
+        self._query_vectors: Optional[np.ndarray] = None
+
+    def load_corpus(self):
+        """Load every file named by a query, then fill each file type up to max_files"""
+        named = {query["file"] for query in self.queries}
+        paths = sorted(p for p in self.corpus_dir.rglob("*") if p.is_file())
+        per_type: Dict[str, int] = {}
+        for path in paths:
+            key = path.relative_to(self.corpus_dir).as_posix()
+            file_type = path.suffix.lower().lstrip(".")
+            if key not in named and per_type.get(file_type, 0) >= self.max_files:
+                continue
+            try:
+                self.documents[key] = DocumentLoader.load_document(str(path))
+            except Exception as e:
+                print(f"Skipping {key}: {e}")
+                continue
+            per_type[file_type] = per_type.get(file_type, 0) + 1
+        missing = named - set(self.documents)
+        if missing:
+            print(f"Queries reference files that could not be loaded: {sorted(missing)}")
+        print(f"Tuning corpus: {len(self.documents)} files {per_type}")
+
+    @staticmethod
+    def _unit(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def query_vectors(self) -> np.ndarray:
+        if self._query_vectors is None:
+            self._query_vectors = self._unit([self.embedder.embed_query(query["query"]) for query in self.queries])
+        return self._query_vectors
+
+    def evaluate(self, file_type: FileType, overrides: Dict[str, Any]) -> Dict[str, Any]:
+        config = ProcessingConfig(**{**self.base_config.model_dump(), **overrides, "tuned_config": None})
+        docs = {key: doc for key, doc in self.documents.items() if doc.file_type == file_type}
+        query_ids = [i for i, query in enumerate(self.queries) if query["file"] in docs]
+        records, chunk_files = [], []
+        for key, document in docs.items():
+            for record in ChunkingService.chunk_records(document, config):
+                records.append(record)
+                chunk_files.append(key)
+        result = {"file_type": file_type.value, **overrides, "chunks": len(records), "queries": len(query_ids)}
+        if not records:
+            return {**result, "recall_at_k": 0.0, "mrr": 0.0, "embed_seconds": 0.0, "index_mb": 0.0,
+                    "truncated_chunks": 0}
+        max_tokens = self.embedder.max_seq_length
+        result["truncated_chunks"] = sum(
+            count > max_tokens for count in self.embedder.token_counts([record.content for record in records])
+        )
+        started = time.perf_counter()
+        matrix = self._unit([record.embedding for record in self.embedder.embed_chunks(records)])
+        chunk_texts = [record.content for record in records]
+        result["embed_seconds"] = round(time.perf_counter() - started, 3)
+        result["index_mb"] = round(len(chunk_texts) * (matrix.shape[1] * 4 + HNSW_M * 2 * 8) / (1024 * 1024), 3)
+
+        normalized = [_normalize(text) for text in chunk_texts]
+        hits, reciprocal = 0, 0.0
+        if query_ids:
+            scores = self.query_vectors()[query_ids] @ matrix.T
+            top = np.argsort(-scores, axis=1)[:, :self.k]
+            for row, query_id in enumerate(query_ids):
+                query = self.queries[query_id]
+                answer = _normalize(query["answer"]) if query.get("answer") else None
+                for rank, index in enumerate(top[row], 1):
+                    if chunk_files[index] != query["file"]:
+                        continue
+                    if answer is None or answer in normalized[index] or normalized[index] in answer:
+                        hits += 1
+                        reciprocal += 1.0 / rank
+                        break
+        result["recall_at_k"] = round(hits / len(query_ids), 4) if query_ids else 0.0
+        result["mrr"] = round(reciprocal / len(query_ids), 4) if query_ids else 0.0
+        return result
+
+    def recommend(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ok = [r for r in results if "error" not in r and r["chunks"] and not r["truncated_chunks"]]
+        if not ok or not ok[0]["queries"]:
+            # Without labelled queries for the type there is no recall to trade against
+            return {}
+        best = max(r["recall_at_k"] for r in ok)
+        near_best = [r for r in ok if r["recall_at_k"] >= best - self.tolerance]
+        return min(near_best, key=lambda r: (r["chunks"], r["embed_seconds"]))
+
+    def run(self, file_types: List[FileType] = None, output: str = TUNED_CONFIG) -> Dict[str, Any]:
+        if not self.documents:
+            self.load_corpus()
+        present = {doc.file_type for doc in self.documents.values()}
+        results, recommended = [], {}
+        for file_type in file_types or [ft for ft in FileType if ft in present]:
+            type_results = []
+            for overrides in candidates(file_type):
+                try:
+                    result = self.evaluate(file_type, overrides)
+                except Exception as e:
+                    result = {"file_type": file_type.value, **overrides, "error": str(e)}
+                print(f"{file_type.value} {overrides}: " + (
+                    f"error {result['error']}" if "error" in result else
+                    f"recall@{self.k}={result['recall_at_k']:.3f} chunks={result['chunks']} "
+                    f"truncated={result['truncated_chunks']} "
+                    f"embed={result['embed_seconds']}s index={result['index_mb']}MB"
+                ))
+                type_results.append(result)
+            results.extend(type_results)
+            best = self.recommend(type_results)
+            if best:
+                # Only the overrides: this section is read back into ProcessingConfig
+                recommended[file_type.value] = {key: value for key, value in best.items()
+                                                if key in ProcessingConfig.model_fields}
+        report = {
+            "generated_at": datetime.now().isoformat(),
+            "corpus": str(self.corpus_dir),
+            "k": self.k,
+            "tolerance": self.tolerance,
+            "embedding_model": self.base_config.embedding_model.value,
+            "recommended": recommended,
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        for file_type, settings in recommended.items():
+            print(f"Recommended for {file_type}: {settings}")
+        print(f"Wrote {output}; use ProcessingConfig(tuned_config={output!r})")
+        return report
+
+if __name__ == "__main__":
+    # python -m project.chunk_tuner corpus_dir queries.json [--k 5] [--out chunk_config.json]
+    # queries.json: [{"query": "...", "file": "path/relative/to/corpus.txt", "answer": "optional span"}]
+    parser = argparse.ArgumentParser(description="Sweep chunking settings per file type for recall vs cost")
+    parser.add_argument("corpus_dir")
+    parser.add_argument("queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    parser.add_argument("--max-files", type=int, default=50)
+    parser.add_argument("--file-type", action="append", type=FileType, dest="file_types")
+    parser.add_argument("--out", default=TUNED_CONFIG)
+    args = parser.parse_args()
+    with open(args.queries, "r", encoding="utf-8") as f:
+        labelled = json.load(f)
+    ChunkTuner(args.corpus_dir, labelled, args.k, args.tolerance, max_files=args.max_files).run(
+        args.file_types, args.out
+    )
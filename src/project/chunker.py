@@ -1,21 +1,50 @@
-from typing import List
+from typing import List, Dict, Any
 from project.pydantic_models import Chunk, ChunkingMethod, ProcessingConfig, Document
-from langchain.text_splitter import (
-    RecursiveCharacterTextSplitter,
-    CharacterTextSplitter,
-    TokenTextSplitter,
-    SentenceTransformersTokenTextSplitter,
-    RecursiveJsonSplitter,
-)
-import pandas as pd
+from project.records import ChunkRecord, DocumentMeta
 import io
 import json
 
+# langchain splitters and pandas are imported inside the methods that use
+# them so importing this module (and the CLIs built on it) stays fast
+
 class ChunkingService:
     """LangChain-based chunking service with method toggle"""
 
+    _tuned: Dict[str, Dict[str, Dict[str, Any]]] = {}  # tuned config path -> file type -> overrides
+
+    @staticmethod
+    def load_tuned_config(path: str) -> Dict[str, Dict[str, Any]]:
+        """Per-file-type ProcessingConfig overrides from a chunk_tuner.py report (cached per path)"""
+        tuned = ChunkingService._tuned.get(path)
+        if tuned is None:
+            with open(path, "r", encoding="utf-8") as f:
+                recommended = json.load(f).get("recommended", {})
+            fields = set(ProcessingConfig.model_fields) - {"tuned_config"}
+            tuned = {
+                file_type: {key: value for key, value in settings.items() if key in fields}
+                for file_type, settings in recommended.items()
+            }
+            ChunkingService._tuned[path] = tuned
+            print(f"Loaded tuned chunking config for {sorted(tuned)} from {path}")
+        return tuned
+
+    @staticmethod
+    def config_for(document: Document, config: ProcessingConfig) -> ProcessingConfig:
+        """`config` with the tuned overrides for the document's file type, if any"""
+        if not config.tuned_config:
+            return config
+        overrides = ChunkingService.load_tuned_config(config.tuned_config).get(document.file_type.value)
+        return ProcessingConfig(**{**config.model_dump(), **overrides}) if overrides else config
+
     @staticmethod
     def chunk_document(document: Document, config: ProcessingConfig) -> List[Chunk]:
+        """Validated chunks for API callers"""
+        return [record.to_chunk() for record in ChunkingService.chunk_records(document, config)]
+
+    @staticmethod
+    def chunk_records(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        """Lightweight chunk records for the ingest pipeline"""
+        config = ChunkingService.config_for(document, config)
         print(f"Chunking with method: {config.chunking_method.value}")
         if document.file_type.value in ("csv", "tsv", "tsv#"):
             return ChunkingService._csv_tsv_chunking(document, config)
@@ -35,7 +64,8 @@ class ChunkingService:
         return chunks
 
     @staticmethod
-    def _csv_tsv_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _csv_tsv_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        import pandas as pd
         sep = "," if document.file_type.value == "csv" else "\t"
         has_header = False
         if has_header:
@@ -43,67 +73,59 @@ class ChunkingService:
         else:
             df = pd.read_csv(io.StringIO(document.content), sep=sep, header=None)
             df.columns = [f"Column{i+1}" for i in range(df.shape[1])]
-        max_kb = 2
-        max_bytes = (max_kb * 1024) if max_kb else 4096
+        max_bytes = (config.csv_max_kb * 1024) if config.csv_max_kb else 4096
+        columns = [str(col) for col in df.columns]
+        # columns are identical for every chunk of the file, keep them once
+        doc_meta = ChunkingService._document_meta(document, columns=columns)
         chunks = []
         current_rows = []
         running_len = 0
         start_idx = 0
-        for i, row in df.iterrows():
-            row_dict = {str(col): str(row[col]) for col in df.columns}
+        for i, values in enumerate(df.astype(str).itertuples(index=False, name=None)):
+            row_dict = dict(zip(columns, values))
             row_text = json.dumps(row_dict, ensure_ascii=False)
             row_byte_len = len(row_text.encode("utf-8"))
             if running_len + row_byte_len > max_bytes and current_rows:
-                chunk_text = json.dumps(current_rows, ensure_ascii=False)
-                chunk = Chunk(
-                    id=f"{document.id}_chunk_{start_idx}",
-                    doc_id=document.id,     # <-- FIX
-                    content=chunk_text,
-                    chunk_index=start_idx,
-                    chunking_method=ChunkingMethod.RECURSIVE,
-                    metadata={
-                        "document_title": document.title,
-                        "file_type": document.file_type.value,
-                        "columns": list(df.columns),
-                        "row_start": start_idx,
-                        "row_end": i - 1,
-                    }
-                )
-                chunks.append(chunk)
+                chunks.append(ChunkingService._csv_record(
+                    document, doc_meta, current_rows, len(chunks), start_idx, i - 1
+                ))
                 current_rows = []
                 running_len = 0
                 start_idx = i
             current_rows.append(row_dict)
             running_len += row_byte_len
         if current_rows:
-            chunk_text = json.dumps(current_rows, ensure_ascii=False)
-            chunk = Chunk(
-                id=f"{document.id}_chunk_{start_idx}",
-                doc_id=document.id,   # <-- FIX
-                content=chunk_text,
-                chunk_index=start_idx,
-                chunking_method=ChunkingMethod.RECURSIVE,
-                metadata={
-                    "document_title": document.title,
-                    "file_type": document.file_type.value,
-                    "columns": list(df.columns),
-                    "row_start": start_idx,
-                    "row_end": start_idx + len(current_rows) - 1,
-                }
-            )
-            chunks.append(chunk)
+            chunks.append(ChunkingService._csv_record(
+                document, doc_meta, current_rows, len(chunks), start_idx, start_idx + len(current_rows) - 1
+            ))
         return chunks
 
     @staticmethod
-    def _json_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _csv_record(document: Document, doc_meta: DocumentMeta, rows: List[dict], index: int, row_start: int,
+                    row_end: int) -> ChunkRecord:
+        # The id keeps the starting row; chunk_index is the chunk's position (rows are in extra)
+        return ChunkRecord(
+            id=f"{document.id}_chunk_{row_start}",
+            doc_id=document.id,
+            content=json.dumps(rows, ensure_ascii=False),
+            chunk_index=index,
+            chunking_method=ChunkingMethod.RECURSIVE,
+            doc=doc_meta,
+            extra={"row_start": row_start, "row_end": row_end}
+        )
+
+    @staticmethod
+    def _json_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        from langchain.text_splitter import RecursiveJsonSplitter
         try:
             # No chunk_overlap here (not supported), manual overlap below
             splitter = RecursiveJsonSplitter(
                 max_chunk_size=config.chunk_size
             )
-            splits = splitter.split_text(document.content)
-            texts = [split['text'] for split in splits]
-            metas = [split.get('metadata', {}) for split in splits]
+            # The splitter walks parsed JSON and returns serialized sub-objects;
+            # convert_lists makes top-level and nested arrays splittable too
+            texts = splitter.split_text(json.loads(document.content), convert_lists=True)
+            metas = [{} for _ in texts]
 
             # Manual overlap for JSON
             window = config.chunk_overlap or 0
@@ -124,7 +146,8 @@ class ChunkingService:
             return ChunkingService._recursive_chunking(document, config)
 
     @staticmethod
-    def _recursive_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _recursive_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=config.chunk_size,
             chunk_overlap=config.chunk_overlap,
@@ -134,7 +157,8 @@ class ChunkingService:
         return ChunkingService._create_chunks(texts, document, config)
 
     @staticmethod
-    def _character_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _character_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        from langchain.text_splitter import CharacterTextSplitter
         splitter = CharacterTextSplitter(
             chunk_size=config.chunk_size,
             chunk_overlap=config.chunk_overlap,
@@ -144,7 +168,8 @@ class ChunkingService:
         return ChunkingService._create_chunks(texts, document, config)
 
     @staticmethod
-    def _token_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _token_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        from langchain.text_splitter import TokenTextSplitter
         splitter = TokenTextSplitter(
             chunk_size=config.chunk_size,
             chunk_overlap=config.chunk_overlap
@@ -153,7 +178,8 @@ class ChunkingService:
         return ChunkingService._create_chunks(texts, document, config)
 
     @staticmethod
-    def _sentence_chunking(document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _sentence_chunking(document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        from langchain.text_splitter import SentenceTransformersTokenTextSplitter
         splitter = SentenceTransformersTokenTextSplitter(
             chunk_overlap=config.chunk_overlap,
             tokens_per_chunk=config.chunk_size
@@ -162,46 +188,45 @@ class ChunkingService:
         return ChunkingService._create_chunks(texts, document, config)
 
     @staticmethod
-    def _create_chunks(texts: List[str], document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _document_meta(document: Document, **extra) -> DocumentMeta:
+        return DocumentMeta(
+            doc_id=document.id,
+            title=document.title,
+            file_type=document.file_type.value,
+            extra=extra
+        )
+
+    @staticmethod
+    def _create_chunks(texts: List[str], document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        doc_meta = ChunkingService._document_meta(document)
         chunks = []
         for i, text in enumerate(texts):
-            if len(text.strip()) >= 20:
-                chunk = Chunk(
+            text = text.strip()
+            if len(text) >= 20:
+                chunks.append(ChunkRecord(
                     id=f"{document.id}_chunk_{i}",
-                    doc_id=document.id,    # <-- FIX
-                    content=text.strip(),
-                    chunk_index=i,
+                    doc_id=document.id,
+                    content=text,
+                    chunk_index=len(chunks),
                     chunking_method=config.chunking_method,
-                    metadata={
-                        "document_title": document.title,
-                        "file_type": document.file_type.value,
-                        "chunk_size": len(text),
-                        "word_count": len(text.split())
-                    }
-                )
-                chunks.append(chunk)
+                    doc=doc_meta
+                ))
         return chunks
 
     @staticmethod
-    def _create_chunks_json(texts: List[str], metas: List[dict], document: Document, config: ProcessingConfig) -> List[Chunk]:
+    def _create_chunks_json(texts: List[str], metas: List[dict], document: Document, config: ProcessingConfig) -> List[ChunkRecord]:
+        doc_meta = ChunkingService._document_meta(document)
         chunks = []
         for i, (text, meta) in enumerate(zip(texts, metas)):
-            if len(text.strip()) >= 20:
-                chunk_meta = {
-                    "document_title": document.title,
-                    "file_type": document.file_type.value,
-                    "chunk_size": len(text),
-                    "word_count": len(text.split()),
-                    "json_path": meta.get('path', []),
-                    **meta
-                }
-                chunk = Chunk(
+            text = text.strip()
+            if len(text) >= 20:
+                chunks.append(ChunkRecord(
                     id=f"{document.id}_chunk_{i}",
-                    doc_id=document.id,    # <-- FIX
-                    content=text.strip(),
-                    chunk_index=i,
+                    doc_id=document.id,
+                    content=text,
+                    chunk_index=len(chunks),
                     chunking_method=config.chunking_method,
-                    metadata=chunk_meta
-                )
-                chunks.append(chunk)
+                    doc=doc_meta,
+                    extra={"json_path": meta.get('path', []), **meta}
+                ))
         return chunks
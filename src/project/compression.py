@@ -0,0 +1,32 @@
+import zlib
+
+# zstandard is optional: use it when installed, otherwise fall back to zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+def compress(data: bytes, codec: str, level: int = 3) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd decompression requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Tuple
+from project.chunk_store import ChunkStore, ChunkHydrator
+from project.records import ChunkRecord, SearchHit
+
+class ContextExpander:
+    """Attach neighbouring chunks (chunk_index ± window) to search hits.
+
+    Hit positions are resolved by chunk_id, the windows of hits from the
+    same document are merged when they overlap or touch, and all windows
+    are fetched with one batched SQLite query on (doc_id, chunk_index).
+    Neighbour rows are kept in an LRU keyed by (doc_id, chunk_index).
+    The best-ranked hit of a merged window carries the context; the other
+    hits in it point at that hit through `context_of`.
+    """
+
+    def __init__(self, store: ChunkStore, hydrator: ChunkHydrator = None, max_entries: int = 20000):
+        self.store = store
+        self.hydrator = hydrator or ChunkHydrator(store)
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def merge_windows(spans: List[Tuple[int, int, int]]) -> List[Tuple[int, int, List[int]]]:
+        """Merge (first, last, rank) spans of one document into (first, last, ranks)"""
+        merged = []
+        for first, last, rank in sorted(spans):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+                merged[-1][2].append(rank)
+            else:
+                merged.append([first, last, [rank]])
+        return [(first, last, sorted(ranks)) for first, last, ranks in merged]
+
+    def _cached(self, doc_id: str, first: int, last: int):
+        """Rows of a window if every position is cached, else None"""
+        rows = []
+        for index in range(first, last + 1):
+            row = self._cache.get((doc_id, index))
+            if row is None:
+                return None
+            rows.append(row)
+        return rows
+
+    def _load(self, windows: List[Tuple[str, int, int]]) -> Dict[Tuple[str, int, int], List[Dict[str, Any]]]:
+        found, missing = {}, []
+        with self._lock:
+            for window in windows:
+                rows = self._cached(*window)
+                if rows is None:
+                    missing.append(window)
+                else:
+                    for row in rows:
+                        self._cache.move_to_end((row["doc_id"], row["chunk_index"]))
+                    found[window] = rows
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+        loaded = self.store.get_windows(missing)
+        by_doc: Dict[str, List[Dict[str, Any]]] = {}
+        for row in loaded:
+            by_doc.setdefault(row["doc_id"], []).append(row)
+        for doc_id, first, last in missing:
+            found[(doc_id, first, last)] = sorted(
+                (row for row in by_doc.get(doc_id, ()) if first <= row["chunk_index"] <= last),
+                key=lambda row: row["chunk_index"]
+            )
+        with self._lock:
+            # Only the positions that exist are cached, so windows running past
+            # a document's edges are re-read; they are short and index-only.
+            for row in loaded:
+                key = (row["doc_id"], row["chunk_index"])
+                self._cache[key] = row
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return found
+
+    def expand(self, hits: List[SearchHit], window: int) -> List[SearchHit]:
+        if window <= 0 or not hits:
+            return hits
+        positions = self.hydrator.fetch([hit.chunk.id for hit in hits])
+        spans: Dict[str, List[Tuple[int, int, int]]] = {}
+        for hit in hits:
+            row = positions.get(hit.chunk.id)
+            if row is None:
+                continue  # not in SQLite (e.g. stored without bulk upload): no context
+            index = row["chunk_index"]
+            spans.setdefault(row["doc_id"], []).append((max(0, index - window), index + window, hit.rank))
+
+        groups = {
+            (doc_id, first, last): ranks
+            for doc_id, doc_spans in spans.items()
+            for first, last, ranks in self.merge_windows(doc_spans)
+        }
+        rows = self._load(list(groups))
+        by_rank = {hit.rank: hit for hit in hits}
+        for window_key, ranks in groups.items():
+            owner = by_rank[ranks[0]]
+            owner.context = [ChunkRecord.from_row(row) for row in rows[window_key]]
+            for rank in ranks[1:]:
+                by_rank[rank].context_of = owner.rank
+        return hits
+
+    def invalidate_documents(self, doc_ids: Iterable[str]):
+        doc_ids = set(doc_ids)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in doc_ids]:
+                del self._cache[key]
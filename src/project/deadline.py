@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+# Threads for stages run under a deadline; abandoned calls keep theirs until they finish
+POOL_SIZE = 4
+
+class DeadlineExceeded(TimeoutError):
+    """A search stage could not finish before the request deadline"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+class Deadline:
+    """Time budget for one search request, passed down every stage.
+
+    Stages ask for `remaining()` (to size Milvus timeouts) and `tight()`
+    (to trade recall for latency, recorded with `reduce(stage)`), and
+    report overruns with `miss(stage)`, which also bumps a process-wide
+    per-stage counter. Either makes the response degraded.
+    """
+
+    # Share of the budget below which stages switch to their cheap settings
+    TIGHT_FRACTION = 0.5
+    _counters: Dict[str, int] = {}
+    _counter_lock = threading.Lock()
+    # Embedding runs on a pool so a slow encode can be abandoned, not waited for.
+    # _slots counts running calls, abandoned ones included, so work is never
+    # queued behind them: a full pool rejects instead.
+    _pool: Optional[ThreadPoolExecutor] = None
+    _slots = threading.BoundedSemaphore(POOL_SIZE)
+
+    def __init__(self, budget_ms: float):
+        self.budget = max(0.0, budget_ms) / 1000
+        self.started = time.monotonic()
+        self.expires = self.started + self.budget
+        self.missed: List[str] = []
+        self.reduced: List[str] = []
+
+    @classmethod
+    def optional(cls, budget_ms: Optional[float]) -> Optional["Deadline"]:
+        return cls(budget_ms) if budget_ms else None
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires - time.monotonic())
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def tight(self) -> bool:
+        return self.remaining() < self.budget * self.TIGHT_FRACTION
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.missed or self.reduced)
+
+    def reduce(self, stage: str):
+        if stage not in self.reduced:
+            self.reduced.append(stage)
+
+    def miss(self, stage: str):
+        self.missed.append(stage)
+        with self._counter_lock:
+            self._counters[stage] = self._counters.get(stage, 0) + 1
+        print(f"Deadline: {stage} over budget after {self.elapsed_ms():.0f} ms")
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded (after recording it) if no time is left"""
+        if self.expired():
+            self.miss(stage)
+            raise DeadlineExceeded(stage)
+
+    @classmethod
+    def _get_pool(cls) -> ThreadPoolExecutor:
+        with cls._counter_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="deadline")
+            return cls._pool
+
+    def run(self, stage: str, fn: Callable[..., Any], *args, share: float = 1.0) -> Any:
+        """Run fn on the shared pool; stop waiting once `share` of the remaining time is used.
+
+        Raises DeadlineExceeded right away when every pool thread is busy
+        (e.g. with calls abandoned by earlier requests).
+        """
+        self.check(stage)
+        if not Deadline._slots.acquire(blocking=False):
+            print(f"Deadline: no free thread for {stage}")
+            self.miss(stage)
+            raise DeadlineExceeded(stage)
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            Deadline._slots.release()
+            raise
+        future.add_done_callback(lambda _: Deadline._slots.release())
+        try:
+            return future.result(timeout=self.remaining() * share)
+        except FutureTimeout:
+            self.miss(stage)
+            raise DeadlineExceeded(stage) from None
+
+    @classmethod
+    def timeout_counts(cls) -> Dict[str, int]:
+        """Per-stage deadline misses since process start"""
+        with cls._counter_lock:
+            return dict(cls._counters)
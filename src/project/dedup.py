@@ -0,0 +1,198 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Iterable
+import numpy as np
+from project.chunk_store import ChunkStore
+from project.records import ChunkRecord
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+@dataclass(slots=True)
+class DedupReport:
+    doc_id: str
+    total_chunks: int
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    # (fingerprints, band_rows, duplicate_rows) waiting for record()
+    pending: Optional[tuple] = field(default=None, repr=False)
+
+    @property
+    def kept(self) -> int:
+        return self.total_chunks - self.exact_duplicates - self.near_duplicates
+
+    @property
+    def dedup_ratio(self) -> float:
+        if not self.total_chunks:
+            return 0.0
+        return (self.exact_duplicates + self.near_duplicates) / self.total_chunks
+
+class ChunkDeduplicator:
+    """Drop exact and near-duplicate chunks before they are embedded.
+
+    Exact duplicates are found by a hash of the normalized text, near
+    duplicates by MinHash signatures bucketed with LSH banding. Fingerprints
+    of kept chunks and the LSH buckets live in SQLite, so duplicates are
+    detected across documents and across runs. Dropped chunks are linked to
+    their canonical chunk_id in chunk_duplicates.
+
+    Nothing is written by deduplicate(); call record() once the kept chunks
+    are stored, so a failed store never leaves fingerprints of chunks that
+    are not in the index.
+    """
+
+    def __init__(self, store: ChunkStore, threshold: float = 0.85, num_perm: int = 64,
+                 bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.store = store
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a, b < 2**31 keeps a*h + b inside uint64 for 32-bit shingle hashes
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text.lower()).strip()
+
+    @staticmethod
+    def _hash32(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+    def _shingles(self, text: str) -> set:
+        words = text.split(" ")
+        if len(words) >= self.shingle_size:
+            return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        # Very short chunks: fall back to character 5-grams
+        return {text[i:i + 5] for i in range(max(1, len(text) - 4))}
+
+    def signature(self, normalized: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (self._hash32(s) for s in self._shingles(normalized)), dtype=np.uint64
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _buckets(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        buckets = []
+        for band in range(self.bands):
+            part = signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+            bucket = int.from_bytes(hashlib.blake2b(part, digest_size=8).digest(), "little", signed=True)
+            buckets.append((band, bucket))
+        return buckets
+
+    def _stored_candidates(self, buckets: List[Tuple[int, int]], replacing: set) -> Dict[str, np.ndarray]:
+        conn = self.store.reader()
+        where = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in buckets)
+        params = [value for pair in buckets for value in pair]
+        rows = conn.execute(
+            f"SELECT DISTINCT f.chunk_id, f.doc_id, f.minhash FROM minhash_bands b "
+            f"JOIN chunk_fingerprints f ON f.chunk_id = b.chunk_id WHERE {where}",
+            params
+        ).fetchall()
+        return {
+            chunk_id: np.frombuffer(blob, dtype=np.uint32)
+            for chunk_id, doc_id, blob in rows if doc_id not in replacing
+        }
+
+    def _stored_exact(self, hashes: List[str], replacing: set) -> Dict[str, str]:
+        found = {}
+        for i in range(0, len(hashes), 900):
+            part = hashes[i:i + 900]
+            placeholders = ", ".join("?" for _ in part)
+            for content_hash, chunk_id, doc_id in self.store.reader().execute(
+                f"SELECT content_hash, chunk_id, doc_id FROM chunk_fingerprints WHERE content_hash IN ({placeholders})",
+                part
+            ):
+                if doc_id not in replacing:
+                    found.setdefault(content_hash, chunk_id)
+        return found
+
+    def _best_match(self, signature: np.ndarray, candidates: Dict[str, np.ndarray]) -> Tuple[Optional[str], float]:
+        best_id, best_sim = None, 0.0
+        for chunk_id, other in candidates.items():
+            similarity = float(np.mean(signature == other))
+            if similarity > best_sim:
+                best_id, best_sim = chunk_id, similarity
+        return best_id, best_sim
+
+    def deduplicate(self, chunks: List[ChunkRecord],
+                    replacing: Iterable[str] = ()) -> Tuple[List[ChunkRecord], DedupReport]:
+        """Return the chunks worth embedding plus a per-document report.
+
+        `replacing` lists doc_ids about to be deleted (an older version of
+        the same file); their chunks are not used as canonicals.
+        """
+        report = DedupReport(doc_id=chunks[0].doc_id if chunks else "", total_chunks=len(chunks))
+        if not chunks:
+            return chunks, report
+        # A re-run of an unchanged file has the same doc_id: its own earlier chunks are not canonicals
+        replacing = set(replacing) | {report.doc_id}
+        normalized = [self._normalize(chunk.content) for chunk in chunks]
+        hashes = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in normalized]
+        canonical_by_hash = self._stored_exact(list(set(hashes)), replacing)
+
+        kept = []
+        fingerprints, band_rows, duplicate_rows = [], [], []
+        batch_buckets: Dict[Tuple[int, int], List[str]] = {}
+        batch_signatures: Dict[str, np.ndarray] = {}
+        for chunk, text, content_hash in zip(chunks, normalized, hashes):
+            canonical = canonical_by_hash.get(content_hash)
+            if canonical is not None:
+                report.exact_duplicates += 1
+                duplicate_rows.append((chunk.id, chunk.doc_id, chunk.chunk_index, canonical, "exact", 1.0))
+                continue
+            signature = self.signature(text)
+            buckets = self._buckets(signature)
+            candidates = self._stored_candidates(buckets, replacing)
+            for bucket in buckets:
+                for chunk_id in batch_buckets.get(bucket, ()):
+                    candidates[chunk_id] = batch_signatures[chunk_id]
+            match, similarity = self._best_match(signature, candidates)
+            if match is not None and similarity >= self.threshold:
+                report.near_duplicates += 1
+                duplicate_rows.append((chunk.id, chunk.doc_id, chunk.chunk_index, match, "near", similarity))
+                continue
+            kept.append(chunk)
+            canonical_by_hash[content_hash] = chunk.id
+            batch_signatures[chunk.id] = signature
+            fingerprints.append((chunk.id, chunk.doc_id, content_hash, signature.tobytes()))
+            for band, bucket in buckets:
+                batch_buckets.setdefault((band, bucket), []).append(chunk.id)
+                band_rows.append((band, bucket, chunk.id))
+
+        report.pending = (fingerprints, band_rows, duplicate_rows)
+        print(f"Dedup {report.doc_id}: kept {report.kept}/{report.total_chunks} "
+              f"({report.exact_duplicates} exact, {report.near_duplicates} near, ratio {report.dedup_ratio:.1%})")
+        return kept, report
+
+    def record(self, report: DedupReport):
+        """Persist a report's fingerprints and duplicate links (after its chunks were stored)"""
+        if report.pending is None:
+            return
+        fingerprints, band_rows, duplicate_rows = report.pending
+        with self.store.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_fingerprints (chunk_id, doc_id, content_hash, minhash) VALUES (?, ?, ?, ?)",
+                fingerprints
+            )
+            # Re-stored chunks keep their ids; drop their old buckets first
+            conn.executemany("DELETE FROM minhash_bands WHERE chunk_id = ?", [(row[0],) for row in fingerprints])
+            conn.executemany("INSERT INTO minhash_bands (band, bucket, chunk_id) VALUES (?, ?, ?)", band_rows)
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_duplicates "
+                "(chunk_id, doc_id, chunk_index, canonical_chunk_id, match_type, similarity) VALUES (?, ?, ?, ?, ?, ?)",
+                duplicate_rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO dedup_stats (doc_id, total_chunks, exact_duplicates, near_duplicates, dedup_ratio) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (report.doc_id, report.total_chunks, report.exact_duplicates, report.near_duplicates, report.dedup_ratio)
+            )
+        report.pending = None
@@ -0,0 +1,339 @@
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Optional, Iterable, Callable, Tuple
+from project.chunk_store import ChunkStore
+from project.pydantic_models import ProcessingConfig
+from project.ingest_budget import BudgetedProcessor
+from project.doc_reader import domain_for
+
+QUEUE_DB = r"ingest_queue.db"
+OUTPUT_DIR = r"ingest_outputs"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+def file_key(path: str, data_dir: str) -> str:
+    """Node-independent name of a file: its POSIX path relative to the data directory"""
+    return Path(path).resolve().relative_to(Path(data_dir).resolve()).as_posix()
+
+def stable_shard(key: str, num_workers: int) -> int:
+    """Worker index owning a file; stable across runs, machines and Python versions"""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") % num_workers
+
+class WorkQueue:
+    """Shared SQLite work queue of file keys with expiring leases.
+
+    A worker leases one file at a time and heartbeats while it works; a
+    lease that is not renewed expires and the file goes to the next worker
+    that asks. Files are given up after `max_attempts` leases. Uses the
+    rollback journal (not WAL) so it also works from several hosts on a
+    shared filesystem with working POSIX locks.
+    """
+
+    def __init__(self, path: str = QUEUE_DB, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_items (
+            file_key TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker_id TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            chunk_count INTEGER,
+            error_message TEXT,
+            updated_at REAL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items (status, lease_expires)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same row
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, keys: Iterable[str]) -> int:
+        with self._transaction() as conn:
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO work_items (file_key, updated_at) VALUES (?, ?)",
+                [(key, time.time()) for key in keys]
+            )
+            return cur.rowcount
+
+    def lease(self, worker_id: str) -> Optional[str]:
+        now = time.time()
+        with self._transaction() as conn:
+            # Items whose leases ran out with no attempts left are given up
+            conn.execute(
+                "UPDATE work_items SET status = 'failed', error_message = 'lease expired too often', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT file_key FROM work_items WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY file_key LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE work_items SET status = 'leased', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE file_key = ?",
+                (worker_id, now + self.lease_seconds, now, row[0])
+            )
+            return row[0]
+
+    def heartbeat(self, worker_id: str) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND worker_id = ?",
+                (now + self.lease_seconds, now, worker_id)
+            ).rowcount
+
+    def renew(self, key: str, worker_id: str) -> bool:
+        """Extend one lease; False if it expired and another worker took the file"""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET lease_expires = ?, updated_at = ? "
+                "WHERE file_key = ? AND worker_id = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, key, worker_id)
+            ).rowcount == 1
+
+    def complete(self, key: str, worker_id: str, chunk_count: int) -> bool:
+        """Mark done; False if the lease had already passed to another worker"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET status = 'done', chunk_count = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE file_key = ? AND worker_id = ? AND status = 'leased'",
+                (chunk_count, time.time(), key, worker_id)
+            ).rowcount == 1
+
+    def retry(self, key: str, worker_id: str, error: str):
+        """Give a leased file back after a transient failure; failed once its attempts are used up"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work_items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error_message = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE file_key = ? AND worker_id = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), key, worker_id)
+            )
+
+    def fail(self, key: str, worker_id: str, error: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work_items SET status = 'failed', error_message = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE file_key = ? AND worker_id = ?",
+                (error, time.time(), key, worker_id)
+            )
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status"))
+
+    def close(self):
+        self._conn.close()
+
+class IngestWorker:
+    """One ingest node: processes files into its own SQLite + NDJSON output.
+
+    Every file is committed with a checkpoint recording the NDJSON size
+    after its lines. On restart the NDJSON is truncated back to the last
+    checkpoint and checkpointed files are skipped, so a crashed run resumes
+    exactly where it stopped. A file retried after a crash during its
+    Milvus write can leave the first attempt's rows behind; see
+    IngestCoordinator.reconcile_milvus.
+    """
+
+    def __init__(self, worker_id: str, data_dir: str, output_dir: str = OUTPUT_DIR,
+                 db_path: str = None, ndjson_path: str = None, config: ProcessingConfig = None,
+                 **budget_kwargs):
+        self.worker_id = worker_id
+        self.data_dir = data_dir
+        worker_dir = Path(output_dir) / worker_id
+        if db_path is None or ndjson_path is None:
+            worker_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path or str(worker_dir / "rag_chunks.db")
+        self.ndjson_path = ndjson_path or str(worker_dir / "chunks_bulk.ndjson")
+        self.store = ChunkStore(self.db_path)
+        self.processor = BudgetedProcessor(config or ProcessingConfig(), self.store, db_path=self.db_path,
+                                           **budget_kwargs)
+        self.done = self._resume()
+        self.processed = 0
+
+    def _resume(self) -> set:
+        offset = self.store.ndjson_checkpoint(self.worker_id)
+        if os.path.exists(self.ndjson_path) and os.path.getsize(self.ndjson_path) > offset:
+            # Lines written after the last checkpoint belong to an uncommitted file
+            with open(self.ndjson_path, "r+b") as f:
+                f.truncate(offset)
+            print(f"Truncated {self.ndjson_path} to last checkpoint ({offset} bytes)")
+        checkpoints = self.store.checkpoints()
+        quarantined = self.store.quarantined_paths()
+        # Quarantined files are retried once they change
+        done = {
+            key for key, status in checkpoints.items()
+            if status == "done" or str(Path(self.data_dir) / key) in quarantined
+        }
+        if done:
+            print(f"Resuming {self.worker_id}: {len(done)} files already checkpointed")
+        return done
+
+    def process(self, key: str, lease_check: Callable[[], bool] = None) -> Tuple[str, int]:
+        """Process one file by key: ("done" | "skipped" | "quarantined" | "retry" | "lost", chunk count).
+
+        `lease_check` is asked right before committing; when it fails the
+        output is dropped because another worker owns the file now.
+        """
+        from project.bulk_upload import append_ndjson
+        if key in self.done:
+            return "skipped", 0
+        path = str(Path(self.data_dir) / key)
+        outcome = self.processor.process(path, domain_for(path, self.data_dir))
+        if lease_check is not None and not lease_check():
+            print(f"Lease on {key} was lost; dropping this worker's output")
+            return "lost", 0
+        if outcome.status == "retry":
+            # Milvus hiccup, not the file's fault: no checkpoint, so it is processed again
+            return "retry", 0
+        if outcome.status != "done":
+            self.store.checkpoint_file(key, self.worker_id, self.store.ndjson_checkpoint(self.worker_id),
+                                       status="quarantined")
+            self.done.add(key)
+            return "quarantined", 0
+        append_ndjson(outcome.rows, self.ndjson_path, sync=True)
+        self.store.checkpoint_file(key, self.worker_id, os.path.getsize(self.ndjson_path),
+                                   outcome.document, path, outcome.rows)
+        self.done.add(key)
+        self.processed += 1
+        return "done", len(outcome.rows)
+
+    def run_files(self, keys: List[str], worker_index: int = 0, num_workers: int = 1):
+        """Static sharding: process the keys that hash to this worker"""
+        mine = [key for key in keys if stable_shard(key, num_workers) == worker_index]
+        print(f"{self.worker_id}: {len(mine)}/{len(keys)} files in shard {worker_index}/{num_workers}")
+        for key in mine:
+            for attempt in range(MAX_ATTEMPTS):
+                if self.process(key)[0] != "retry":
+                    break
+                time.sleep(2 ** attempt)
+
+    def run_queue(self, queue: WorkQueue):
+        """Dynamic sharding: lease files from the shared queue until it is drained"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(queue.lease_seconds / 3):
+                queue.heartbeat(self.worker_id)
+
+        heartbeat = threading.Thread(target=beat, name=f"heartbeat-{self.worker_id}", daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                key = queue.lease(self.worker_id)
+                if key is None:
+                    break
+                status, chunk_count = self.process(key, lambda: queue.renew(key, self.worker_id))
+                if status == "quarantined":
+                    queue.fail(key, self.worker_id, "quarantined")
+                elif status == "retry":
+                    queue.retry(key, self.worker_id, "transient failure")
+                elif status in ("done", "skipped"):
+                    queue.complete(key, self.worker_id, chunk_count)
+        finally:
+            stop.set()
+            heartbeat.join()
+        print(f"{self.worker_id}: queue drained, {queue.progress()}")
+
+    def close(self):
+        self.processor.close()
+        self.processor.report()
+        self.store.close()
+
+def default_worker_id(index: Optional[int] = None) -> str:
+    """Stable across restarts, so a restarted worker finds its own checkpoints"""
+    host = socket.gethostname()
+    return host if index is None else f"{host}-{index}"
+
+class IngestCoordinator:
+    """Fill the queue and merge per-worker outputs into the main SQLite DB and NDJSON"""
+
+    def __init__(self, output_dir: str = OUTPUT_DIR, db_path: str = None, ndjson_path: str = None):
+        from project.bulk_upload import SQLITE_DB, NDJSON_FILE
+        self.output_dir = Path(output_dir)
+        self.db_path = db_path or SQLITE_DB
+        self.ndjson_path = ndjson_path or NDJSON_FILE
+
+    @staticmethod
+    def enqueue(queue: WorkQueue, data_dir: str, extensions=None) -> int:
+        from project.bulk_upload import get_all_files
+        added = queue.enqueue(file_key(path, data_dir) for path in get_all_files(data_dir, extensions))
+        print(f"Queued {added} new files; {queue.progress()}")
+        return added
+
+    def _worker_dirs(self) -> List[Path]:
+        return sorted(d for d in self.output_dir.iterdir() if (d / "rag_chunks.db").exists())
+
+    def merge(self) -> Dict[str, int]:
+        """Fold worker stores into the main DB and rebuild the merged NDJSON.
+
+        Idempotent: tables merge with INSERT OR IGNORE/REPLACE and the NDJSON
+        is rewritten from each worker's committed prefix, then swapped in.
+        """
+        totals: Dict[str, int] = {}
+        tmp = f"{self.ndjson_path}.tmp"
+        with ChunkStore(self.db_path) as store, open(tmp, "wb") as out:
+            for worker_dir in self._worker_dirs():
+                worker_id = worker_dir.name
+                for table, count in store.merge_from(worker_dir / "rag_chunks.db").items():
+                    totals[table] = totals.get(table, 0) + count
+                with ChunkStore(worker_dir / "rag_chunks.db") as worker_store:
+                    committed = worker_store.ndjson_checkpoint(worker_id)
+                ndjson = worker_dir / "chunks_bulk.ndjson"
+                if ndjson.exists() and committed:
+                    with open(ndjson, "rb") as f:
+                        remaining = committed
+                        while remaining:
+                            block = f.read(min(remaining, 1 << 20))
+                            if not block:
+                                break
+                            out.write(block)
+                            remaining -= len(block)
+                print(f"Merged {worker_id} ({committed} NDJSON bytes)")
+        os.replace(tmp, self.ndjson_path)
+        print(f"Merge complete: {totals}")
+        return totals
+
+    def reconcile_milvus(self, class_name: str = "rag_chunks") -> int:
+        """Delete Milvus rows of documents that never reached a checkpoint (crashed attempts).
+
+        Only doc_ids the workers recorded in ingest_attempts (merged by
+        merge()) are candidates; documents ingested any other way, e.g. by
+        process_document from the CLI, are never touched.
+        """
+        from project.milvus import MilvusVectorStore
+        MilvusVectorStore.connect()
+        with ChunkStore(self.db_path) as store:
+            known = {row[0] for row in store.reader().execute("SELECT doc_id FROM documents")}
+            orphans = store.attempted_doc_ids() - known
+        if orphans:
+            MilvusVectorStore.delete_documents(sorted(orphans), class_name)
+        print(f"Reconciled Milvus: {len(orphans)} orphaned documents removed")
+        return len(orphans)
@@ -0,0 +1,209 @@
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from project.pydantic_models import Document
+from project.milvus import MilvusVectorStore
+from project.chunk_store import ChunkStore, SQLITE_DB
+from project.schema_setup import DOC_COLLECTION_NAME
+from project.deadline import Deadline, DeadlineExceeded
+
+class DocumentIndex:
+    """Coarse index of one vector per document, next to the chunk collection.
+
+    A document's vector is the normalized mean of its chunk vectors as
+    stored in Milvus (so it is always in the query embedding space).
+    Two-stage search ranks documents first and then searches chunks with a
+    `doc_id in [...]` filter. Follows tenant routing: `rag_docs__<domain>`.
+    """
+
+    @classmethod
+    def collection_name(cls, tenant: str = None) -> str:
+        return MilvusVectorStore.collection_for(tenant, DOC_COLLECTION_NAME)
+
+    @classmethod
+    def _collection(cls, name: str, dim: int = None):
+        """Loaded handle (created with `dim` if missing, else None), shared with MilvusVectorStore's residency"""
+        if name not in MilvusVectorStore._collections:
+            MilvusVectorStore.connect()
+            from pymilvus import utility
+            if not utility.has_collection(name):
+                if dim is None:
+                    return None
+                from project.schema_setup import create_collection
+                create_collection(name, documents=True, drop_existing=False, dim=dim)
+        return MilvusVectorStore._collection(name)
+
+    @staticmethod
+    def _pool(vectors: List[List[float]]) -> List[float]:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        mean = matrix.mean(axis=0)
+        return (mean / max(float(np.linalg.norm(mean)), 1e-12)).tolist()
+
+    @classmethod
+    def _chunk_vectors(cls, doc_ids: List[str], chunk_collection: str) -> Dict[str, List[List[float]]]:
+        vectors: Dict[str, List[List[float]]] = {}
+        with MilvusVectorStore._in_use(chunk_collection):
+            collection = MilvusVectorStore._collection(chunk_collection)
+            for i in range(0, len(doc_ids), 100):
+                iterator = collection.query_iterator(
+                    batch_size=1000,
+                    expr=MilvusVectorStore.in_filter("doc_id", doc_ids[i:i + 100]),
+                    output_fields=["doc_id", "embedding_vector"],
+                    consistency_level="Strong"
+                )
+                try:
+                    while True:
+                        rows = iterator.next()
+                        if not rows:
+                            break
+                        for row in rows:
+                            vectors.setdefault(row["doc_id"], []).append(row["embedding_vector"])
+                finally:
+                    iterator.close()
+        return vectors
+
+    @classmethod
+    def index_documents(cls, documents: List[Document], class_name: str = "rag_chunks"):
+        """Upsert pooled vectors for documents whose chunks are already in Milvus"""
+        by_tenant: Dict[str, List[Document]] = {}
+        for document in documents:
+            by_tenant.setdefault(document.domain, []).append(document)
+        for tenant, docs in by_tenant.items():
+            vectors = cls._chunk_vectors([doc.id for doc in docs], MilvusVectorStore.collection_for(tenant, class_name))
+            rows = [
+                {
+                    "doc_id": doc.id,
+                    "title": doc.title[:1024],
+                    "domain": doc.domain,
+                    "content_type": doc.file_type.value,
+                    "chunk_count": len(vectors[doc.id]),
+                    "embedding_vector": cls._pool(vectors[doc.id]),
+                }
+                for doc in docs if vectors.get(doc.id)
+            ]
+            if not rows:
+                continue
+            name = cls.collection_name(tenant)
+            collection = cls._collection(name, dim=len(rows[0]["embedding_vector"]))
+            with MilvusVectorStore._in_use(name):
+                collection.upsert(rows)
+            print(f"Indexed {len(rows)} document vectors in '{collection.name}'")
+
+    @classmethod
+    def top_documents(cls, query_text: str, limit: int = 10, tenant: str = None,
+                      timeout: float = None) -> List[Tuple[str, float]]:
+        """(doc_id, similarity) of the documents closest to the query"""
+        name = cls.collection_name(tenant)
+        collection = cls._collection(name)
+        if collection is None:
+            return []
+        query_vector = MilvusVectorStore.load_embeddings().embed_query(query_text)
+        with MilvusVectorStore._in_use(name):
+            results = collection.search(
+                data=[query_vector],
+                anns_field="embedding_vector",
+                param={"metric_type": "COSINE", "params": {"ef": max(64, limit)}},
+                limit=limit,
+                output_fields=[],
+                timeout=timeout
+            )
+        return [(str(hit.id), float(hit.distance)) for hit in results[0]]
+
+    @classmethod
+    def doc_filter(cls, query_text: str, tenant: str = None, top_documents: int = 10,
+                   deadline: Deadline = None) -> Optional[str]:
+        """`doc_id in [...]` over the top documents, or None (no doc index / no time).
+
+        Under a deadline the document stage gets at most half of what is
+        left and is skipped (flat search) when it overruns or time is tight.
+        """
+        doc_ids = []
+        if deadline is None:
+            doc_ids = [doc_id for doc_id, _ in cls.top_documents(query_text, top_documents, tenant)]
+        elif deadline.tight():
+            deadline.reduce("documents")
+        else:
+            try:
+                found = deadline.run("documents", cls.top_documents, query_text, top_documents, tenant,
+                                     deadline.remaining() / 2, share=0.5)
+                doc_ids = [doc_id for doc_id, _ in found]
+            except DeadlineExceeded:
+                pass
+            except Exception as e:
+                print(f"Document stage skipped: {e}")
+        return MilvusVectorStore.in_filter("doc_id", doc_ids) if doc_ids else None
+
+    @classmethod
+    def search(cls, query_text: str, limit: int = 5, tenant: str = None, top_documents: int = 10,
+               deadline: Deadline = None, group_by: str = None, group_size: int = 1):
+        """Two-stage search: top documents, then chunks within them (flat search if no doc index)"""
+        expr = cls.doc_filter(query_text, tenant, top_documents, deadline)
+        return MilvusVectorStore.search_hits(query_text, limit, tenant, expr=expr, deadline=deadline,
+                                             group_by=group_by, group_size=group_size)
+
+    @classmethod
+    def delete_documents(cls, doc_ids: List[str], tenant: str = None):
+        for name in cls._names(tenant):
+            collection = cls._collection(name)
+            if collection is not None:
+                with MilvusVectorStore._in_use(name):
+                    collection.delete(MilvusVectorStore.in_filter("doc_id", doc_ids))
+
+    @classmethod
+    def clear(cls, tenant: str = None):
+        from pymilvus import utility
+        for name in cls._names(tenant):
+            if utility.has_collection(name):
+                utility.drop_collection(name)
+            MilvusVectorStore.forget(name)
+
+    @classmethod
+    def _names(cls, tenant: str = None) -> List[str]:
+        if tenant is not None or not MilvusVectorStore._tenant_routing:
+            return [cls.collection_name(tenant)]
+        return MilvusVectorStore.tenant_collections(DOC_COLLECTION_NAME)
+
+def benchmark(queries: List[str] = None, limit: int = 10, top_documents: int = 10, tenant: str = None,
+              db_path: str = SQLITE_DB, sample: int = 50) -> Dict[str, Any]:
+    """Latency and recall of two-stage vs flat search; flat results are the reference.
+
+    Without queries, the opening words of random SQLite chunks are used.
+    """
+    if not queries:
+        with ChunkStore(db_path) as store:
+            texts = store.sample_texts(sample)
+        queries = [" ".join(text.split()[:12]) for text in texts]
+    if not queries:
+        print("No queries to benchmark")
+        return {}
+    MilvusVectorStore.get_client()
+    flat_ms, staged_ms, recalls = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        flat = MilvusVectorStore.search_hits(query, limit, tenant)
+        flat_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        staged = DocumentIndex.search(query, limit, tenant, top_documents)
+        staged_ms.append((time.perf_counter() - started) * 1000)
+        reference = {hit.chunk.id for hit in flat}
+        if reference:
+            recalls.append(len(reference & {hit.chunk.id for hit in staged}) / len(reference))
+    report = {
+        "queries": len(queries),
+        "limit": limit,
+        "top_documents": top_documents,
+        "flat_p50_ms": float(np.percentile(flat_ms, 50)),
+        "flat_p95_ms": float(np.percentile(flat_ms, 95)),
+        "two_stage_p50_ms": float(np.percentile(staged_ms, 50)),
+        "two_stage_p95_ms": float(np.percentile(staged_ms, 95)),
+        "recall_vs_flat": float(np.mean(recalls)) if recalls else 0.0,
+    }
+    for key, value in report.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+    return report
+
+if __name__ == "__main__":
+    # python -m project.doc_index [query ...]
+    benchmark(sys.argv[1:] or None)
@@ -1,14 +1,41 @@
-import uuid
+import hashlib
 from pathlib import Path
 from project.pydantic_models import Document, FileType
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-import pandas as pd
+
+def domain_for(file_path: str, root: str) -> str:
+    """Domain of a file under a data directory: its top-level folder ("general" at the top)"""
+    try:
+        parts = Path(file_path).resolve().relative_to(Path(root).resolve()).parts
+    except ValueError:
+        return "general"
+    return parts[0] if len(parts) > 1 else "general"
+
+def document_id(file_path: str) -> str:
+    """Stable doc_id for a file: hash of its resolved path and content.
+
+    Chunk ids are built from it, so loading the same file again (a retry,
+    a re-run) yields the same chunk_ids and the Milvus upsert replaces
+    rows instead of adding a second copy. A changed file gets a new id.
+    """
+    digest = hashlib.sha1(str(Path(file_path).resolve()).encode("utf-8") + b"\0")
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
 
 class DocumentLoader:
     """LangChain-based document loader"""
     
     @staticmethod
-    def load_document(file_path: str) -> Document:
+    def load_document(file_path: str, domain: str = None) -> Document:
+        """Load a file; `domain` picks its tenant collection when tenant routing is on"""
+        document = DocumentLoader._load(file_path)
+        if domain:
+            document.domain = domain
+        return document
+
+    @staticmethod
+    def _load(file_path: str) -> Document:
         path = Path(file_path)
         if not path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
@@ -30,7 +57,7 @@ class DocumentLoader:
         else:
             raise ValueError(f"Unsupported file type: {ext}")
             
-        doc_id = str(uuid.uuid4())[:8]
+        doc_id = document_id(str(path))
         print(f"Loading {file_type.value.upper()}: {path.name}")
         
         # Route to correct loader based on actual file type
@@ -47,6 +74,7 @@ class DocumentLoader:
 
     @staticmethod
     def load_pdf(file_path: str, doc_id: str) -> Document:
+        from langchain_community.document_loaders import PyPDFLoader
         loader = PyPDFLoader(file_path)
         pages = loader.load()
         content = "\n".join([page.page_content for page in pages])
@@ -91,6 +119,7 @@ class DocumentLoader:
     @staticmethod  
     def load_csv_tsv(file_path: str, doc_id: str, file_type: FileType) -> Document:
         """Load CSV/TSV file"""
+        import pandas as pd
         sep = "," if file_type == FileType.CSV else "\t"
         try:
             df = pd.read_csv(file_path, sep=sep)
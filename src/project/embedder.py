@@ -1,9 +1,6 @@
-from typing import List
+from typing import List, Union
 from project.pydantic_models import Chunk, EmbeddingModel
-
-# LangChain embeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-from sentence_transformers import SentenceTransformer
+from project.records import ChunkRecord
 
 class EmbeddingService:
     """LangChain-based embedding service"""
@@ -15,23 +12,28 @@ class EmbeddingService:
     def _load_model(self):
         """Load embedding model"""
         print(f"Loading embedding model: {self.model_type.value}")
+        # The model Milvus stores and queries with, so chunk vectors can be inserted as they are
+        from project.milvus import MilvusVectorStore
+        model_name = MilvusVectorStore.EMBEDDING_MODEL
         
         if self.model_type == EmbeddingModel.HUGGINGFACE:
-            # LangChain HuggingFace embeddings
+            # LangChain HuggingFace embeddings (imported here: torch is slow to import)
+            from langchain_huggingface import HuggingFaceEmbeddings
             return HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
+                model_name=model_name,
                 model_kwargs={'device': 'cpu'},
                 encode_kwargs={'normalize_embeddings': True}
             )
         
         elif self.model_type == EmbeddingModel.SENTENCE_TRANSFORMER:
             # Direct sentence-transformers (faster)
-            return SentenceTransformer('all-MiniLM-L6-v2')
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name)
         
         else:
             raise ValueError(f"Unknown embedding model: {self.model_type}")
     
-    def embed_chunks(self, chunks: List[Chunk]) -> List[Chunk]:
+    def embed_chunks(self, chunks: List[Union[Chunk, ChunkRecord]]) -> List[Union[Chunk, ChunkRecord]]:
         """Add embeddings to chunks"""
         if not chunks:
             return chunks
@@ -56,6 +58,22 @@ class EmbeddingService:
         print("Embeddings generated successfully")
         return chunks
     
+    def _sentence_model(self):
+        """The SentenceTransformer doing the work (LangChain keeps it in `_client`)"""
+        if self.model_type == EmbeddingModel.HUGGINGFACE:
+            return self.embeddings._client
+        return self.embeddings
+
+    @property
+    def max_seq_length(self) -> int:
+        """Tokens the model reads per text; anything after is truncated"""
+        return self._sentence_model().max_seq_length
+
+    def token_counts(self, texts: List[str]) -> List[int]:
+        """Tokens per text as the model tokenizes it, special tokens included"""
+        tokenizer = self._sentence_model().tokenizer
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=True, verbose=False)["input_ids"]]
+
     def embed_query(self, query: str) -> List[float]:
         """Generate embedding for query"""
         if self.model_type == EmbeddingModel.HUGGINGFACE:
@@ -0,0 +1,71 @@
+import hashlib
+import math
+import threading
+from typing import Iterable, List
+import numpy as np
+from project.chunk_store import ChunkStore
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (numpy bit array, double hashing)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        bits = -self.capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.num_bits = max(64, int(math.ceil(bits / 64)) * 64)
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = np.zeros(self.num_bits // 64, dtype=np.uint64)
+        self.count = 0
+
+    def _positions(self, value: str) -> np.ndarray:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return np.array([(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)], dtype=np.uint64)
+
+    def add(self, value: str):
+        positions = self._positions(value)
+        np.bitwise_or.at(self._bits, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        positions = self._positions(value)
+        words = self._bits[positions >> np.uint64(6)]
+        return bool(np.all(words & (np.uint64(1) << (positions & np.uint64(63)))))
+
+class ChunkIdIndex:
+    """In-memory "maybe stored" filter for chunk_ids, seeded from the SQLite chunks table.
+
+    A miss means the id was never written by this pipeline, so the row can
+    go straight to Milvus; a hit must be confirmed against Milvus. The
+    filter is rebuilt (twice as large) from SQLite once it holds more ids
+    than it was sized for, so the false-positive rate stays near
+    `error_rate`. Only the bit array is kept in memory: ids written to
+    Milvus but not to SQLite are lost on a rebuild, which costs an upsert
+    of those rows later, never a duplicate.
+    """
+
+    def __init__(self, store: ChunkStore, error_rate: float = 0.001, min_capacity: int = 100_000):
+        self.store = store
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self._lock = threading.Lock()
+        self._filter = self._load(min_capacity)
+
+    def _load(self, capacity: int) -> BloomFilter:
+        bloom = BloomFilter(max(capacity, self.store.count_chunks() * 2), self.error_rate)
+        for (chunk_id,) in self.store.reader().execute("SELECT chunk_id FROM chunks"):
+            bloom.add(chunk_id)
+        print(f"Chunk id filter loaded: {bloom.count} ids, {bloom.num_bits // 8 // 1024} KiB")
+        return bloom
+
+    def maybe_present(self, chunk_ids: Iterable[str]) -> List[str]:
+        with self._lock:
+            return [chunk_id for chunk_id in chunk_ids if chunk_id in self._filter]
+
+    def add(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._filter.add(chunk_id)
+            if self._filter.count > self._filter.capacity:
+                self._filter = self._load(self._filter.capacity * 2)
@@ -0,0 +1,274 @@
+import cProfile
+import hashlib
+import multiprocessing
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from project.chunk_store import ChunkStore, SQLITE_DB
+from project.pydantic_models import Document, ProcessingConfig
+
+FILE_TIMEOUT_SECONDS = 300
+FILE_MAX_RSS_MB = 4096
+STARTUP_TIMEOUT_SECONDS = 600
+# Stages that talk to Milvus; a failure there says nothing about the file, so it is retried
+SERVICE_STAGES = ("store", "doc_index", "stats")
+
+def read_rss_mb(pid: int) -> float:
+    """Current resident set size of a process from /proc (0 where unavailable)"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+@dataclass(slots=True)
+class FileOutcome:
+    file_path: str
+    status: str  # "done", "retry" (transient, not quarantined), "timeout", "memory", "crashed" or "error"
+    stage: Optional[str]
+    elapsed: float
+    peak_rss_mb: float
+    document: Optional[Document] = None
+    rows: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    profiles: Tuple[str, ...] = ()
+    baseline_rss_mb: float = 0.0  # child RSS when the file started; the budget applies to growth over it
+
+def is_transient(error: BaseException, stage: Optional[str]) -> bool:
+    """Failures worth retrying later rather than quarantining the file"""
+    return stage in SERVICE_STAGES or isinstance(error, (ConnectionError, TimeoutError))
+
+def _artefact_stem(profile_dir: str, file_path: str) -> str:
+    digest = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(profile_dir, f"{Path(file_path).stem}_{digest}")
+
+def _worker_main(conn, config: ProcessingConfig, db_path: str, profile_dir: Optional[str], trace_memory: bool):
+    """Child process: owns the models and processes one file per request"""
+    from project.processor import DocumentProcessor
+    from project.records import chunk_dicts
+    store = ChunkStore(db_path) if config.deduplicate else None
+    processor = DocumentProcessor(config, store=store)
+    conn.send(("ready", None))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        file_path, domain = request
+        profiler = cProfile.Profile() if profile_dir else None
+        stage = None
+
+        def on_stage(name):
+            nonlocal stage
+            stage = name
+            conn.send(("stage", name))
+
+        try:
+            if trace_memory:
+                tracemalloc.start(10)
+            if profiler is not None:
+                profiler.enable()
+            document, chunks = processor.process_document(
+                file_path, on_stage=on_stage, domain=domain,
+                on_document=lambda document: conn.send(("document", document.id))
+            )
+            if profiler is not None:
+                profiler.disable()
+            profiles = []
+            if profile_dir:
+                stem = _artefact_stem(profile_dir, file_path)
+                profiler.dump_stats(f"{stem}.prof")
+                profiles.append(f"{stem}.prof")
+                if trace_memory:
+                    top = tracemalloc.take_snapshot().statistics("lineno")[:25]
+                    with open(f"{stem}.mem.txt", 'w', encoding='utf-8') as f:
+                        f.write("\n".join(str(stat) for stat in top))
+                    profiles.append(f"{stem}.mem.txt")
+            conn.send(("done", (document, chunk_dicts(document, chunks), profiles)))
+        except Exception as e:
+            conn.send(("error", (f"{type(e).__name__}: {e}", is_transient(e, stage))))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if trace_memory:
+                tracemalloc.stop()
+    if store is not None:
+        store.close()
+
+class BudgetedProcessor:
+    """Run DocumentProcessor in a child process under per-file budgets.
+
+    Each file gets `timeout` seconds of wall clock and `max_rss_mb` of
+    resident memory growth over the child's RSS when the file started
+    (sampled from /proc, so only enforced on Linux). A file that exceeds
+    either, fails to parse, or takes the child down is recorded in the
+    quarantine table with the stage it was in, and the child is replaced.
+    Failures while talking to Milvus come back as "retry" and are not
+    quarantined. The child is long-lived between files, so models load
+    once per child; it is recycled once it has grown by `max_rss_mb` since
+    its models loaded.
+
+    With `profile_dir` set, every file is run under cProfile (and
+    tracemalloc if `trace_memory`), keeping the artefacts of the
+    `profile_slowest` slowest files only.
+    """
+
+    def __init__(self, config: ProcessingConfig, store: ChunkStore, db_path: str = SQLITE_DB,
+                 timeout: float = FILE_TIMEOUT_SECONDS, max_rss_mb: Optional[float] = FILE_MAX_RSS_MB,
+                 poll_interval: float = 0.2, profile_dir: Optional[str] = None, profile_slowest: int = 5,
+                 trace_memory: bool = False):
+        self.config = config
+        self.store = store
+        self.db_path = db_path
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.poll_interval = poll_interval
+        self.profile_dir = profile_dir if profile_slowest > 0 else None
+        self.profile_slowest = profile_slowest
+        self.trace_memory = trace_memory and self.profile_dir is not None
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        self._process = None
+        self._conn = None
+        self._started_rss = 0.0  # child RSS once its models are loaded
+        self.slowest: List[Tuple[float, str, Tuple[str, ...]]] = []
+        self.quarantined = 0
+
+    def _start(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_conn, self.config, self.db_path, self.profile_dir, self.trace_memory),
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not self._conn.poll(STARTUP_TIMEOUT_SECONDS):
+            self._kill()
+            raise RuntimeError("Ingest worker did not start")
+        kind, _ = self._conn.recv()
+        if kind != "ready":
+            raise RuntimeError(f"Ingest worker failed to start: {kind}")
+        self._started_rss = read_rss_mb(self._process.pid)
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process, self._conn = None, None
+
+    def process(self, file_path: str, domain: str = None) -> FileOutcome:
+        if (self._process is not None and self.max_rss_mb
+                and read_rss_mb(self._process.pid) - self._started_rss > self.max_rss_mb):
+            # Heap left over from earlier files alone is a file's budget: start a fresh child
+            print(f"Recycling ingest worker at {read_rss_mb(self._process.pid):.0f} MB RSS")
+            self.close()
+        if self._process is None or not self._process.is_alive():
+            self._start()
+        baseline = read_rss_mb(self._process.pid)
+        self._conn.send((file_path, domain))
+        started = time.monotonic()
+        stage, peak = "queued", baseline
+        while True:
+            elapsed = time.monotonic() - started
+            try:
+                ready = self._conn.poll(max(0.0, min(self.poll_interval, self.timeout - elapsed)))
+                message = self._conn.recv() if ready else None
+            except (EOFError, OSError):
+                message = ("crashed", None)
+            peak = max(peak, read_rss_mb(self._process.pid))
+            elapsed = time.monotonic() - started
+            if message is not None:
+                kind, payload = message
+                if kind == "stage":
+                    stage = payload
+                    continue
+                if kind == "document":
+                    # Before any chunk is written, so reconcile_milvus can find a crashed attempt
+                    self.store.record_attempt(payload, file_path)
+                    continue
+                if kind == "done":
+                    document, rows, profiles = payload
+                    outcome = FileOutcome(file_path, "done", stage, elapsed, peak, document, rows,
+                                          baseline_rss_mb=baseline)
+                    outcome.profiles = self._keep_profile(elapsed, file_path, tuple(profiles))
+                    return outcome
+                if kind == "error":
+                    error, transient = payload
+                    if transient:
+                        print(f"Transient failure for {file_path} in stage '{stage}', will retry: {error}")
+                        return FileOutcome(file_path, "retry", stage, elapsed, peak, error=error,
+                                           baseline_rss_mb=baseline)
+                    return self._quarantine(FileOutcome(file_path, "error", stage, elapsed, peak, error=error,
+                                                        baseline_rss_mb=baseline))
+                self._kill()
+                return self._quarantine(FileOutcome(file_path, "crashed", stage, elapsed, peak,
+                                                    baseline_rss_mb=baseline))
+            if not self._process.is_alive():
+                self._kill()
+                return self._quarantine(FileOutcome(file_path, "crashed", stage, elapsed, peak,
+                                                    baseline_rss_mb=baseline))
+            if elapsed >= self.timeout:
+                self._kill()
+                return self._quarantine(FileOutcome(file_path, "timeout", stage, elapsed, peak,
+                                                    baseline_rss_mb=baseline))
+            if self.max_rss_mb and peak - baseline > self.max_rss_mb:
+                self._kill()
+                return self._quarantine(FileOutcome(file_path, "memory", stage, elapsed, peak,
+                                                    baseline_rss_mb=baseline))
+
+    def _quarantine(self, outcome: FileOutcome) -> FileOutcome:
+        self.store.quarantine_file(
+            outcome.file_path, outcome.status, outcome.stage, outcome.elapsed, outcome.peak_rss_mb, outcome.error
+        )
+        self.quarantined += 1
+        print(f"Quarantined {outcome.file_path}: {outcome.status} in stage '{outcome.stage}' "
+              f"after {outcome.elapsed:.1f}s, peak RSS {outcome.peak_rss_mb:.0f} MB "
+              f"(+{outcome.peak_rss_mb - outcome.baseline_rss_mb:.0f} MB for this file)"
+              + (f" ({outcome.error})" if outcome.error else ""))
+        return outcome
+
+    def _keep_profile(self, elapsed: float, file_path: str, profiles: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Keep artefacts of the N slowest files seen so far, delete the rest"""
+        if not profiles:
+            return ()
+        # A re-processed file overwrote its earlier artefacts; keep one entry per file
+        self.slowest = [entry for entry in self.slowest if entry[1] != file_path]
+        self.slowest.append((elapsed, file_path, profiles))
+        self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+        evicted = self.slowest[self.profile_slowest:]
+        self.slowest = self.slowest[:self.profile_slowest]
+        for _, _, paths in evicted:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        return profiles if any(entry[1] == file_path for entry in self.slowest) else ()
+
+    def report(self):
+        if self.quarantined:
+            print(f"{self.quarantined} files quarantined this run")
+        for elapsed, file_path, paths in self.slowest:
+            print(f"Slow: {file_path} {elapsed:.1f}s -> {', '.join(paths)}")
+
+    def close(self):
+        if self._process is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+                self._process.join(timeout=10)
+            except OSError:
+                pass
+        self._kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
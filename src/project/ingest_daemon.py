@@ -0,0 +1,316 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional
+from project.chunk_store import ChunkStore, SQLITE_DB
+from project.records import chunk_dicts
+
+WATCH_DIRS = [r"D:\genai\RAG\test"]
+EXTENSIONS = {".json", ".txt", ".csv", ".tsv", ".pdf"}
+DEBOUNCE_SECONDS = 2.0
+MAX_BATCH_FILES = 20
+POLL_INTERVAL = 2.0
+# Flush/compact/reload once ingest has been quiet this long
+FINALIZE_AFTER_SECONDS = 60.0
+
+Event = Tuple[str, str]  # (path, "changed" | "deleted" | "rescan")
+
+class InotifyWatcher:
+    """Recursive directory watcher on Linux inotify (via libc, no extra dependency)"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, directories: List[str]):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, str] = {}
+        for directory in directories:
+            self._add_tree(directory)
+
+    def _add_tree(self, directory: str) -> List[str]:
+        """Watch a directory and its subdirectories; returns files already inside"""
+        existing = []
+        for root, dirs, files in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, root.encode(), self.WATCH_MASK)
+            if wd < 0:
+                print(f"Cannot watch {root}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._watches[wd] = root
+            existing.extend(os.path.join(root, name) for name in files)
+        return existing
+
+    def events(self, timeout: float) -> List[Event]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                events.append(("", "rescan"))
+                continue
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # Files may land before the new watch exists; pick them up now
+                    events.extend((p, "changed") for p in self._add_tree(path))
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    events.append((path, "deleted"))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                events.append((path, "changed"))
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                events.append((path, "deleted"))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+class PollingWatcher:
+    """Portable fallback: diff (mtime, size) snapshots every `interval` seconds"""
+
+    def __init__(self, directories: List[str], interval: float = POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_poll = time.monotonic() + interval
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        stack = list(self.directories)
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def events(self, timeout: float) -> List[Event]:
+        wait = self._next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self._next_poll = time.monotonic() + self.interval
+        current = self._scan()
+        events = [(p, "changed") for p, sig in current.items() if self._snapshot.get(p) != sig]
+        events.extend((p, "deleted") for p in self._snapshot if p not in current)
+        self._snapshot = current
+        return events
+
+    def close(self):
+        pass
+
+def create_watcher(directories: List[str], use_inotify: Optional[bool] = None):
+    if use_inotify is None:
+        use_inotify = sys.platform.startswith("linux")
+    if use_inotify:
+        try:
+            return InotifyWatcher(directories)
+        except OSError as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(directories)
+
+class IngestDaemon:
+    """Watch directories and keep Milvus/SQLite in sync with the files in them.
+
+    Events are debounced per path; once a path has been quiet for
+    `debounce` seconds it is ingested together with other ready files in
+    batches of up to `max_batch_files` (one embed call, one insert).
+    Modified files replace their previous chunks, deleted files are
+    removed from both stores. Milvus is finalized (flush, compaction,
+    index barrier) once writes have been quiet for `finalize_after`
+    seconds, and on shutdown.
+    """
+
+    def __init__(self, directories: List[str] = None, db_path: str = SQLITE_DB,
+                 debounce: float = DEBOUNCE_SECONDS, max_batch_files: int = MAX_BATCH_FILES,
+                 use_inotify: Optional[bool] = None, initial_scan: bool = True,
+                 finalize_after: float = FINALIZE_AFTER_SECONDS, replica_number: int = 1):
+        self.directories = [str(Path(d).resolve()) for d in (directories or WATCH_DIRS)]
+        self.debounce = debounce
+        self.max_batch_files = max_batch_files
+        self.initial_scan = initial_scan
+        self.use_inotify = use_inotify
+        self.finalize_after = finalize_after
+        self.replica_number = replica_number
+        self._last_write: Optional[float] = None
+        self.store = ChunkStore(db_path)
+        self._processor = None
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._stop = threading.Event()
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            from project.processor import DocumentProcessor
+            from project.pydantic_models import ProcessingConfig
+            self._processor = DocumentProcessor(ProcessingConfig(), store=self.store)
+        return self._processor
+
+    @staticmethod
+    def _wanted(path: str) -> bool:
+        return Path(path).suffix.lower() in EXTENSIONS
+
+    def _domain(self, path: str) -> str:
+        """Top-level folder under the watched directory the path is in"""
+        from project.doc_reader import domain_for
+        root = next((d for d in self.directories if path.startswith(d + os.sep)), None)
+        return domain_for(path, root) if root is not None else "general"
+
+    def _queue(self, path: str, kind: str):
+        self._pending[path] = (kind, time.monotonic())
+
+    def rescan(self):
+        """Queue files that are new or modified since they were last ingested"""
+        processed = self.store.processed_paths()
+        seen = set()
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if not self._wanted(path):
+                        continue
+                    seen.add(path)
+                    last = processed.get(path)
+                    mtime = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                    if last is None or mtime > last:
+                        self._queue(path, "changed")
+        for path in processed:
+            if path not in seen and any(path.startswith(d + os.sep) for d in self.directories):
+                self._queue(path, "deleted")
+
+    def run(self):
+        watcher = create_watcher(self.directories, self.use_inotify)
+        print(f"Watching {', '.join(self.directories)} with {type(watcher).__name__}")
+        if self.initial_scan:
+            self.rescan()
+        try:
+            while not self._stop.is_set():
+                for path, kind in watcher.events(timeout=self._next_timeout()):
+                    if kind == "rescan":
+                        self.rescan()
+                    elif kind == "deleted" or self._wanted(path):
+                        self._queue(path, kind)
+                self._flush_ready()
+                if self._last_write is not None and time.monotonic() - self._last_write >= self.finalize_after:
+                    self._finalize()
+        finally:
+            if self._last_write is not None:
+                self._finalize()
+            watcher.close()
+            self.store.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def _finalize(self):
+        from project.milvus import MilvusVectorStore
+        self._last_write = None
+        MilvusVectorStore.finalize_ingest(replica_number=self.replica_number)
+
+    def _next_timeout(self) -> float:
+        if not self._pending:
+            return 1.0
+        oldest = min(ts for _, ts in self._pending.values())
+        return max(0.05, oldest + self.debounce - time.monotonic())
+
+    def _flush_ready(self):
+        now = time.monotonic()
+        ready = [p for p, (_, ts) in self._pending.items() if now - ts >= self.debounce]
+        if not ready:
+            return
+        changed = []
+        for path in ready:
+            kind, _ = self._pending.pop(path)
+            if kind == "deleted" and not os.path.exists(path):
+                self._remove(path, include_children=True)
+            elif os.path.isfile(path):
+                changed.append(path)
+        for i in range(0, len(changed), self.max_batch_files):
+            self._ingest(changed[i:i + self.max_batch_files])
+
+    def _remove(self, path: str, include_children: bool = False):
+        docs = self.store.documents_for_path(path, include_children)
+        if docs:
+            self._remove_documents(docs)
+            print(f"Removed {len(docs)} documents for {path}")
+
+    def _remove_documents(self, docs: List[Dict[str, str]]):
+        from project.milvus import MilvusVectorStore
+        by_domain: Dict[str, List[str]] = {}
+        for doc in docs:
+            by_domain.setdefault(doc["domain"], []).append(doc["doc_id"])
+        for domain, doc_ids in by_domain.items():
+            chunk_ids, promoted = self.store.delete_documents(doc_ids)
+            MilvusVectorStore.delete_documents(doc_ids, tenant=domain, chunk_ids=chunk_ids)
+            if promoted:
+                # Duplicates that took over a deleted canonical's text
+                MilvusVectorStore.insert_chunks(promoted)
+        self._last_write = time.monotonic()
+
+    def _ingest(self, paths: List[str]):
+        started = time.monotonic()
+        previous = {path: self.store.documents_for_path(path) for path in paths}
+        replacing = [doc["doc_id"] for docs in previous.values() for doc in docs]
+        results = self.processor.process_batch(paths, {path: self._domain(path) for path in paths}, replacing)
+        rows = [row for _, document, chunks in results for row in chunk_dicts(document, chunks)]
+        if rows:
+            self.store.insert_chunks(rows)
+            self._last_write = time.monotonic()
+        for path, document, _ in results:
+            self.store.upsert_document(document, path, domain=document.domain)
+            # process_batch leaves out files whose insert failed, so the old
+            # version is dropped only once the new one is in Milvus. An
+            # unchanged file keeps its doc_id and was just upserted in place.
+            stale = [doc for doc in previous[path] if doc["doc_id"] != document.id]
+            if stale:
+                self._remove_documents(stale)
+        print(f"Ingested {len(results)}/{len(paths)} files ({len(rows)} chunks) "
+              f"in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    daemon = IngestDaemon(sys.argv[1:] or None)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\nIngest daemon stopped")
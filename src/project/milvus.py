@@ -1,49 +1,243 @@
+import json
+import re
 import time
-from langchain_milvus import Milvus
-from langchain_huggingface import HuggingFaceEmbeddings
-from typing import List, Dict, Any
-from project.pydantic_models import Chunk, Document, SearchResult
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Tuple, Union
+from project.pydantic_models import Chunk, ChunkingMethod, Document, SearchResult
+from project.records import ChunkRecord, SearchHit, chunk_dicts, to_results, _METHOD_VALUES
+from project.chunk_store import ChunkStore, ChunkHydrator, SQLITE_DB
+from project.deadline import Deadline, DeadlineExceeded
+
+# pymilvus, langchain_milvus and the embedding model are imported on first
+# use so stats/clear commands don't pay for torch and langchain at startup
 
 class MilvusVectorStore:
-    _vectorstore = None
+    """Collection names used here are aliases once a blue/green rebuild has run
+    (see rebuild.py); every read and write goes through the name, never the
+    versioned collection behind it."""
+    DEFAULT_TENANT = "general"
+    EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+    _vectorstores = {}  # collection name -> LangChain Milvus store
     _embeddings = None
     _connected = False
+    # Slim mode: Milvus keeps vector + scalars, chunk text is hydrated from SQLite
+    _slim = False
+    _hydrator = None
+    _collections = {}
+    # Tenant routing: one collection per domain, so tenants never share an index
+    _tenant_routing = False
+    _tenant_slugs: Dict[str, str] = {}  # collection slug -> tenant that claimed it
+    # Bloom filter of chunk_ids that may already be stored (see id_filter.py)
+    _id_index = None
+    # Loads collections on first query and releases cold ones (see residency.py)
+    _residency = None
+    # (collection, field) -> whether Milvus can group on it server-side (2.4+, scalar schema fields only)
+    _grouping_fields: Dict[Tuple[str, str], bool] = {}
+    # Milvus caps offset + limit of one search at 16384
+    MAX_SEARCH_WINDOW = 16384
 
     @classmethod
-    def _wait_for_milvus(cls, max_retries=10, delay=3):
+    def _wait_for_milvus(cls, max_retries=10, delay=3, deadline: Deadline = None):
+        """Retry until Milvus answers; with a deadline, never wait or sleep past it"""
         print("Connecting to Milvus...")
         for attempt in range(max_retries):
+            timeout = 10 if deadline is None else min(10, deadline.remaining())
             try:
                 from pymilvus import connections
-                connections.connect("default", host="localhost", port="19530", timeout=10)
+                if timeout <= 0:
+                    break
+                connections.connect("default", host="localhost", port="19530", timeout=timeout)
                 if connections.get_connection_addr("default"):
                     print("Milvus ready")
                     return True
             except Exception:
+                if deadline is not None and deadline.remaining() <= delay:
+                    break
                 if attempt < max_retries - 1:
                     time.sleep(delay)
+        if deadline is not None:
+            deadline.miss("connect")
+            raise DeadlineExceeded("connect")
         raise ConnectionError("Milvus connection failed")
 
     @classmethod
     def get_client(cls):
+        """Connect and load the embedding model (needed for inserts and searches)"""
+        cls.load_embeddings()
+        cls.connect()
+        return True
+
+    @classmethod
+    def connect(cls, deadline: Deadline = None):
+        """Connect only; enough for stats, clear and admin operations"""
+        if not cls._connected:
+            cls._wait_for_milvus(deadline=deadline)
+            cls._connected = True
+        return True
+
+    @classmethod
+    def load_embeddings(cls):
         if cls._embeddings is None:
             print("Loading embeddings...")
+            from langchain_huggingface import HuggingFaceEmbeddings
             cls._embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-mpnet-base-v2",
+                model_name=cls.EMBEDDING_MODEL,
                 model_kwargs={'device': 'cpu'},
                 encode_kwargs={'normalize_embeddings': True}
             )
-        if not cls._connected:
-            cls._wait_for_milvus()
-            cls._connected = True
-        return True
+        return cls._embeddings
+
+    @classmethod
+    def use_embedding_model(cls, model_name: str):
+        """Switch query/insert embeddings, e.g. after a rebuild migrated the model"""
+        if model_name != cls.EMBEDDING_MODEL:
+            cls.EMBEDDING_MODEL = model_name
+            cls._embeddings = None
+            cls._vectorstores = {}
+
+    @classmethod
+    def enable_slim_mode(cls, db_path: str = SQLITE_DB, cache_size: int = 10000):
+        """Switch to slim collections; chunk text is read from the SQLite chunks table"""
+        cls.get_client()
+        cls._slim = True
+        cls._vectorstores = {}
+        cls._hydrator = ChunkHydrator(ChunkStore(db_path), max_entries=cache_size)
+        print(f"Slim mode enabled (text from {db_path})")
+
+    @classmethod
+    def enable_tenant_routing(cls):
+        """Route each domain to its own collection (<class_name>__<domain>)"""
+        cls._tenant_routing = True
+        print("Tenant routing enabled")
+
+    @classmethod
+    def enable_residency(cls, budget_mb: float, prewarm: List[str] = None, state_path: str = None,
+                         replica_number: int = 1):
+        """Load collections on demand and keep the loaded set within `budget_mb` of query-node memory.
+
+        `prewarm` lists tenants to load up front; without it the hottest
+        collections recorded in `state_path` are loaded.
+        """
+        cls.connect()
+        from project.residency import ResidencyManager
+        # A released collection's cached handles must not be reused
+        cls._residency = ResidencyManager(budget_mb, replica_number, state_path, on_release=cls.forget)
+        cls._residency.sync()
+        cls._residency.prewarm([cls.collection_for(tenant) for tenant in prewarm] if prewarm else None)
+        return cls._residency
+
+    @classmethod
+    def _ensure_loaded(cls, name: str, collection=None, deadline: Deadline = None):
+        """Load through the residency manager when enabled, otherwise plainly"""
+        if cls._residency is None:
+            if collection is not None:
+                collection.load()
+            return
+        try:
+            cls._residency.touch(name, deadline.remaining() if deadline is not None else None)
+        except Exception:
+            if deadline is not None and deadline.expired():
+                deadline.miss("load")
+                raise DeadlineExceeded("load") from None
+            raise
+
+    @classmethod
+    def _in_use(cls, name: str, deadline: Deadline = None):
+        """Context that keeps a collection loaded (pinned against eviction) while a request uses it"""
+        if cls._residency is None:
+            return nullcontext()
+        return cls._pinned(name, deadline)
+
+    @classmethod
+    @contextmanager
+    def _pinned(cls, name: str, deadline: Deadline = None):
+        with cls._residency.pinned(name):
+            cls._ensure_loaded(name, deadline=deadline)
+            yield
+
+    @classmethod
+    def collection_for(cls, tenant: str = None, class_name: str = "rag_chunks") -> str:
+        if not cls._tenant_routing:
+            return class_name
+        tenant = tenant or cls.DEFAULT_TENANT
+        slug = re.sub(r"[^0-9a-z_]", "_", tenant.lower())
+        # `_v<digits>` is reserved for rebuild versions (schema_setup.VERSION_PATTERN)
+        slug = re.sub(r"(_v\d+)$", r"\1_", slug)
+        # "a-b" and "a_b" would share a collection; the first tenant seen keeps the slug
+        claimed = cls._tenant_slugs.setdefault(slug, tenant)
+        if claimed != tenant:
+            raise ValueError(f"Tenant '{tenant}' collides with '{claimed}' (both map to '{class_name}__{slug}')")
+        return f"{class_name}__{slug}"
+
+    @classmethod
+    def tenant_collections(cls, class_name: str = "rag_chunks") -> List[str]:
+        """Existing per-tenant collections for a base collection name"""
+        cls.connect()
+        from pymilvus import utility
+        from project.schema_setup import VERSION_PATTERN
+        prefix = f"{class_name}__"
+        names = set()
+        for name in utility.list_collections():
+            if not name.startswith(prefix):
+                continue
+            # Versioned rebuild targets are served through their alias
+            match = VERSION_PATTERN.match(name)
+            names.add(match.group("base") if match else name)
+        return sorted(names)
+
+    @classmethod
+    def _target_collections(cls, class_name: str, tenant: str = None) -> List[str]:
+        """One tenant's collection, or every tenant's when routing and no tenant given"""
+        if tenant is not None or not cls._tenant_routing:
+            return [cls.collection_for(tenant, class_name)]
+        return cls.tenant_collections(class_name)
+
+    @classmethod
+    def _route(cls, rows: List[Dict], class_name: str) -> Dict[str, List[Dict]]:
+        if not cls._tenant_routing:
+            return {class_name: rows}
+        routed = {}
+        for row in rows:
+            routed.setdefault(cls.collection_for(row.get("domain"), class_name), []).append(row)
+        return routed
+
+    @classmethod
+    def _collection(cls, class_name: str = "rag_chunks"):
+        """Loaded pymilvus Collection handle, cached per name.
+
+        With residency every call goes through touch(), so a collection
+        released since the handle was cached is loaded again; wrap the use
+        in _in_use() to keep it from being evicted meanwhile.
+        """
+        collection = cls._collections.get(class_name)
+        if collection is None:
+            cls.connect()
+            from pymilvus import Collection
+            if cls._slim:
+                from project.schema_setup import create_collection
+                create_collection(class_name, slim=True, drop_existing=False)
+            collection = Collection(class_name)
+            if cls._residency is None:
+                collection.load()
+            cls._collections[class_name] = collection
+        if cls._residency is not None:
+            cls._ensure_loaded(class_name)
+        return collection
 
     @classmethod
     def setup_schema(cls, class_name: str = "rag_chunks"):
         cls.get_client()
+        if cls._slim:
+            return
+        from langchain_milvus import Milvus
         connection_args = {"uri": "http://localhost:19530"}
+        if cls._residency is not None:
+            from pymilvus import utility
+            if utility.has_collection(class_name):
+                # LangChain loads an existing collection in its constructor; load it within the budget first
+                cls._ensure_loaded(class_name)
         try:
-            cls._vectorstore = Milvus(
+            cls._vectorstores[class_name] = Milvus(
                 embedding_function=cls._embeddings,
                 collection_name=class_name,
                 connection_args=connection_args,
@@ -65,15 +259,108 @@ class MilvusVectorStore:
             raise e
 
     @classmethod
-    def insert_chunks(cls, chunk_dicts: List[Dict], class_name: str = "rag_chunks"):
-        """NEW: Store with dicts for batch/bulk mode (agentic and efficient)"""
-        if cls._vectorstore is None:
+    def create_collection(cls, class_name: str = "rag_chunks"):
+        """Create an empty collection in the current mode's schema, if it does not exist"""
+        if cls._slim:
+            from project.schema_setup import create_collection
+            cls.connect()
+            create_collection(class_name, slim=True, drop_existing=False)
+            return
+        store = cls._store(class_name)
+        if store.col is None:
+            # LangChain creates its collection on the first insert, sized from the first vector
+            store._init(embeddings=[[cls.load_embeddings().embed_query("dimension probe")]])
+            if cls._residency is not None:
+                # LangChain loaded it on creation
+                cls._residency.register(class_name)
+            print(f"Collection '{class_name}' created")
+
+    @classmethod
+    def forget(cls, class_name: str = "rag_chunks"):
+        """Drop cached handles so the next call re-resolves the name (after an alias swap)"""
+        cls._vectorstores.pop(class_name, None)
+        cls._collections.pop(class_name, None)
+        cls._grouping_fields = {key: value for key, value in cls._grouping_fields.items() if key[0] != class_name}
+
+    @classmethod
+    def _store(cls, class_name: str = "rag_chunks"):
+        if class_name not in cls._vectorstores:
             cls.setup_schema(class_name)
+        return cls._vectorstores[class_name]
+
+    @classmethod
+    def id_index(cls):
+        if cls._id_index is None:
+            from project.id_filter import ChunkIdIndex
+            store = cls._hydrator.store if cls._hydrator is not None else ChunkStore(SQLITE_DB)
+            cls._id_index = ChunkIdIndex(store)
+        return cls._id_index
+
+    @classmethod
+    def _existing_ids(cls, class_name: str, chunk_ids: List[str]) -> set:
+        """chunk_ids already in the collection: Bloom filter first, Milvus only for possible hits"""
+        maybe = cls.id_index().maybe_present(chunk_ids)
+        if not maybe:
+            return set()
+        if cls._slim:
+            cls._collection(class_name)  # created here if missing
+        elif cls._store(class_name).col is None:
+            return set()
+        found = set()
+        with cls._in_use(class_name):
+            if cls._slim:
+                collection, field = cls._collection(class_name), "chunk_id"
+            else:
+                vectorstore = cls._store(class_name)
+                collection, field = vectorstore.col, vectorstore._primary_field
+            for i in range(0, len(maybe), 1000):
+                expr = cls.in_filter(field, maybe[i:i + 1000])
+                # Strong: a retry straight after a partial insert must see those rows
+                rows = collection.query(expr=expr, output_fields=[field], consistency_level="Strong")
+                found.update(str(row[field]) for row in rows)
+        return found
+
+    @staticmethod
+    def in_filter(field: str, values: List[str]) -> str:
+        """Milvus `field in [...]` expression with safely quoted string values"""
+        return f"{field} in [" + ", ".join(json.dumps(value) for value in values) + "]"
+
+    @classmethod
+    def _new_rows(cls, rows: List[Dict], class_name: str) -> List[Dict]:
+        """Drop rows whose chunk_id is already stored, and repeats within the batch"""
+        unique = {}
+        for row in rows:
+            unique.setdefault(row["chunk_id"], row)
+        existing = cls._existing_ids(class_name, list(unique))
+        if existing:
+            print(f"Skipping {len(existing)} chunks already in '{class_name}'")
+        return [row for chunk_id, row in unique.items() if chunk_id not in existing]
+
+    @classmethod
+    def insert_chunks(cls, chunk_dicts: List[Dict], class_name: str = "rag_chunks") -> List[str]:
+        """NEW: Store with dicts for batch/bulk mode (agentic and efficient).
+
+        Idempotent on chunk_id: ids already stored are skipped before
+        embedding and the rest are upserted, so retries never add rows.
+        A failed batch is logged and skipped; returns the chunk_ids that
+        were not stored.
+        """
+        failed = []
+        for collection_name, rows in cls._route(chunk_dicts, class_name).items():
+            if cls._slim:
+                failed.extend(cls._insert_slim(rows, collection_name))
+            else:
+                failed.extend(cls._insert_langchain(rows, collection_name))
+        return failed
+
+    @classmethod
+    def _insert_langchain(cls, chunk_dicts: List[Dict], class_name: str = "rag_chunks") -> List[str]:
+        vectorstore = cls._store(class_name)
         from langchain_core.documents import Document as LangChainDoc
         
         docs = []
         ids = []
-        for chunk in chunk_dicts:
+        for chunk in cls._new_rows(chunk_dicts, class_name):
             # Clean metadata - remove any problematic fields
             metadata = {
                 "chunk_id": chunk.get("chunk_id"),
@@ -94,35 +381,103 @@ class MilvusVectorStore:
             ids.append(chunk.get("chunk_id"))
 
         batch_size = 50  # Reduced batch size for stability
+        failed = []
         for i in range(0, len(docs), batch_size):
             batch_docs = docs[i:i + batch_size]
             batch_ids = ids[i:i + batch_size]
             try:
-                cls._vectorstore.add_documents(documents=batch_docs, ids=batch_ids)
+                cls._upsert_documents(vectorstore, batch_docs, batch_ids, class_name)
+                cls.id_index().add(batch_ids)
                 print(f"Inserted batch {i//batch_size + 1}: {len(batch_docs)} chunks")
             except Exception as e:
                 print(f"Error inserting batch {i//batch_size + 1}: {e}")
+                failed.extend(batch_ids)
                 continue
 
-        print(f"Completed insertion of {len(docs)} chunk dicts to Milvus.")
+        print(f"Completed insertion of {len(docs) - len(failed)} chunk dicts to Milvus.")
+        return failed
 
-    # ... rest of methods remain the same ...
     @classmethod
-    def store_chunks(cls, chunks: List[Chunk], document: Document, class_name: str = "rag_chunks"):
-        """Store list of Chunk objects (old method)"""
-        if cls._vectorstore is None:
-            cls.setup_schema(class_name)
+    def _upsert_documents(cls, vectorstore, documents: List, ids: List[str], class_name: str):
+        """upsert() needs an existing collection; LangChain creates (and loads) it on the first add"""
+        if vectorstore.col is None:
+            vectorstore.add_documents(documents, ids=ids)
+            if cls._residency is not None:
+                cls._residency.register(class_name)
+        else:
+            vectorstore.upsert(ids=ids, documents=documents)
+
+    @classmethod
+    def _insert_slim(cls, rows: List[Dict], class_name: str = "rag_chunks") -> List[str]:
+        """Text goes to SQLite, only vector + filter scalars go to Milvus.
+
+        Rows keep the vectors embed_chunks already computed; only rows
+        without one (or of another dimension) are embedded here. SQLite
+        is written per batch once Milvus has it, so a failed batch leaves
+        no text behind.
+        """
+        from project.schema_setup import SLIM_FIELDS
+        collection = cls._collection(class_name)
+        dim = next(int(f.params["dim"]) for f in collection.schema.fields if f.name == "embedding_vector")
+        new_rows = cls._new_rows(rows, class_name)
+        new_ids = {row["chunk_id"] for row in new_rows}
+        # Already in Milvus (e.g. a retry after SQLite was lost): SQLite only
+        stored = [row for row in rows if row["chunk_id"] not in new_ids]
+        if stored:
+            cls._hydrator.store.insert_chunks(stored)
+        rows = new_rows
+        batch_size = 500
+        failed = []
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            vectors = [row.get("embedding_vector") for row in batch]
+            missing = [j for j, vector in enumerate(vectors) if vector is None or len(vector) != dim]
+            try:
+                if missing:
+                    embedded = cls.load_embeddings().embed_documents([batch[j]["chunk_text"] for j in missing])
+                    for j, vector in zip(missing, embedded):
+                        vectors[j] = vector
+                entities = [
+                    {**{field: row.get(field) for field in SLIM_FIELDS}, "embedding_vector": list(vector)}
+                    for row, vector in zip(batch, vectors)
+                ]
+                collection.upsert(entities)
+                cls.id_index().add(row["chunk_id"] for row in batch)
+                cls._hydrator.store.insert_chunks(batch)
+                cls._hydrator.invalidate(row["chunk_id"] for row in batch)
+                print(f"Inserted batch {i//batch_size + 1}: {len(batch)} chunks")
+            except Exception as e:
+                print(f"Error inserting batch {i//batch_size + 1}: {e}")
+                failed.extend(row["chunk_id"] for row in batch)
+        print(f"Completed insertion of {len(rows) - len(failed)} chunk dicts to Milvus (slim).")
+        return failed
+
+    @classmethod
+    def store_chunks(cls, chunks: List[Union[Chunk, ChunkRecord]], document: Document, class_name: str = "rag_chunks"):
+        """Store list of Chunk objects or chunk records (old method)"""
+        class_name = cls.collection_for(getattr(document, "domain", None), class_name)
+        if cls._slim:
+            failed = cls._insert_slim(chunk_dicts(document, chunks), class_name)
+            if failed:
+                raise RuntimeError(f"{len(failed)} chunks of {document.id} were not stored")
+            return
+        vectorstore = cls._store(class_name)
         from langchain_core.documents import Document as LangChainDoc
         print(f"Storing {len(chunks)} chunks...")
 
+        # Already stored ids (and repeats in this call) are skipped before embedding
+        skip = cls._existing_ids(class_name, [chunk.id for chunk in chunks])
         langchain_docs = []
         ids = []
         for chunk in chunks:
+            if chunk.id in skip:
+                continue
+            skip.add(chunk.id)
             doc = LangChainDoc(
                 page_content=chunk.content,
                 metadata={
                     "chunk_id": chunk.id,
-                    "document_id": chunk.document_id,
+                    "doc_id": chunk.doc_id,
                     "chunk_index": chunk.chunk_index,
                     "chunking_method": chunk.chunking_method.value,
                     "file_type": document.file_type.value,
@@ -136,71 +491,461 @@ class MilvusVectorStore:
         for i in range(0, len(langchain_docs), batch_size):
             batch_docs = langchain_docs[i:i + batch_size]
             batch_ids = ids[i:i + batch_size]
-            cls._vectorstore.add_documents(documents=batch_docs, ids=batch_ids)
+            cls._upsert_documents(vectorstore, batch_docs, batch_ids, class_name)
+            cls.id_index().add(batch_ids)
         print("Storage complete")
 
     @classmethod
-    def search_by_text(cls, query_text: str, limit: int = 5) -> List[SearchResult]:
-        if cls._vectorstore is None:
-            cls.setup_schema()
+    def search_by_text(cls, query_text: str, limit: int = 5, tenant: str = None) -> List[SearchResult]:
+        return to_results(cls.search_hits(query_text, limit, tenant))
+
+    @classmethod
+    def _embed_queries(cls, query_texts: List[str], deadline: Deadline = None) -> List[List[float]]:
+        """One embedding call for all query texts"""
+        embeddings = cls.load_embeddings()
+        if len(query_texts) == 1:
+            embed, args = (lambda text: [embeddings.embed_query(text)]), (query_texts[0],)
+        else:
+            embed, args = embeddings.embed_documents, (list(query_texts),)
+        if deadline is None:
+            return embed(*args)
+        # Leave the other half of the remaining time for the ANN search
+        return deadline.run("embed", embed, *args, share=0.5)
+
+    @staticmethod
+    def ann_params(limit: int, deadline: Deadline = None):
+        """(limit, search param, timeout) for an HNSW search under an optional deadline.
+
+        Past the tight mark ef drops to the limit and half the candidates
+        are requested, so the graph walk and the hydration both shrink.
+        """
+        ef, timeout = max(64, limit), None
+        if deadline is not None:
+            if deadline.tight():
+                limit = max(1, (limit + 1) // 2)
+                ef = limit
+                deadline.reduce("ann")
+            timeout = max(deadline.remaining(), 0.001)
+        return limit, {"metric_type": "COSINE", "params": {"ef": ef}}, timeout
+
+    @classmethod
+    def search_hits(cls, query_text: str, limit: int = 5, tenant: str = None, class_name: str = "rag_chunks",
+                    expr: str = None, deadline: Deadline = None, group_by: str = None,
+                    group_size: int = 1) -> List[SearchHit]:
+        """Search one tenant's collection without per-hit Pydantic validation.
+
+        `expr` is a Milvus boolean filter, e.g. 'doc_id in ["a", "b"]'.
+        With a deadline every stage is bounded by it and a stage that runs
+        out of time returns what it has (possibly nothing); see Deadline.
+        `group_by` (e.g. "doc_id") keeps at most `group_size` hits per value.
+        """
+        return cls.search_hits_multi([query_text], limit, tenant, class_name, expr, deadline,
+                                     group_by, group_size)[0]
+
+    @classmethod
+    def search_hits_multi(cls, query_texts: List[str], limit: int = 5, tenant: str = None,
+                          class_name: str = "rag_chunks", expr: str = None, deadline: Deadline = None,
+                          group_by: str = None, group_size: int = 1) -> List[List[SearchHit]]:
+        """One hit list per query text: a single embedding batch and a single multi-vector search.
+
+        Grouped searches use Milvus grouping search (one request, no
+        over-fetch) when `group_by` is a scalar field of the collection's
+        schema. Otherwise (e.g. doc_id as a LangChain dynamic field), or if
+        the server rejects it, plain results are paged with `offset` until
+        each query has `limit` hits within the per-group cap.
+        """
+        class_name = cls.collection_for(tenant, class_name)
         try:
-            results_with_scores = cls._vectorstore.similarity_search_with_relevance_scores(
-                query=query_text,
-                k=limit
-            )
+            cls.connect(deadline)
+            # Pinned for the whole request, so eviction cannot release it mid-search
+            with cls._in_use(class_name, deadline):
+                query_vectors = cls._embed_queries(query_texts, deadline)
+                limit, param, timeout = cls.ann_params(limit, deadline)
 
-            search_results = []
-            for rank, (doc, score) in enumerate(results_with_scores, 1):
-                similarity_score = float(score)
-                distance = 1.0 - similarity_score
-                chunk = Chunk(
-                    id=doc.metadata.get("chunk_id", f"chunk_{rank}"),
-                    document_id=doc.metadata.get("document_id", ""),
-                    content=doc.page_content,
-                    chunk_index=doc.metadata.get("chunk_index", 0),
-                    chunking_method=doc.metadata.get("chunking_method", "unknown"),
-                    metadata=doc.metadata
-                )
-                search_result = SearchResult(
-                    chunk=chunk,
-                    similarity_score=similarity_score,
-                    distance=distance,
-                    rank=rank
-                )
-                search_results.append(search_result)
-            return search_results
+                def search(vectors, page_limit, **kwargs):
+                    if cls._slim:
+                        return cls._search_slim(vectors, page_limit, class_name, expr, param, timeout, deadline,
+                                                **kwargs)
+                    return cls._search_langchain(vectors, page_limit, class_name, expr, param, timeout, **kwargs)
+
+                if not group_by:
+                    return search(query_vectors, limit)
+                if cls._can_group(class_name, group_by):
+                    from pymilvus.exceptions import MilvusException
+                    try:
+                        hit_lists = search(query_vectors, limit, group_by_field=group_by, group_size=group_size,
+                                           strict_group_size=False)
+                        # Groups come back one after another; order by score before trimming to limit
+                        return [
+                            cls.cap_groups(sorted(hits, key=lambda hit: -hit.similarity_score), limit, group_by,
+                                           group_size)
+                            for hits in hit_lists
+                        ]
+                    except MilvusException as e:
+                        if deadline is not None and deadline.expired():
+                            raise
+                        # e.g. a server older than 2.4; only this collection falls back
+                        cls._grouping_fields[(class_name, group_by)] = False
+                        print(f"Grouping search rejected for {class_name}, over-fetching instead: {e}")
+                return cls._search_overfetch(class_name, query_vectors, limit, group_by, group_size, expr, param,
+                                             timeout, deadline)
+        except DeadlineExceeded:
+            return [[] for _ in query_texts]
         except Exception as e:
-            print(f"Search error: {e}")
-            return []
+            if deadline is not None and deadline.expired():
+                deadline.miss("ann")
+            else:
+                print(f"Search error: {e}")
+            return [[] for _ in query_texts]
 
     @classmethod
-    def get_stats(cls, class_name: str = "rag_chunks") -> Dict[str, Any]:
-        try:
-            cls.get_client()
-            from pymilvus import Collection, utility
-            if utility.has_collection(class_name):
-                collection = Collection(class_name)
-                collection.flush()
-                collection.load()
-                return {
-                    "total_chunks": collection.num_entities,
-                    "status": "ready"
+    def _can_group(cls, class_name: str, group_by: str) -> bool:
+        """Whether `group_by` is a schema field Milvus can group on (cached per collection)"""
+        key = (class_name, group_by)
+        if key not in cls._grouping_fields:
+            from pymilvus import DataType
+            groupable = (DataType.BOOL, DataType.INT8, DataType.INT16, DataType.INT32, DataType.INT64,
+                         DataType.VARCHAR)
+            # Dynamic fields live inside $meta and never show up here
+            field = next((f for f in cls._collection(class_name).schema.fields if f.name == group_by), None)
+            cls._grouping_fields[key] = field is not None and field.dtype in groupable
+        return cls._grouping_fields[key]
+
+    @staticmethod
+    def _group_key(hit: SearchHit, group_by: str):
+        return hit.chunk.doc_id if group_by == "doc_id" else (hit.chunk.extra or {}).get(group_by)
+
+    @classmethod
+    def cap_groups(cls, hits: List[SearchHit], limit: int, group_by: str, group_size: int = 1) -> List[SearchHit]:
+        """First `limit` hits (in the given order) with at most `group_size` per group value, re-ranked"""
+        counts: Dict[Any, int] = {}
+        capped = []
+        for hit in hits:
+            key = cls._group_key(hit, group_by)
+            if counts.get(key, 0) >= group_size:
+                continue
+            counts[key] = counts.get(key, 0) + 1
+            hit.rank = len(capped) + 1
+            capped.append(hit)
+            if len(capped) == limit:
+                break
+        return capped
+
+    @classmethod
+    def _search_overfetch(cls, class_name: str, query_vectors: List[List[float]], limit: int, group_by: str,
+                          group_size: int, expr: str = None, param: Dict[str, Any] = None, timeout: float = None,
+                          deadline: Deadline = None) -> List[List[SearchHit]]:
+        """Client-side grouping: page through plain results, doubling the page, until every query is filled.
+
+        Pages carry only ids, distances and the group field; text and
+        metadata are fetched once, for the hits that are kept.
+        """
+        collection = cls._collection(class_name)
+        kept: List[List[Tuple[str, float]]] = [[] for _ in query_vectors]
+        counts: List[Dict[Any, int]] = [{} for _ in query_vectors]
+        pending = list(range(len(query_vectors)))
+        offset, page = 0, limit * 2
+        while pending and offset + page <= cls.MAX_SEARCH_WINDOW:
+            if deadline is not None and deadline.expired():
+                deadline.reduce("group")
+                break
+            pages = collection.search(
+                data=[query_vectors[i] for i in pending],
+                anns_field="embedding_vector",
+                param=param,
+                limit=page,
+                offset=offset,
+                expr=expr,
+                output_fields=[group_by],
+                timeout=timeout
+            )
+            still_pending = []
+            for i, hits in zip(pending, pages):
+                for hit in hits:
+                    key = hit.get(group_by)
+                    if counts[i].get(key, 0) < group_size and len(kept[i]) < limit:
+                        counts[i][key] = counts[i].get(key, 0) + 1
+                        kept[i].append((str(hit.id), float(hit.distance)))
+                if hits and len(kept[i]) < limit:
+                    still_pending.append(i)
+            pending = still_pending
+            offset += page
+            page = min(page * 2, cls.MAX_SEARCH_WINDOW - offset) or page
+        if cls._slim:
+            return cls._hydrate_slim(kept, deadline)
+        return cls._hydrate_langchain(kept, class_name, timeout)
+
+    @classmethod
+    def _search_langchain(cls, query_vectors: List[List[float]], limit: int, class_name: str, expr: str = None,
+                          param: Dict[str, Any] = None, timeout: float = None, **search_kwargs) -> List[List[SearchHit]]:
+        store = cls._store(class_name)
+        # LangChain only searches one vector per call; go through its client for nq > 1
+        results = store.client.search(
+            store.collection_name,
+            data=query_vectors,
+            anns_field=store._vector_field,
+            search_params=param,
+            limit=limit,
+            filter=expr,
+            output_fields=["*"],
+            timeout=timeout,
+            **search_kwargs
+        )
+        relevance = store._select_relevance_score_fn()
+        return [
+            [
+                cls._to_hit(doc.page_content, doc.metadata, float(relevance(score)), rank)
+                for rank, (doc, score) in enumerate(store._parse_documents_from_search_results([result]), 1)
+            ]
+            for result in results
+        ]
+
+    @classmethod
+    def _search_slim(cls, query_vectors: List[List[float]], limit: int, class_name: str, expr: str = None,
+                     param: Dict[str, Any] = None, timeout: float = None,
+                     deadline: Deadline = None, **search_kwargs) -> List[List[SearchHit]]:
+        results = cls._collection(class_name).search(
+            data=query_vectors,
+            anns_field="embedding_vector",
+            param=param,
+            limit=limit,
+            expr=expr,
+            output_fields=[],
+            timeout=timeout,
+            **search_kwargs
+        )
+        scored_lists = [[(str(hit.id), float(hit.distance)) for hit in result] for result in results]
+        return cls._hydrate_slim(scored_lists, deadline)
+
+    @classmethod
+    def _hydrate_langchain(cls, scored_lists: List[List[Tuple[str, float]]], class_name: str,
+                           timeout: float = None) -> List[List[SearchHit]]:
+        """Hits for (pk, distance) lists, with text and metadata queried from the LangChain collection"""
+        store = cls._store(class_name)
+        ids = list(dict.fromkeys(chunk_id for scored in scored_lists for chunk_id, _ in scored))
+        rows = {}
+        if ids:
+            for row in store.client.query(store.collection_name, ids=ids, output_fields=["*"], timeout=timeout):
+                rows[str(row[store._primary_field])] = row
+        relevance = store._select_relevance_score_fn()
+        hit_lists = []
+        for scored in scored_lists:
+            hits = []
+            for chunk_id, distance in scored:
+                row = rows.get(chunk_id)
+                if row is None:
+                    # Deleted between the search and the query
+                    continue
+                doc = store._parse_document(dict(row))
+                hits.append(cls._to_hit(doc.page_content, doc.metadata, float(relevance(distance)), len(hits) + 1))
+            hit_lists.append(hits)
+        return hit_lists
+
+    @classmethod
+    def _hydrate_slim(cls, scored_lists: List[List[Tuple[str, float]]],
+                      deadline: Deadline = None) -> List[List[SearchHit]]:
+        """Hits for (chunk_id, score) lists, with text and metadata from SQLite"""
+        # One hydration for every query's hits
+        chunk_ids = list(dict.fromkeys(chunk_id for scored in scored_lists for chunk_id, _ in scored))
+        if deadline is not None and deadline.expired():
+            # Out of time: only hits whose text is already cached, no SQLite reads
+            deadline.miss("hydrate")
+            rows = cls._hydrator.fetch(chunk_ids, cached_only=True)
+        else:
+            rows = cls._hydrator.fetch(chunk_ids)
+        hit_lists = []
+        for scored in scored_lists:
+            hits = []
+            for chunk_id, score in scored:
+                row = rows.get(chunk_id)
+                if row is None:
+                    if deadline is None or not deadline.expired():
+                        print(f"Chunk {chunk_id} missing from SQLite, skipped")
+                    continue
+                metadata = {
+                    "chunk_id": chunk_id,
+                    "doc_id": row["doc_id"],
+                    "chunk_index": row["chunk_index"],
+                    "chunking_method": row["chunk_method"],
+                    "file_type": row["content_type"],
+                    "word_count": row["chunk_tokens"],
+                    "domain": row["domain"],
+                    "embedding_model": row["embedding_model"]
                 }
-            else:
+                hits.append(cls._to_hit(row["chunk_text"], metadata, score, len(hits) + 1))
+            hit_lists.append(hits)
+        return hit_lists
+
+    @staticmethod
+    def _to_hit(text: str, metadata: Dict[str, Any], similarity_score: float, rank: int) -> SearchHit:
+        method = metadata.get("chunking_method")
+        chunk = ChunkRecord(
+            id=metadata.get("chunk_id", f"chunk_{rank}"),
+            doc_id=metadata.get("doc_id", ""),
+            content=text,
+            chunk_index=metadata.get("chunk_index", 0),
+            chunking_method=ChunkingMethod(method) if method in _METHOD_VALUES else ChunkingMethod.RECURSIVE,
+            extra=metadata
+        )
+        return SearchHit(
+            chunk=chunk,
+            similarity_score=similarity_score,
+            distance=1.0 - similarity_score,
+            rank=rank
+        )
+
+    @classmethod
+    def get_stats(cls, class_name: str = "rag_chunks", tenant: str = None) -> Dict[str, Any]:
+        """Row counts without flushing (a flush per call seals a tiny segment each time)"""
+        try:
+            cls.connect()
+            from pymilvus import Collection, MilvusException, utility
+            from pymilvus.client.types import LoadState
+            counts = {}
+            for name in cls._target_collections(class_name, tenant):
+                if utility.has_collection(name):
+                    collection = Collection(name)
+                    counts[name] = None
+                    if utility.load_state(name) == LoadState.Loaded:
+                        try:
+                            # Includes rows still in growing segments
+                            counts[name] = collection.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+                        except MilvusException:
+                            pass  # released (e.g. evicted) since the check
+                    if counts[name] is None:
+                        counts[name] = collection.num_entities
+            if not counts:
                 return {"total_chunks": 0, "status": "no_collection"}
+            stats = {"total_chunks": sum(counts.values()), "status": "ready"}
+            if cls._tenant_routing:
+                stats["collections"] = counts
+            return stats
         except Exception as e:
             return {"error": str(e), "status": "error", "total_chunks": 0}
 
     @classmethod
-    def clear_all_data(cls, class_name: str = "rag_chunks"):
+    def wait_for_index(cls, name: str, timeout: float = 3600, poll: float = 5):
+        """Block until every row of the collection is covered by its vector index"""
+        from pymilvus import utility
+        deadline = time.monotonic() + timeout
+        while True:
+            progress = utility.index_building_progress(name)
+            total, indexed = progress.get("total_rows", 0), progress.get("indexed_rows", 0)
+            if indexed >= total:
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Index on '{name}' not built after {timeout}s ({indexed}/{total})")
+            print(f"Index build '{name}': {indexed}/{total} rows")
+            time.sleep(poll)
+
+    @classmethod
+    def finalize_ingest(cls, class_name: str = "rag_chunks", tenant: str = None, replica_number: int = 1,
+                        timeout: float = 3600):
+        """End-of-run barrier: one flush, compaction, index at 100%, then load/refresh.
+
+        Ingest paths never flush on their own; calling this once after a run
+        merges the small segments it produced, so searches right after a big
+        ingest don't fan out over hundreds of them.
+        """
+        cls.connect()
+        from pymilvus import Collection, utility
+        from pymilvus.exceptions import MilvusException
+        for name in cls._target_collections(class_name, tenant):
+            if not utility.has_collection(name):
+                continue
+            started = time.monotonic()
+            collection = Collection(name)
+            collection.flush()
+            collection.compact()
+            collection.wait_for_compaction_completed(timeout=timeout)
+            cls.wait_for_index(name, timeout)
+            try:
+                # Picks up the compacted segments without dropping the loaded ones first
+                collection.load(replica_number=replica_number, _refresh=True)
+            except MilvusException:
+                # Loaded with a different replica count: reload with the requested one
+                collection.release()
+                collection.load(replica_number=replica_number)
+            utility.wait_for_loading_complete(name, timeout=timeout)
+            cls._collections[name] = collection
+            if cls._residency is not None:
+                cls._residency.register(name)
+            print(f"Finalized '{name}': {collection.num_entities} rows, "
+                  f"{replica_number} replica(s), {time.monotonic() - started:.1f}s")
+
+    @classmethod
+    def delete_documents(cls, doc_ids: List[str], class_name: str = "rag_chunks", tenant: str = None,
+                         chunk_ids: List[str] = None):
+        """Delete every chunk of the given documents from Milvus"""
+        if not doc_ids:
+            return
+        cls.connect()
+        from pymilvus import utility
+        expr = cls.in_filter("doc_id", doc_ids)
+        for name in cls._target_collections(class_name, tenant):
+            if utility.has_collection(name):
+                with cls._in_use(name):
+                    cls._collection(name).delete(expr)
+        if cls._hydrator is not None and chunk_ids:
+            cls._hydrator.invalidate(chunk_ids)
+        from project.doc_index import DocumentIndex
+        DocumentIndex.delete_documents(doc_ids, tenant)
+        print(f"Deleted chunks of {len(doc_ids)} documents from Milvus")
+
+    @classmethod
+    def reload_tenant(cls, tenant: str, class_name: str = "rag_chunks"):
+        """Release and reload one tenant's collection without touching the others"""
+        cls.connect()
+        name = cls.collection_for(tenant, class_name)
+        cls.forget(name)
+        if cls._residency is not None:
+            # Reloaded through residency, so it counts against the budget like any other load
+            cls._residency.release(name)
+        else:
+            from pymilvus import Collection
+            Collection(name).release()
+        with cls._in_use(name):
+            cls._collection(name)
+        print(f"Reloaded '{name}'")
+
+    @classmethod
+    def _clear_dedup(cls, domain: str = None):
+        """Dedup rows in SQLite point at chunks that were just dropped from Milvus"""
+        if cls._hydrator is not None:
+            cls._hydrator.store.clear_dedup(domain)
+            return
+        with ChunkStore(SQLITE_DB) as store:
+            store.clear_dedup(domain)
+
+    @classmethod
+    def clear_all_data(cls, class_name: str = "rag_chunks", tenant: str = None, all_tenants: bool = False):
+        """Drop and recreate the collection empty; with tenant routing, only that tenant's.
+
+        Dropping every tenant's collection has to be asked for with
+        `all_tenants` (they are recreated on their next insert). Aliased
+        names drop the alias, the live version and any rollback versions.
+        Clearing the chunk collection also clears the SQLite dedup tables
+        for the same documents.
+        """
+        if cls._tenant_routing and tenant is None and not all_tenants:
+            raise ValueError("Tenant routing is on: pass a tenant, or all_tenants=True to clear every tenant")
         try:
             print("Clearing database...")
-            from pymilvus import utility
-            cls.get_client()
-            if utility.has_collection(class_name):
-                utility.drop_collection(class_name)
-            cls._vectorstore = None
-            cls.setup_schema(class_name)
+            from pymilvus import MilvusClient
+            from project.schema_setup import drop_collection, collection_versions
+            cls.connect()
+            client = MilvusClient(uri="http://localhost:19530")
+            for name in cls._target_collections(class_name, tenant):
+                drop_collection(client, name)
+                for version in collection_versions(client, name):
+                    client.drop_collection(version)
+                cls.forget(name)
+            if tenant is not None or not cls._tenant_routing:
+                cls.create_collection(cls.collection_for(tenant, class_name))
+            if class_name == "rag_chunks":
+                from project.doc_index import DocumentIndex
+                DocumentIndex.clear(tenant)
+                cls._clear_dedup(tenant if cls._tenant_routing else None)
             print("Database cleared")
         except Exception as e:
             print(f"Clear error: {e}")
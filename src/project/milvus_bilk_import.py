@@ -1,22 +1,185 @@
-from pymilvus import utility
+import json
+import os
 import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from pymilvus import utility, BulkInsertState
+from project.milvus import MilvusVectorStore
+from project.chunk_store import ChunkStore, SQLITE_DB
 
 COLLECTION = "rag_chunks"
 NDJSON_PATH = "/var/lib/milvus/import/chunks_bulk.ndjson"  # Or your configured path
+SHARD_DIR = "/var/lib/milvus/import/shards"  # Must be visible to Milvus (import bucket)
+STATE_FILE = "bulk_import_state.json"
+ROWS_PER_SHARD = 100_000
+MAX_CONCURRENT_JOBS = 4
+MAX_ATTEMPTS = 3
 
-task_id = utility.do_bulk_insert(
-    collection_name=COLLECTION,
-    files=[NDJSON_PATH]
-)
-print(f"Submitted bulk import task: {task_id}")
-
-while True:
-    status = utility.get_bulk_insert_state(task_id)
-    print("Bulk import status:", status)
-    if status.get('state') == 'BulkImportCompleted':
-        print("Bulk import completed successfully.")
-        break
-    if status.get('state') == 'BulkImportFailed':
-        print("Bulk import failed.", status)
-        break
-    time.sleep(30)
+# Milvus import rejects nulls for non-nullable scalar fields
+NULL_DEFAULTS = {
+    "start_position": -1,
+    "end_position": -1,
+    "vector_id": "",
+    "embedding_timestamp": "",
+    "created_at": "",
+}
+
+class BulkImportOrchestrator:
+    """Shard NDJSON exports, run several Milvus bulk-import jobs at once, resume from a state file"""
+
+    def __init__(self, collection: str = COLLECTION, shard_dir: str = SHARD_DIR,
+                 state_file: str = STATE_FILE, rows_per_shard: int = ROWS_PER_SHARD,
+                 max_concurrent: int = MAX_CONCURRENT_JOBS, db_path: str = SQLITE_DB,
+                 poll_min: float = 2.0, poll_max: float = 60.0):
+        self.collection = collection
+        self.shard_dir = Path(shard_dir)
+        self.state_file = Path(state_file)
+        self.rows_per_shard = rows_per_shard
+        self.max_concurrent = max_concurrent
+        self.db_path = db_path
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self.state_file.exists():
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            print(f"Resuming bulk import from {self.state_file}")
+            return state
+        return {"collection": self.collection, "started_at": None, "shards": {}}
+
+    def _save_state(self):
+        # Write-then-rename so a crash never leaves a half-written state file
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def shard(self, ndjson_paths: List[str]) -> List[str]:
+        """Split NDJSON exports into JSON-array files of rows_per_shard rows"""
+        if self.state["shards"]:
+            return list(self.state["shards"])
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        shard_no = 0
+        rows = []
+        for path in ndjson_paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        rows.append(line)
+                    if len(rows) >= self.rows_per_shard:
+                        self._write_shard(shard_no, rows)
+                        shard_no += 1
+                        rows = []
+        if rows:
+            self._write_shard(shard_no, rows)
+        self._save_state()
+        print(f"Wrote {len(self.state['shards'])} shards to {self.shard_dir}")
+        return list(self.state["shards"])
+
+    def _write_shard(self, shard_no: int, lines: List[str]):
+        path = self.shard_dir / f"chunks_{shard_no:05d}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("[\n")
+            for i, line in enumerate(lines):
+                row = json.loads(line)
+                for field, default in NULL_DEFAULTS.items():
+                    if row.get(field) is None:
+                        row[field] = default
+                f.write(("," if i else "") + json.dumps(row, ensure_ascii=False) + "\n")
+            f.write("]\n")
+        self.state["shards"][str(path)] = {
+            "rows": len(lines), "task_id": None, "status": "pending",
+            "imported_rows": 0, "attempts": 0, "error": None
+        }
+
+    def run(self, ndjson_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        MilvusVectorStore._wait_for_milvus()
+        self.shard(ndjson_paths or [NDJSON_PATH])
+        if self.state["started_at"] is None:
+            self.state["started_at"] = time.time()
+            self._save_state()
+        shards = self.state["shards"]
+        interval = self.poll_min
+        while True:
+            active = [p for p, s in shards.items() if s["status"] == "submitted"]
+            waiting = [
+                p for p, s in shards.items()
+                if s["status"] == "pending" or (s["status"] == "failed" and s["attempts"] < MAX_ATTEMPTS)
+            ]
+            for path in waiting[:max(0, self.max_concurrent - len(active))]:
+                self._submit(path)
+                active.append(path)
+            if not active:
+                break
+            changed = any(self._poll(path) for path in active)
+            self._save_state()
+            self._print_progress()
+            # Back off while nothing moves, poll quickly again once jobs progress
+            interval = self.poll_min if changed else min(interval * 2, self.poll_max)
+            time.sleep(interval)
+        return self.report()
+
+    def _submit(self, path: str):
+        shard = self.state["shards"][path]
+        shard["attempts"] += 1
+        shard["error"] = None
+        shard["task_id"] = utility.do_bulk_insert(collection_name=self.collection, files=[path])
+        shard["status"] = "submitted"
+        self._save_state()
+        print(f"Submitted bulk import task {shard['task_id']} for {path}")
+
+    def _poll(self, path: str) -> bool:
+        """Refresh one job; True when it finished or advanced"""
+        shard = self.state["shards"][path]
+        status = utility.get_bulk_insert_state(shard["task_id"])
+        if status.state == BulkInsertState.ImportCompleted:
+            shard["status"] = "completed"
+            shard["imported_rows"] = status.row_count
+            print(f"Task {shard['task_id']} completed: {status.row_count} rows")
+            return True
+        if status.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+            shard["status"] = "failed"
+            shard["error"] = status.failed_reason
+            print(f"Task {shard['task_id']} failed: {status.failed_reason}")
+            return True
+        progress = status.row_count > shard["imported_rows"]
+        shard["imported_rows"] = status.row_count
+        return progress
+
+    def _print_progress(self):
+        shards = self.state["shards"].values()
+        done = sum(1 for s in shards if s["status"] == "completed")
+        rows = sum(s["imported_rows"] for s in shards)
+        print(f"Bulk import: {done}/{len(self.state['shards'])} shards, {rows} rows")
+
+    def report(self) -> Dict[str, Any]:
+        shards = self.state["shards"].values()
+        imported = sum(s["imported_rows"] for s in shards if s["status"] == "completed")
+        expected = sum(s["rows"] for s in shards)
+        failed = [p for p, s in self.state["shards"].items() if s["status"] == "failed"]
+        elapsed = time.time() - self.state["started_at"]
+        with ChunkStore(self.db_path) as store:
+            sqlite_rows = store.count_chunks()
+        report = {
+            "collection": self.collection,
+            "shards": len(self.state["shards"]),
+            "failed_shards": failed,
+            "expected_rows": expected,
+            "imported_rows": imported,
+            "sqlite_rows": sqlite_rows,
+            "rows_match_sqlite": imported == sqlite_rows,
+            "elapsed_seconds": round(elapsed, 1),
+            "rows_per_second": round(imported / elapsed, 1) if elapsed > 0 else 0.0,
+            "finished_at": datetime.now().isoformat(),
+        }
+        print(f"Imported {imported}/{expected} rows in {report['elapsed_seconds']}s "
+              f"({report['rows_per_second']} rows/sec)")
+        if not report["rows_match_sqlite"]:
+            print(f"WARNING: Milvus imported {imported} rows but SQLite has {sqlite_rows}")
+        return report
+
+if __name__ == "__main__":
+    BulkImportOrchestrator().run()
@@ -0,0 +1,92 @@
+import re
+from collections import Counter
+from typing import List, Dict, Optional
+from project.records import SearchHit
+from project.milvus import MilvusVectorStore
+from project.deadline import Deadline
+
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-']*")
+_STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+class MultiQuery:
+    """Multi-query search: local query variants, one batched search, RRF fusion.
+
+    Variants come from the caller or from templates plus keyword extraction
+    (no model call). All variants are embedded in one batch and sent as one
+    multi-vector Milvus search; the per-variant rankings are merged with
+    reciprocal-rank fusion and deduplicated by chunk_id.
+    """
+
+    TEMPLATES = ["What is {keywords}?", "{keywords} explained with details and examples"]
+    RRF_K = 60
+
+    @staticmethod
+    def keywords(query: str, max_keywords: int = 6) -> List[str]:
+        """Content words of the query, most frequent first, then in order of appearance"""
+        words = [word.lower() for word in _WORD.findall(query)]
+        counts = Counter(word for word in words if word not in _STOPWORDS and len(word) > 2)
+        first = {word: i for i, word in reversed(list(enumerate(words)))}
+        return sorted(counts, key=lambda word: (-counts[word], first[word]))[:max_keywords]
+
+    @classmethod
+    def variants(cls, query: str, max_variants: int = 4) -> List[str]:
+        """The query itself, its keywords, and template rewrites (deduplicated)"""
+        query = " ".join(query.split())
+        keywords = " ".join(cls.keywords(query)) or query
+        candidates = [query, keywords] + [template.format(keywords=keywords) for template in cls.TEMPLATES]
+        seen, out = set(), []
+        for candidate in candidates:
+            key = candidate.lower().strip(" ?")
+            if key and key not in seen:
+                seen.add(key)
+                out.append(candidate)
+        return out[:max_variants]
+
+    @classmethod
+    def fuse(cls, hit_lists: List[List[SearchHit]], limit: int) -> List[SearchHit]:
+        """Reciprocal-rank fusion: score = sum(1 / (RRF_K + rank)) over the lists a chunk appears in.
+
+        The kept hit is the variant's best-scoring copy; its similarity is the
+        best cosine seen and the fused score is recorded as `rrf_score`.
+        """
+        fused: Dict[str, float] = {}
+        best: Dict[str, SearchHit] = {}
+        for hits in hit_lists:
+            for hit in hits:
+                chunk_id = hit.chunk.id
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (cls.RRF_K + hit.rank)
+                if chunk_id not in best or hit.similarity_score > best[chunk_id].similarity_score:
+                    best[chunk_id] = hit
+        ranked = sorted(fused, key=lambda chunk_id: -fused[chunk_id])[:limit]
+        out = []
+        for rank, chunk_id in enumerate(ranked, 1):
+            hit = best[chunk_id]
+            hit.rank = rank
+            hit.chunk.extra = {**(hit.chunk.extra or {}), "rrf_score": fused[chunk_id]}
+            out.append(hit)
+        return out
+
+    @classmethod
+    def search(cls, query: str, limit: int = 5, tenant: str = None, variants: Optional[List[str]] = None,
+               expr: str = None, deadline: Deadline = None, candidates: int = None, group_by: str = None,
+               group_size: int = 1) -> List[SearchHit]:
+        """Fused hits for the query and its variants (caller-supplied variants are used as given).
+
+        With `group_by` each variant is searched grouped and the per-group
+        cap is applied again after fusion, since variants overlap.
+        """
+        queries = [query] + [v for v in variants if v != query] if variants else cls.variants(query)
+        hit_lists = MilvusVectorStore.search_hits_multi(
+            queries, candidates or limit * 2, tenant, expr=expr, deadline=deadline,
+            group_by=group_by, group_size=group_size
+        )
+        if not group_by:
+            return cls.fuse(hit_lists, limit)
+        fused = cls.fuse(hit_lists, sum(len(hits) for hits in hit_lists))
+        return MilvusVectorStore.cap_groups(fused, limit, group_by, group_size)
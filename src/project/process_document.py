@@ -2,6 +2,7 @@ from pathlib import Path
 from project.processor import DocumentProcessor
 from project.milvus import MilvusVectorStore
 from project.pydantic_models import ProcessingConfig
+from project.worker import WorkerClient
 
 def main():
     print("DOCUMENT PROCESSING")
@@ -13,33 +14,53 @@ def main():
         r"D:\genai\RAG\test.tsv",
         r"D:\genai\RAG\test.txt"
     ]
+    worker = WorkerClient()
+    use_worker = worker.available()
+    if use_worker:
+        print("Using warm worker")
     # Check DB state
-    stats = MilvusVectorStore.get_stats()
+    stats = worker.call("stats") if use_worker else MilvusVectorStore.get_stats()
     existing_chunks = stats.get('total_chunks', 0)
     if existing_chunks > 0:
         print(f"Database has {existing_chunks} chunks")
         choice = input("Replace? (y/n): ").lower().strip()
         if choice == 'y':
-            MilvusVectorStore.clear_all_data()
+            if use_worker:
+                worker.call("clear", all_tenants=True)
+            else:
+                MilvusVectorStore.clear_all_data(all_tenants=True)
         else:
             print("Cancelled")
             return
     total_chunks = 0
     # Use config defaults from pydantic_models.py
     config = ProcessingConfig()
+    processor = None
     for file_path in file_paths:
         if not Path(file_path).exists():
             print(f"File not found: {file_path}")
             continue
         print(f"\n--- Processing: {file_path} ---")
-        processor = DocumentProcessor(config)
         try:
-            document, chunks = processor.process_document(file_path)
-            print(f"Processed: {document.title}")
-            print(f"Chunks created: {len(chunks)} (method auto-selected based on filetype!)")
-            total_chunks += len(chunks)
+            if use_worker:
+                result = worker.call("process", file_path=str(Path(file_path).resolve()))
+                title, chunk_count = result["title"], result["chunks"]
+            else:
+                if processor is None:
+                    processor = DocumentProcessor(config)
+                document, chunks = processor.process_document(file_path)
+                title, chunk_count = document.title, len(chunks)
+            print(f"Processed: {title}")
+            print(f"Chunks created: {chunk_count} (method auto-selected based on filetype!)")
+            total_chunks += chunk_count
         except Exception as e:
             print(f"Error for {file_path}: {e}")
+    if total_chunks:
+        # Single flush/compaction/index barrier instead of one flush per file
+        if use_worker:
+            worker.call("finalize")
+        else:
+            MilvusVectorStore.finalize_ingest()
     print(f"\nAll done! Total new chunks: {total_chunks}")
     print("Run query_document.py to search.")
 
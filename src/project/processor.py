@@ -1,45 +1,122 @@
-from typing import Tuple, List
-from project.pydantic_models import Document, Chunk, ProcessingConfig, ChunkingMethod
+from typing import Tuple, List, Dict, Callable, Optional, Iterable
+from project.pydantic_models import Document, ProcessingConfig, ChunkingMethod
+from project.records import ChunkRecord, chunk_dicts
 from project.doc_reader import DocumentLoader
 from project.chunker import ChunkingService
 from project.embedder import EmbeddingService
 from project.milvus import MilvusVectorStore
+from project.chunk_store import ChunkStore
+from project.dedup import ChunkDeduplicator
 
 class DocumentProcessor:
-    def __init__(self, config: ProcessingConfig):
+    def __init__(self, config: ProcessingConfig, store: ChunkStore = None):
         self.config = config
         self.embedding_service = EmbeddingService(config.embedding_model)
+        self.deduplicator = None
+        if config.deduplicate:
+            self.deduplicator = ChunkDeduplicator(store or ChunkStore(), threshold=config.near_duplicate_threshold)
         MilvusVectorStore.setup_schema()
 
-    def process_document(self, file_path: str) -> Tuple[Document, List[Chunk]]:
+    def process_document(self, file_path: str, on_stage: Optional[Callable[[str], None]] = None,
+                         domain: str = None,
+                         on_document: Optional[Callable[[Document], None]] = None) -> Tuple[Document, List[ChunkRecord]]:
+        """Load, chunk, dedup, embed and store one file.
+
+        `on_stage` is called with the name of each stage as it starts
+        (load, chunk, dedup, embed, store, doc_index, stats). `domain`
+        selects the tenant the document is stored under. `on_document` is
+        called with the loaded document before anything is stored.
+        """
+        stage = on_stage or (lambda name: None)
         print(f"Processing: {file_path}")
         
         # Load document
-        document = DocumentLoader.load_document(file_path)
+        stage("load")
+        document = DocumentLoader.load_document(file_path, domain)
         print(f"Loaded: {len(document.content)} characters")
+        if on_document is not None:
+            on_document(document)
         
         # Create chunks export file
         #self._export_document_content(document.content, document.title)
         
         # Chunk document
-        chunks = ChunkingService.chunk_document(document, self.config)
+        stage("chunk")
+        chunks = ChunkingService.chunk_records(document, self.config)
         print(f"Created {len(chunks)} chunks")
         
+        # Drop exact/near duplicates before paying for embeddings
+        report = None
+        if self.deduplicator is not None:
+            stage("dedup")
+            chunks, report = self.deduplicator.deduplicate(chunks)
+        
         # Export chunks for inspection
         #self._export_chunks(chunks, document.title)
         
         # Generate embeddings
+        stage("embed")
         chunks_with_embeddings = self.embedding_service.embed_chunks(chunks)
         
         # Store
+        stage("store")
         MilvusVectorStore.store_chunks(chunks_with_embeddings, document)
+        if report is not None:
+            # Fingerprints only once the chunks they stand for are stored
+            self.deduplicator.record(report)
+        if self.config.document_index:
+            stage("doc_index")
+            # doc_index pulls in schema_setup (pymilvus, pandas); only import it when enabled
+            from project.doc_index import DocumentIndex
+            DocumentIndex.index_documents([document])
         
         # Verify storage
+        stage("stats")
         stats = MilvusVectorStore.get_stats()
         print(f"Stored: {stats.get('total_chunks', 0)} chunks in database")
         
         return document, chunks_with_embeddings
 
+    def process_batch(self, file_paths: List[str], domains: Dict[str, str] = None,
+                      replacing: Iterable[str] = ()) -> List[Tuple[str, Document, List[ChunkRecord]]]:
+        """Load and chunk several files, then embed and insert them together.
+
+        One embed call and one insert per batch instead of one per file.
+        Files that fail to load, chunk or insert are reported and left out,
+        so callers only see files whose chunks are all stored.
+        `domains` maps file paths to their tenant; `replacing` lists doc_ids
+        of older versions about to be deleted, which dedup must not match.
+        """
+        loaded, reports = [], []
+        for file_path in file_paths:
+            try:
+                document = DocumentLoader.load_document(file_path, (domains or {}).get(file_path))
+                chunks = ChunkingService.chunk_records(document, self.config)
+                if self.deduplicator is not None:
+                    chunks, report = self.deduplicator.deduplicate(chunks, replacing)
+                    reports.append(report)
+                loaded.append((file_path, document, chunks))
+            except Exception as e:
+                print(f"Error: {e} for {file_path}")
+        all_chunks = [chunk for _, _, chunks in loaded for chunk in chunks]
+        self.embedding_service.embed_chunks(all_chunks)
+        rows = [row for _, document, chunks in loaded for row in chunk_dicts(document, chunks)]
+        failed = set()
+        if rows:
+            failed = set(MilvusVectorStore.insert_chunks(rows))
+            if self.config.document_index:
+                from project.doc_index import DocumentIndex
+                DocumentIndex.index_documents([document for _, document, _ in loaded])
+        stored = []
+        for i, (file_path, document, chunks) in enumerate(loaded):
+            if any(chunk.id in failed for chunk in chunks):
+                print(f"Error: chunks of {file_path} were not stored")
+                continue
+            if reports:
+                self.deduplicator.record(reports[i])
+            stored.append((file_path, document, chunks))
+        return stored
+
     def _export_document_content(self, content: str, title: str):
         """Export original document content to file"""
         filename = f"original_{title}.txt"
@@ -52,7 +129,7 @@ class DocumentProcessor:
         except Exception as e:
             print(f"Export error: {e}")
 
-    def _export_chunks(self, chunks: List[Chunk], title: str):
+    def _export_chunks(self, chunks: List[ChunkRecord], title: str):
         """Export chunks to file for inspection"""
         filename = f"chunks_{title}.txt"
         try:
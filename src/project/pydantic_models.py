@@ -26,12 +26,21 @@ class ProcessingConfig(BaseModel):
     chunk_size: int = 1024  
     chunk_overlap: int = 254  
     embedding_model: EmbeddingModel = EmbeddingModel.SENTENCE_TRANSFORMER
+    deduplicate: bool = False
+    near_duplicate_threshold: float = 0.85
+    # Maintain document-level vectors for two-stage retrieval (doc_index.py)
+    document_index: bool = False
+    # Upper bound for one CSV/TSV chunk (rows are never split)
+    csv_max_kb: int = 2
+    # Per-file-type overrides written by chunk_tuner.py; applied by ChunkingService
+    tuned_config: Optional[str] = None
 
 class Document(BaseModel):
     id: str
     title: str
     content: str = Field(..., min_length=50)
     file_type: FileType
+    domain: str = "general"
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 class Chunk(BaseModel):
@@ -48,3 +57,13 @@ class SearchResult(BaseModel):
     similarity_score: float
     distance: float
     rank: int
+    context: List[Chunk] = Field(default_factory=list)
+    context_of: Optional[int] = None
+
+class SearchResponse(BaseModel):
+    """Results of a deadline-bounded search; `degraded` when any stage was cut short"""
+    results: List[SearchResult] = Field(default_factory=list)
+    degraded: bool = False
+    timed_out: List[str] = Field(default_factory=list)
+    reduced: List[str] = Field(default_factory=list)
+    elapsed_ms: float = 0.0
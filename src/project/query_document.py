@@ -1,11 +1,28 @@
 from project.query_engine import search_documents
 from project.milvus import MilvusVectorStore
+from project.worker import WorkerClient
+
+def print_results(results):
+    """Print results returned by the warm worker"""
+    if not results:
+        print("No results found")
+        return
+    print(f"\nFound {len(results)} results:")
+    for result in results:
+        print(f"\nRank {result['rank']}:")
+        print(f"Similarity: {result['similarity_score']:.3f}")
+        print(f"Content: {result['chunk']['content'][:400]}...")
 
 def main():
     print("DOCUMENT SEARCH")
     print("=" * 20)
     
-    stats = MilvusVectorStore.get_stats()
+    worker = WorkerClient()
+    use_worker = worker.available()
+    if use_worker:
+        print("Using warm worker")
+    
+    stats = worker.call("stats") if use_worker else MilvusVectorStore.get_stats()
     total_chunks = stats.get('total_chunks', 0)
     
     if total_chunks == 0:
@@ -23,7 +40,10 @@ def main():
             continue
         
         try:
-            search_documents(query, limit=3)
+            if use_worker:
+                print_results(worker.call("search", query=query, limit=3))
+            else:
+                search_documents(query, limit=3)
         except Exception as e:
             print(f"Error: {e}")
 
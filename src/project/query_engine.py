@@ -1,25 +1,100 @@
-from typing import List
-from project.pydantic_models import SearchResult
+from typing import List, Optional
+from project.pydantic_models import SearchResult, SearchResponse
 from project.milvus import MilvusVectorStore
+from project.chunk_store import SQLITE_DB
+from project.deadline import Deadline
+from project.records import to_results
 
 class QueryEngine:
-    def __init__(self):
+    def __init__(self, db_path: str = SQLITE_DB):
+        self.db_path = db_path
+        self._expander = None
         print("Query engine ready")
 
-    def search(self, query: str, limit: int = 5) -> List[SearchResult]:
-        results = MilvusVectorStore.search_by_text(query, limit)
+    @property
+    def expander(self):
+        if self._expander is None:
+            from project.chunk_store import ChunkStore
+            from project.context_expander import ContextExpander
+            hydrator = MilvusVectorStore._hydrator
+            store = hydrator.store if hydrator is not None else ChunkStore(self.db_path)
+            self._expander = ContextExpander(store, hydrator)
+        return self._expander
+
+    def search(self, query: str, limit: int = 5, tenant: str = None,
+               expand_window: int = 0, top_documents: int = 0, deadline_ms: float = None,
+               multi_query: bool = False, variants: Optional[List[str]] = None, group_by: str = None,
+               group_size: int = 1) -> List[SearchResult]:
+        """Flat chunk search, or two-stage (top documents, then their chunks) when `top_documents` > 0.
+
+        `multi_query` (or explicit `variants`) searches several phrasings of
+        the query in one batch and fuses the rankings; see MultiQuery.
+        `group_by="doc_id"` returns at most `group_size` chunks per document.
+        """
+        return self.search_response(query, limit, tenant, expand_window, top_documents, deadline_ms,
+                                    multi_query, variants, group_by, group_size).results
+
+    def search_response(self, query: str, limit: int = 5, tenant: str = None, expand_window: int = 0,
+                        top_documents: int = 0, deadline_ms: float = None, multi_query: bool = False,
+                        variants: Optional[List[str]] = None, group_by: str = None,
+                        group_size: int = 1) -> SearchResponse:
+        """Like search(), but reports whether a `deadline_ms` budget forced partial results"""
+        deadline = Deadline.optional(deadline_ms)
+        if multi_query or variants:
+            from project.multi_query import MultiQuery
+            expr = None
+            if top_documents > 0:
+                from project.doc_index import DocumentIndex
+                expr = DocumentIndex.doc_filter(query, tenant, top_documents, deadline)
+            hits = MultiQuery.search(query, limit, tenant, variants, expr, deadline,
+                                     group_by=group_by, group_size=group_size)
+        elif top_documents > 0:
+            from project.doc_index import DocumentIndex
+            hits = DocumentIndex.search(query, limit, tenant, top_documents, deadline=deadline,
+                                        group_by=group_by, group_size=group_size)
+        else:
+            hits = MilvusVectorStore.search_hits(query, limit, tenant, deadline=deadline,
+                                                 group_by=group_by, group_size=group_size)
+        if expand_window > 0 and hits:
+            if deadline is None:
+                self.expander.expand(hits, expand_window)
+            elif deadline.expired():
+                deadline.miss("expand")
+            elif deadline.tight():
+                deadline.reduce("expand")
+            else:
+                self.expander.expand(hits, expand_window)
         
-        if results:
-            print(f"\nFound {len(results)} results:")
-            for result in results:
-                print(f"\nRank {result.rank}:")
-                print(f"Similarity: {result.similarity_score:.3f}")
-                print(f"Content: {result.chunk.content[:400]}...")
+        if hits:
+            print(f"\nFound {len(hits)} results:")
+            for hit in hits:
+                print(f"\nRank {hit.rank}:")
+                print(f"Similarity: {hit.similarity_score:.3f}")
+                if hit.context:
+                    print(f"Context: {len(hit.context)} chunks")
+                    print(f"Content: {' '.join(c.content for c in hit.context)[:800]}...")
+                elif hit.context_of is not None:
+                    print(f"Context: merged into rank {hit.context_of}")
+                else:
+                    print(f"Content: {hit.chunk.content[:400]}...")
         else:
             print("No results found")
         
-        return results
+        # Validate once, at the API boundary
+        results = to_results(hits)
+        if deadline is None:
+            return SearchResponse(results=results)
+        if deadline.degraded:
+            print(f"Degraded: timed out {deadline.missed or '-'}, reduced {deadline.reduced or '-'}")
+        return SearchResponse(
+            results=results,
+            degraded=deadline.degraded,
+            timed_out=deadline.missed,
+            reduced=deadline.reduced,
+            elapsed_ms=deadline.elapsed_ms()
+        )
 
-def search_documents(query: str, limit: int = 5) -> List[SearchResult]:
+def search_documents(query: str, limit: int = 5, tenant: str = None,
+                     expand_window: int = 0, deadline_ms: float = None) -> List[SearchResult]:
     engine = QueryEngine()
-    return engine.search(query, limit)
+    return engine.search(query, limit, tenant, expand_window, deadline_ms=deadline_ms)
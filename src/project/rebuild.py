@@ -0,0 +1,330 @@
+import random
+import sys
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable
+from pymilvus import MilvusClient, Collection, CollectionSchema, DataType, utility
+from project.milvus import MilvusVectorStore
+from project.chunk_store import ChunkStore, SQLITE_DB
+from project.milvus_bilk_import import NULL_DEFAULTS
+from project.schema_setup import (
+    COLLECTION_NAME, VERSION_PATTERN, create_collection, resolve_alias, collection_versions
+)
+
+MILVUS_URI = "http://localhost:19530"
+
+class CollectionRebuilder:
+    """Blue/green rebuild of a collection that is served through a Milvus alias.
+
+    A new `<alias>_v<timestamp>` collection is built next to the live one,
+    either by copying the live vectors ("copy") or by re-embedding the
+    SQLite chunks, optionally with another model ("reembed"). It gets the
+    live collection's schema and indexes (a LangChain-created collection
+    keys on `pk` and keeps metadata in dynamic fields). Once its
+    index is built and the row count and a sample self-recall check pass,
+    the alias is switched atomically; searches never see an empty or
+    half-built index. A pre-alias physical collection is renamed to
+    `<alias>_v0` on the first rebuild. The previous `keep_versions`
+    versions are kept (released) for rollback.
+
+    Writes that reach the live collection while a rebuild runs are not
+    carried over; pause ingest or re-run it after the swap.
+    """
+
+    _version_lock = threading.Lock()
+    _last_version = 0  # two rebuilds started in the same second get distinct versions
+
+    def __init__(self, alias: str = COLLECTION_NAME, mode: str = "copy", embedding_model: str = None,
+                 slim: Optional[bool] = None, db_path: str = SQLITE_DB, batch_size: int = 1000,
+                 max_rows_per_sec: Optional[float] = None, index_timeout: float = 3600,
+                 recall_sample: int = 50, recall_k: int = 10, min_recall: float = 0.95,
+                 keep_versions: int = 1, row_filter: Callable[[Dict[str, Any]], bool] = None):
+        if mode not in ("copy", "reembed"):
+            raise ValueError(f"Unknown rebuild mode: {mode}")
+        if mode == "copy" and embedding_model not in (None, MilvusVectorStore.EMBEDDING_MODEL):
+            raise ValueError("Changing the embedding model needs mode='reembed'")
+        if VERSION_PATTERN.match(alias):
+            raise ValueError(f"'{alias}' ends like a rebuild version (_v<digits>) and cannot be rebuilt")
+        self.alias = alias
+        self.mode = mode
+        self.embedding_model = embedding_model or MilvusVectorStore.EMBEDDING_MODEL
+        self.slim = slim
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_rows_per_sec = max_rows_per_sec
+        self.index_timeout = index_timeout
+        self.recall_sample = recall_sample
+        self.recall_k = recall_k
+        self.min_recall = min_recall
+        self.keep_versions = keep_versions
+        self.row_filter = row_filter
+        self.client = None
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+    def start(self) -> threading.Thread:
+        """Run the rebuild in a background thread; check `result`/`error` after join()"""
+        def target():
+            try:
+                self.result = self.run()
+            except BaseException as e:
+                self.error = e
+        thread = threading.Thread(target=target, name=f"rebuild-{self.alias}", daemon=True)
+        thread.start()
+        return thread
+
+    def live_collection(self) -> Optional[str]:
+        """Physical collection currently serving the alias name"""
+        target = resolve_alias(self.client, self.alias)
+        if target is not None:
+            return target
+        return self.alias if self.client.has_collection(self.alias) else None
+
+    def run(self) -> str:
+        MilvusVectorStore.connect()
+        self.client = MilvusClient(uri=MILVUS_URI)
+        source = self.live_collection()
+        if self.mode == "copy" and source is None:
+            raise ValueError(f"Nothing to copy: '{self.alias}' does not exist")
+        slim = self.slim
+        if slim is None:
+            slim = self._is_slim(source) if source else MilvusVectorStore._slim
+        if self.mode == "copy" and slim != self._is_slim(source):
+            raise ValueError("Copied rows keep the live schema; switching slim mode needs mode='reembed'")
+
+        target = self._next_target()
+        print(f"Rebuilding '{self.alias}' ({source or 'empty'}) into '{target}' [{self.mode}]")
+        try:
+            if self.mode == "copy":
+                self._create_target(source, target, slim, self._vector_dim(Collection(source)))
+                expected = self._copy(source, target)
+            else:
+                embeddings = self._embeddings()
+                self._create_target(source, target, slim, len(embeddings.embed_query("dimension probe")))
+                expected = self._reembed(target, embeddings)
+            self._wait_for_index(target)
+            self._verify(target, expected)
+        except BaseException:
+            print(f"Rebuild failed, dropping '{target}'; '{self.alias}' is unchanged")
+            self.client.drop_collection(target)
+            raise
+        self._swap(target)
+        self._prune(target)
+        if self.embedding_model != MilvusVectorStore.EMBEDDING_MODEL:
+            MilvusVectorStore.use_embedding_model(self.embedding_model)
+            print(f"Queries must now embed with {self.embedding_model}")
+        return target
+
+    def _next_target(self) -> str:
+        """Unused `<alias>_v<n>` name, n the current time or the next free number"""
+        with CollectionRebuilder._version_lock:
+            version = max(int(time.time()), CollectionRebuilder._last_version + 1)
+            while self.client.has_collection(f"{self.alias}_v{version}"):
+                version += 1
+            CollectionRebuilder._last_version = version
+        return f"{self.alias}_v{version}"
+
+    def _create_target(self, source: Optional[str], target: str, slim: bool, dim: int):
+        """Empty target with the live collection's schema and indexes (vector dim replaced)"""
+        if source is None or slim != self._is_slim(source):
+            create_collection(target, slim=slim, dim=dim, drop_existing=False)
+            return
+        live = Collection(source)
+        schema_dict = live.schema.to_dict()
+        for field in schema_dict["fields"]:
+            if field["type"] == DataType.FLOAT_VECTOR:
+                field["params"]["dim"] = dim
+        collection = Collection(target, schema=CollectionSchema.construct_from_dict(schema_dict))
+        for index in live.indexes:
+            collection.create_index(index.field_name, index.params)
+
+    @staticmethod
+    def _is_slim(name: str) -> bool:
+        return all(field.name != "chunk_text" for field in Collection(name).schema.fields)
+
+    @staticmethod
+    def _vector_dim(collection) -> int:
+        field = next(f for f in collection.schema.fields if f.dtype == DataType.FLOAT_VECTOR)
+        return field.params["dim"]
+
+    def _embeddings(self):
+        if self.embedding_model == MilvusVectorStore.EMBEDDING_MODEL:
+            return MilvusVectorStore.load_embeddings()
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=self.embedding_model,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
+    def _throttle(self, done: int, started: float):
+        if not self.max_rows_per_sec:
+            return
+        ahead = done / self.max_rows_per_sec - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def _copy(self, source: str, target: str) -> int:
+        """Stream rows and vectors from the live collection; no re-embedding"""
+        collection = Collection(source)
+        vector_field = next(f.name for f in collection.schema.fields if f.dtype == DataType.FLOAT_VECTOR)
+        destination = Collection(target)
+        started = time.monotonic()
+        copied = 0
+        iterator = collection.query_iterator(
+            batch_size=self.batch_size, expr="", output_fields=["*", vector_field]
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                destination.insert(rows)
+                copied += len(rows)
+                print(f"Copied {copied} rows")
+                self._throttle(copied, started)
+        finally:
+            iterator.close()
+        return copied
+
+    def _entity(self, row: Dict[str, Any], schema, vector: List[float]) -> Dict[str, Any]:
+        """SQLite chunk row shaped to the target schema"""
+        values = {**row, "embedding_model": self.embedding_model}
+        for field, default in NULL_DEFAULTS.items():
+            if values.get(field) is None:
+                values[field] = default
+        values["chunk_tokens"] = values.get("chunk_tokens") or 0
+        values["chunk_overlap"] = values.get("chunk_overlap") or 0
+        values["pk"] = row["chunk_id"]  # LangChain's primary key
+        entity = {}
+        for field in schema.fields:
+            if field.dtype == DataType.FLOAT_VECTOR:
+                entity[field.name] = vector
+            elif not field.auto_id:
+                entity[field.name] = values.get(field.name)
+        if schema.enable_dynamic_field:
+            # Metadata LangChain writes and search results are read from
+            for field, value in (
+                ("chunk_id", row["chunk_id"]), ("doc_id", row["doc_id"]), ("chunk_index", row["chunk_index"]),
+                ("chunking_method", row.get("chunk_method")), ("file_type", row.get("content_type")),
+                ("word_count", values["chunk_tokens"]), ("domain", row.get("domain")),
+                ("embedding_model", self.embedding_model)
+            ):
+                entity.setdefault(field, value)
+        return entity
+
+    def _reembed(self, target: str, embeddings) -> int:
+        """Embed every SQLite chunk (the source of truth for text) into the new collection"""
+        destination = Collection(target)
+        schema = destination.schema
+        started = time.monotonic()
+        inserted = 0
+        with ChunkStore(self.db_path) as store:
+            for rows in store.iter_chunks(self.batch_size):
+                if self.row_filter is not None:
+                    rows = [row for row in rows if self.row_filter(row)]
+                if not rows:
+                    continue
+                vectors = embeddings.embed_documents([row["chunk_text"] for row in rows])
+                destination.insert([self._entity(row, schema, vector) for row, vector in zip(rows, vectors)])
+                inserted += len(rows)
+                print(f"Re-embedded {inserted} chunks")
+                self._throttle(inserted, started)
+        return inserted
+
+    def _wait_for_index(self, target: str):
+        collection = Collection(target)
+        collection.flush()
+        MilvusVectorStore.wait_for_index(target, self.index_timeout)
+        collection.load()
+        utility.wait_for_loading_complete(target)
+
+    def _verify(self, target: str, expected: int):
+        collection = Collection(target)
+        count = collection.query(expr="", output_fields=["count(*)"], consistency_level="Strong")[0]["count(*)"]
+        if count != expected:
+            raise RuntimeError(f"'{target}' has {count} rows, expected {expected}")
+        if not count:
+            return
+        recall = self.sample_recall(collection, count)
+        print(f"Verified '{target}': {count} rows, sample recall@{self.recall_k} {recall:.3f}")
+        if recall < self.min_recall:
+            raise RuntimeError(f"Sample recall {recall:.3f} below {self.min_recall}")
+
+    def sample_recall(self, collection, count: int) -> float:
+        """Fraction of sampled rows found in the top-k when searched with their own vector"""
+        primary = collection.schema.primary_field.name
+        vector_field = next(f.name for f in collection.schema.fields if f.dtype == DataType.FLOAT_VECTOR)
+        size = min(self.recall_sample, count)
+        # query offset + limit is capped at 16384 by Milvus
+        offset = random.randint(0, max(0, min(count, 16384) - size))
+        sample = collection.query(expr="", output_fields=[primary, vector_field], offset=offset, limit=size)
+        results = collection.search(
+            data=[row[vector_field] for row in sample],
+            anns_field=vector_field,
+            param={"metric_type": "COSINE", "params": {"ef": max(64, self.recall_k)}},
+            limit=self.recall_k,
+            output_fields=[]
+        )
+        found = sum(
+            1 for row, hits in zip(sample, results) if row[primary] in {hit.id for hit in hits}
+        )
+        return found / len(sample)
+
+    def _swap(self, target: str):
+        current = resolve_alias(self.client, self.alias)
+        if current is not None:
+            # One metadata operation: searches move from the old to the new version atomically
+            self.client.alter_alias(collection_name=target, alias=self.alias)
+        elif self.client.has_collection(self.alias):
+            # First rebuild: the name is still a physical collection and must be freed.
+            # Requests in the moment between rename and create_alias fail fast.
+            legacy = f"{self.alias}_v0"
+            self.client.rename_collection(old_name=self.alias, new_name=legacy)
+            self.client.create_alias(collection_name=target, alias=self.alias)
+            print(f"Legacy collection '{self.alias}' kept as '{legacy}'")
+        else:
+            self.client.create_alias(collection_name=target, alias=self.alias)
+        MilvusVectorStore.forget(self.alias)
+        print(f"Alias '{self.alias}' -> '{target}'")
+
+    def _prune(self, live: str):
+        """Release kept versions and drop those beyond `keep_versions`"""
+        older = [name for name in collection_versions(self.client, self.alias) if name != live]
+        keep = older[-self.keep_versions:] if self.keep_versions > 0 else []
+        for name in older:
+            if name in keep:
+                self.client.release_collection(name)
+            else:
+                self.client.drop_collection(name)
+                print(f"Dropped old version '{name}'")
+
+    def rollback(self) -> str:
+        """Point the alias back at the newest version older than the live one"""
+        MilvusVectorStore.connect()
+        self.client = MilvusClient(uri=MILVUS_URI)
+        live = resolve_alias(self.client, self.alias)
+        versions = collection_versions(self.client, self.alias)
+        if live not in versions or versions.index(live) == 0:
+            raise RuntimeError(f"No earlier version of '{self.alias}' to roll back to")
+        previous = versions[versions.index(live) - 1]
+        self.client.load_collection(previous)
+        self.client.alter_alias(collection_name=previous, alias=self.alias)
+        self.client.release_collection(live)
+        MilvusVectorStore.forget(self.alias)
+        print(f"Rolled back '{self.alias}' -> '{previous}'")
+        return previous
+
+def rebuild_tenants(class_name: str = COLLECTION_NAME, **kwargs) -> Dict[str, str]:
+    """Rebuild every per-tenant collection, one at a time"""
+    rebuilt = {}
+    for name in MilvusVectorStore.tenant_collections(class_name):
+        row_filter = lambda row, name=name: MilvusVectorStore.collection_for(row["domain"], class_name) == name
+        rebuilt[name] = CollectionRebuilder(alias=name, row_filter=row_filter, **kwargs).run()
+    return rebuilt
+
+if __name__ == "__main__":
+    # python -m project.rebuild [copy|reembed] [embedding_model]
+    mode = sys.argv[1] if len(sys.argv) > 1 else "copy"
+    model = sys.argv[2] if len(sys.argv) > 2 else None
+    CollectionRebuilder(mode=mode, embedding_model=model).run()
@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any
+from pydantic import ValidationError
+from project.pydantic_models import Chunk, ChunkingMethod, SearchResult
+
+_METHOD_VALUES = {method.value for method in ChunkingMethod}
+
+@dataclass(slots=True)
+class DocumentMeta:
+    """Metadata shared by every chunk of one document (stored once, not per chunk)"""
+    doc_id: str
+    title: str
+    file_type: str
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "document_title": self.title,
+            "file_type": self.file_type,
+            **self.extra
+        }
+
+@dataclass(slots=True)
+class ChunkRecord:
+    """Unvalidated chunk used inside the ingest and query pipeline.
+
+    Convert with to_chunk() only when handing data to API callers.
+    """
+    id: str
+    doc_id: str
+    content: str
+    chunk_index: int
+    chunking_method: ChunkingMethod
+    doc: Optional[DocumentMeta] = None
+    extra: Optional[Dict[str, Any]] = None
+    embedding: Optional[List[float]] = None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """Full metadata view, built on demand from shared + per-chunk parts"""
+        meta = self.doc.as_dict() if self.doc is not None else {}
+        meta["chunk_size"] = len(self.content)
+        meta["word_count"] = len(self.content.split())
+        if self.extra:
+            meta.update(self.extra)
+        return meta
+
+    def to_chunk(self) -> Chunk:
+        return Chunk(
+            id=self.id,
+            doc_id=self.doc_id,
+            content=self.content,
+            chunk_index=self.chunk_index,
+            chunking_method=self.chunking_method,
+            embedding=self.embedding,
+            metadata=self.metadata
+        )
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "ChunkRecord":
+        """Build from a SQLite chunks row (ChunkStore hydrate columns)"""
+        method = row.get("chunk_method")
+        return cls(
+            id=row["chunk_id"],
+            doc_id=row["doc_id"],
+            content=row["chunk_text"],
+            chunk_index=row["chunk_index"],
+            chunking_method=ChunkingMethod(method) if method in _METHOD_VALUES else ChunkingMethod.RECURSIVE,
+            extra={"domain": row.get("domain"), "file_type": row.get("content_type")}
+        )
+
+    @classmethod
+    def from_chunk(cls, chunk: Chunk) -> "ChunkRecord":
+        return cls(
+            id=chunk.id,
+            doc_id=chunk.doc_id,
+            content=chunk.content,
+            chunk_index=chunk.chunk_index,
+            chunking_method=chunk.chunking_method,
+            extra=dict(chunk.metadata),
+            embedding=chunk.embedding
+        )
+
+@dataclass(slots=True)
+class SearchHit:
+    """Unvalidated search hit; to_result() builds the API-facing SearchResult"""
+    chunk: ChunkRecord
+    similarity_score: float
+    distance: float
+    rank: int
+    # Neighbouring chunks (merged window) or the rank of the hit that carries them
+    context: Optional[List[ChunkRecord]] = None
+    context_of: Optional[int] = None
+
+    def to_result(self) -> SearchResult:
+        return SearchResult(
+            chunk=self.chunk.to_chunk(),
+            similarity_score=self.similarity_score,
+            distance=self.distance,
+            rank=self.rank,
+            context=[chunk.to_chunk() for chunk in self.context or []],
+            context_of=self.context_of
+        )
+
+def to_results(hits: List[SearchHit]) -> List[SearchResult]:
+    """Validate hits at the API boundary; a malformed hit is logged and skipped, not fatal.
+
+    Ranks of the remaining results are renumbered and `context_of` follows
+    them; it is cleared if it pointed at a skipped hit.
+    """
+    results = []
+    new_ranks: Dict[int, int] = {}
+    for hit in hits:
+        try:
+            result = hit.to_result()
+        except (ValidationError, TypeError) as e:
+            print(f"Skipping malformed hit {hit.chunk.id}: {e}")
+            continue
+        new_ranks[hit.rank] = len(results) + 1
+        results.append(result)
+    for result in results:
+        result.rank = new_ranks[result.rank]
+        if result.context_of is not None:
+            result.context_of = new_ranks.get(result.context_of)
+    return results
+
+def chunk_dicts(document, chunks) -> List[Dict[str, Any]]:
+    """Flatten chunks into the row dicts shared by NDJSON, SQLite and Milvus inserts.
+
+    chunk_id and chunk_index match what is stored in Milvus; chunk_index is
+    the chunk's position assigned by the chunker, so neighbours are
+    contiguous and context windows agree across both stores.
+    """
+    dicts = []
+    for chunk in chunks:
+        dicts.append({
+            "chunk_id": chunk.id,
+            "doc_id": document.id,  # always use doc_id!
+            "chunk_index": chunk.chunk_index,
+            "chunk_text": chunk.content,
+            "chunk_size": len(chunk.content),
+            "chunk_tokens": len(chunk.content.split()),
+            "chunk_method": getattr(chunk, "chunking_method", "recursive").value if hasattr(getattr(chunk, "chunking_method", "recursive"), "value") else str(getattr(chunk, "chunking_method", "recursive")),
+            "chunk_overlap": 50,
+            "start_position": None,
+            "end_position": None,
+            "domain": getattr(document, "domain", "general"),
+            "content_type": getattr(document, "file_type", "unknown").value if hasattr(getattr(document, "file_type", "unknown"), "value") else str(getattr(document, "file_type", "unknown")),
+            "embedding_model": "sentence-transformers/all-mpnet-base-v2",
+            "vector_id": None,
+            "embedding_timestamp": None,
+            "created_at": None,
+            "embedding_vector": chunk.embedding
+        })
+    return dicts
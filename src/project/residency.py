@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from project.schema_setup import EMBEDDING_DIM
+
+class ResidencyManager:
+    """Keep only recently queried collections loaded, within a memory budget.
+
+    The unit of residency is a collection: with tenant routing every domain
+    has its own (`rag_chunks__<domain>`), so cold domains can be released
+    while hot ones stay loaded. A collection is loaded on first access and
+    its resident size read from the query nodes' segment info; when the
+    total passes `budget_mb` the least-recently-used collections are
+    released. Collections pinned by in-flight requests are never released.
+    `on_release` is called with the name of every released collection so
+    callers can drop handles they cached. Access counts are kept in
+    `state_path` so `prewarm()` can load the hot set at the next startup.
+    """
+
+    # Resident bytes per row when segment info has no mem_size (vector + HNSW links + scalars)
+    ROW_BYTES_ESTIMATE = EMBEDDING_DIM * 4 + 16 * 2 * 8 + 256
+
+    def __init__(self, budget_mb: float, replica_number: int = 1, state_path: Optional[str] = None,
+                 load_timeout: float = 300, on_release: Optional[Callable[[str], None]] = None):
+        self.budget_mb = budget_mb
+        self.replica_number = replica_number
+        self.state_path = Path(state_path) if state_path else None
+        self.load_timeout = load_timeout
+        self.on_release = on_release
+        self._resident: "OrderedDict[str, float]" = OrderedDict()  # name -> MB, oldest first
+        self._access: Dict[str, Dict[str, float]] = self._read_state()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._pins: Dict[str, int] = {}  # name -> requests currently using it
+        self.loads = 0
+        self.releases = 0
+
+    def _read_state(self) -> Dict[str, Dict[str, float]]:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring residency state {self.state_path}: {e}")
+            return {}
+
+    def save(self):
+        if self.state_path is None:
+            return
+        with self._lock:
+            state = json.dumps(self._access, indent=1)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(state, encoding="utf-8")
+        tmp.replace(self.state_path)
+
+    @classmethod
+    def resident_mb(cls, name: str) -> float:
+        """Memory the query nodes hold for a loaded collection"""
+        from pymilvus import utility
+        total = 0
+        for segment in utility.get_query_segment_info(name):
+            total += segment.mem_size or segment.num_rows * cls.ROW_BYTES_ESTIMATE
+        return total / (1024 * 1024)
+
+    @classmethod
+    def estimate_mb(cls, name: str) -> float:
+        """Resident size of a collection that is not loaded, from its row count"""
+        from pymilvus import Collection
+        return Collection(name).num_entities * cls.ROW_BYTES_ESTIMATE / (1024 * 1024)
+
+    def sync(self):
+        """Adopt collections that are already loaded (treated as least recently used)"""
+        from pymilvus import utility
+        from pymilvus.client.types import LoadState
+        for name in utility.list_collections():
+            if name not in self._resident and utility.load_state(name) == LoadState.Loaded:
+                size = self.resident_mb(name)
+                with self._lock:
+                    self._resident[name] = size
+                    self._resident.move_to_end(name, last=False)
+        self._evict()
+
+    def _record(self, name: str):
+        entry = self._access.setdefault(name, {"hits": 0, "last_access": 0.0})
+        entry["hits"] += 1
+        entry["last_access"] = time.time()
+
+    def touch(self, name: str, timeout: float = None, record: bool = True):
+        """Mark a collection as used, loading it (and evicting others) if it is not resident"""
+        with self._lock:
+            if record:
+                self._record(name)
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # One load per collection at a time; other collections stay queryable meanwhile
+        with load_lock:
+            if name in self._resident:
+                return
+            self._load(name, timeout)
+        self._evict(keep=name)
+
+    @contextmanager
+    def pinned(self, name: str):
+        """Keep `name` from being evicted while the block runs (pin first, then load it)"""
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[name] -= 1
+                if not self._pins[name]:
+                    del self._pins[name]
+            # Eviction may have been held back by this pin
+            self._evict()
+
+    def _load(self, name: str, timeout: float = None):
+        from pymilvus import Collection, utility
+        started = time.monotonic()
+        Collection(name).load(replica_number=self.replica_number, timeout=timeout or self.load_timeout)
+        utility.wait_for_loading_complete(name, timeout=timeout or self.load_timeout)
+        size = self.resident_mb(name)
+        with self._lock:
+            self._resident[name] = size
+            self.loads += 1
+        print(f"Loaded '{name}' ({size:.0f} MB) in {time.monotonic() - started:.1f}s")
+
+    def register(self, name: str):
+        """Account for a collection loaded elsewhere (finalize, reload)"""
+        size = self.resident_mb(name)
+        with self._lock:
+            self._resident[name] = size
+            self._resident.move_to_end(name)
+        self._evict(keep=name)
+
+    def _evict(self, keep: str = None):
+        while True:
+            with self._lock:
+                if sum(self._resident.values()) <= self.budget_mb:
+                    return
+                victim = next(
+                    (name for name in self._resident if name != keep and name not in self._pins), None
+                )
+                if victim is None:
+                    return
+                size = self._resident.pop(victim)
+            self.release(victim, size)
+
+    def release(self, name: str, size: float = None):
+        from pymilvus import Collection
+        with self._lock:
+            if size is None:
+                size = self._resident.pop(name, 0.0)
+            self.releases += 1
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # A touch() that arrives meanwhile waits and loads it again afterwards
+        with load_lock:
+            if self.on_release is not None:
+                self.on_release(name)
+            Collection(name).release()
+        print(f"Released '{name}' ({size:.0f} MB) to stay within {self.budget_mb:.0f} MB")
+        self.save()
+
+    def hot(self, limit: int = None) -> List[str]:
+        """Collections by access count, most used first"""
+        with self._lock:
+            ranked = sorted(self._access, key=lambda name: (-self._access[name]["hits"],
+                                                            -self._access[name]["last_access"]))
+        return ranked[:limit] if limit else ranked
+
+    def prewarm(self, names: List[str] = None):
+        """Load the given (or historically hottest) collections, hottest first, while they fit the budget"""
+        from pymilvus import utility
+        warmed = []
+        for name in names or self.hot():
+            if not utility.has_collection(name):
+                continue
+            if name not in self._resident:
+                free = self.budget_mb - sum(self._resident.values())
+                if self.estimate_mb(name) > free:
+                    continue
+            self.touch(name, record=False)
+            warmed.append(name)
+        with self._lock:
+            # Hottest ends up most recently used, so it is the last to be released
+            for name in reversed(warmed):
+                if name in self._resident:
+                    self._resident.move_to_end(name)
+        print(f"Prewarmed {len(self._resident)} collections, "
+              f"{sum(self._resident.values()):.0f}/{self.budget_mb:.0f} MB resident")
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "resident_mb": round(sum(self._resident.values()), 1),
+                "resident": list(reversed(self._resident)),
+                "loads": self.loads,
+                "releases": self.releases,
+            }
@@ -1,13 +1,98 @@
+import re
+from typing import List, Optional
 from pymilvus import MilvusClient, DataType
 
 COLLECTION_NAME = "rag_chunks"
+# Companion collection of document-level vectors for two-stage retrieval
+DOC_COLLECTION_NAME = "rag_docs"
+EMBEDDING_DIM = 768
 
-def create_collection():
+# Rebuilds create <name>_v<timestamp> collections and point the alias <name> at one
+VERSION_PATTERN = re.compile(r"^(?P<base>.+)_v(?P<version>\d+)$")
+
+# Scalars kept in a slim collection; chunk text and the rest live in SQLite
+SLIM_FIELDS = ["chunk_id", "doc_id", "chunk_index", "domain", "content_type", "embedding_model"]
+
+def resolve_alias(client: MilvusClient, name: str) -> Optional[str]:
+    """Collection an alias points to, or None if `name` is not an alias"""
+    try:
+        return client.describe_alias(name).get("collection_name")
+    except Exception:
+        return None
+
+def collection_versions(client: MilvusClient, base: str) -> List[str]:
+    """Versioned collections built for `base`, oldest first"""
+    versions = []
+    for name in client.list_collections():
+        match = VERSION_PATTERN.match(name)
+        if match and match.group("base") == base:
+            versions.append((int(match.group("version")), name))
+    return [name for _, name in sorted(versions)]
+
+def drop_collection(client: MilvusClient, name: str):
+    """Drop a collection; for an alias, drop the alias and the collection behind it"""
+    target = resolve_alias(client, name)
+    if target is None:
+        if client.has_collection(name):
+            client.drop_collection(name)
+        return
+    client.drop_alias(name)
+    client.drop_collection(target)
+
+def create_collection(collection_name: str = COLLECTION_NAME, slim: bool = False, drop_existing: bool = True,
+                      dim: int = EMBEDDING_DIM, documents: bool = False):
     client = MilvusClient(uri="http://localhost:19530")
     
-    if client.has_collection(COLLECTION_NAME):
-        client.drop_collection(COLLECTION_NAME)
+    if client.has_collection(collection_name) or resolve_alias(client, collection_name):
+        if not drop_existing:
+            return
+        drop_collection(client, collection_name)
     
+    if documents:
+        schema = create_doc_schema(dim)
+    else:
+        schema = create_slim_schema(dim) if slim else create_full_schema(dim)
+    index_params = client.prepare_index_params()
+    index_params.add_index(
+        field_name="embedding_vector",
+        index_type="HNSW",
+        metric_type="COSINE",
+        params={"M": 16, "efConstruction": 200}
+    )
+    
+    client.create_collection(
+        collection_name=collection_name,
+        schema=schema,
+        index_params=index_params,
+        consistency_level="Bounded"
+    )
+    
+    print(f"Milvus collection '{collection_name}' created successfully!")
+
+def create_slim_schema(dim: int = EMBEDDING_DIM):
+    """Vector plus filterable scalars only; hydrate text from SQLite at query time"""
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)
+    schema.add_field("chunk_id", DataType.VARCHAR, max_length=255, is_primary=True)
+    schema.add_field("doc_id", DataType.VARCHAR, max_length=255)
+    schema.add_field("chunk_index", DataType.INT64)
+    schema.add_field("domain", DataType.VARCHAR, max_length=100)
+    schema.add_field("content_type", DataType.VARCHAR, max_length=50)
+    schema.add_field("embedding_model", DataType.VARCHAR, max_length=200)
+    schema.add_field("embedding_vector", DataType.FLOAT_VECTOR, dim=dim)
+    return schema
+
+def create_doc_schema(dim: int = EMBEDDING_DIM):
+    """One row per document: pooled chunk vector plus filterable scalars"""
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)
+    schema.add_field("doc_id", DataType.VARCHAR, max_length=255, is_primary=True)
+    schema.add_field("title", DataType.VARCHAR, max_length=1024)
+    schema.add_field("domain", DataType.VARCHAR, max_length=100)
+    schema.add_field("content_type", DataType.VARCHAR, max_length=50)
+    schema.add_field("chunk_count", DataType.INT64)
+    schema.add_field("embedding_vector", DataType.FLOAT_VECTOR, dim=dim)
+    return schema
+
+def create_full_schema(dim: int = EMBEDDING_DIM):
     # CRITICAL: Enable dynamic schema for LangChain compatibility
     schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=True)
     
@@ -27,24 +112,8 @@ def create_collection():
     schema.add_field("vector_id", DataType.VARCHAR, max_length=255)
     schema.add_field("embedding_timestamp", DataType.VARCHAR, max_length=50)
     schema.add_field("created_at", DataType.VARCHAR, max_length=50)
-    schema.add_field("embedding_vector", DataType.FLOAT_VECTOR, dim=768)
-    
-    index_params = client.prepare_index_params()
-    index_params.add_index(
-        field_name="embedding_vector",
-        index_type="HNSW",
-        metric_type="COSINE",
-        params={"M": 16, "efConstruction": 200}
-    )
-    
-    client.create_collection(
-        collection_name=COLLECTION_NAME,
-        schema=schema,
-        index_params=index_params,
-        consistency_level="Bounded"
-    )
-    
-    print(f"Milvus collection '{COLLECTION_NAME}' created successfully!")
+    schema.add_field("embedding_vector", DataType.FLOAT_VECTOR, dim=dim)
+    return schema
 
 if __name__ == "__main__":
     create_collection()
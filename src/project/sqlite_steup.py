@@ -1,7 +1,7 @@
 import sqlite3
 
-def create_sqlite_db(db_path="rag_chunks.db"):
-    conn = sqlite3.connect(db_path)
+def create_tables(conn):
+    """Create tables and lookup indexes on an open connection (idempotent)"""
     cur = conn.cursor()
 
     # Documents Table
@@ -53,7 +53,123 @@ def create_sqlite_db(db_path="rag_chunks.db"):
     )
     """)
 
+    # Columns added after the first release; older DBs get them on open
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(chunks)")}
+    if "chunk_text_z" not in columns:
+        # zstd-compressed chunk_text (chunk_text is then '') and the dictionary it needs
+        cur.execute("ALTER TABLE chunks ADD COLUMN chunk_text_z BLOB")
+        cur.execute("ALTER TABLE chunks ADD COLUMN text_dict_id INTEGER")
+
+    # Trained zstd dictionaries for chunk text, versioned per content_type
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS zstd_dicts (
+        dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_type TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        sample_count INTEGER,
+        dict_hash TEXT NOT NULL UNIQUE,
+        dict_data BLOB NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (content_type, version)
+    )
+    """)
+
+    # Dedup: fingerprints of canonical chunks, MinHash LSH buckets, duplicate links
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chunk_fingerprints (
+        chunk_id TEXT PRIMARY KEY,
+        doc_id TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        minhash BLOB
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS minhash_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        chunk_id TEXT NOT NULL
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chunk_duplicates (
+        chunk_id TEXT PRIMARY KEY,
+        doc_id TEXT NOT NULL,
+        chunk_index INTEGER,
+        canonical_chunk_id TEXT NOT NULL,
+        match_type TEXT NOT NULL,
+        similarity REAL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    duplicate_columns = {row[1] for row in cur.execute("PRAGMA table_info(chunk_duplicates)")}
+    if "chunk_index" not in duplicate_columns:
+        # Position of the dropped chunk, needed to promote it if its canonical is deleted
+        cur.execute("ALTER TABLE chunk_duplicates ADD COLUMN chunk_index INTEGER")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS dedup_stats (
+        doc_id TEXT PRIMARY KEY,
+        total_chunks INTEGER NOT NULL,
+        exact_duplicates INTEGER NOT NULL,
+        near_duplicates INTEGER NOT NULL,
+        dedup_ratio REAL NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Files killed or failed under the per-file ingest budget; skipped until they change
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS quarantine (
+        source_path TEXT PRIMARY KEY,
+        file_size INTEGER,
+        file_mtime REAL,
+        reason TEXT NOT NULL,
+        stage TEXT,
+        elapsed_seconds REAL,
+        peak_rss_mb REAL,
+        error_message TEXT,
+        attempts INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Per-file ingest checkpoints; file_key is the path relative to the data directory
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        file_key TEXT PRIMARY KEY,
+        doc_id TEXT,
+        chunk_count INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        ndjson_offset INTEGER NOT NULL,
+        worker_id TEXT,
+        finished_at DATETIME
+    )
+    """)
+
+    # Every doc_id an ingest worker started writing; scopes IngestCoordinator.reconcile_milvus
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_attempts (
+        doc_id TEXT PRIMARY KEY,
+        source_path TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Lookup indexes (chunk_id/doc_id primary keys exist already)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks (doc_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_chunk ON chunks (doc_id, chunk_index)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_embedding_model ON chunks (embedding_model)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_source_path ON documents (source_path)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON chunk_fingerprints (content_hash)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_minhash_bands ON minhash_bands (band, bucket)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_canonical ON chunk_duplicates (canonical_chunk_id)")
+
     conn.commit()
+
+def create_sqlite_db(db_path="rag_chunks.db"):
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
     conn.close()
     print("SQLite tables 'documents' and 'chunks' created successfully!")
 
@@ -1,12 +1,17 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime
+import numpy as np
 from project.pydantic_models import Document, Chunk
-from project.weaviate_ut import VectorStore
+from project.records import ChunkRecord
+from project.chunk_archive import ChunkArchiveWriter, ChunkArchiveReader
+from project.milvus import MilvusVectorStore
+from project.compression import compress, decompress, default_codec
 
 class StorageManager:
-    """Handle JSON storage and backup operations"""
+    """Handle JSON storage and Milvus snapshot/restore"""
     
     def __init__(self, storage_dir: str = "data/storage"):
         self.storage_dir = Path(storage_dir)
@@ -54,74 +59,144 @@ class StorageManager:
         print(f"Loaded {len(chunks)} chunks from: {filepath}")
         return chunks
     
-    def backup_weaviate_data(self) -> str:
-        """Backup all Weaviate data to JSON"""
-        
-        print("Backing up Weaviate data...")
-        
-        try:
-            client = VectorStore.get_client()
-            
-            # Get all objects
-            result = client.query.get("DocumentChunk").with_additional(["vector"]).do()
-            
-            if "data" not in result or "Get" not in result["data"]:
-                print("No data found in Weaviate")
-                return ""
-            
-            objects = result["data"]["Get"].get("DocumentChunk", [])
-            
+    def save_chunks_to_archive(self, chunks, filename: str = None, codec: str = "none",
+                               block_size: int = 256) -> str:
+        """Stream chunks (any iterable) into an append-only archive; codec 'zstd' compresses each block"""
+        if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = self.storage_dir / f"weaviate_backup_{timestamp}.json"
-            
-            backup_data = {
-                "metadata": {
-                    "backup_date": datetime.now().isoformat(),
-                    "total_objects": len(objects)
-                },
-                "objects": objects
-            }
-            
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"Backup saved: {backup_file}")
-            return str(backup_file)
-            
-        except Exception as e:
-            print(f"Backup failed: {e}")
-            return ""
-    
-    def restore_weaviate_data(self, backup_file: str):
-        """Restore Weaviate data from JSON backup"""
-        
-        print(f"Restoring from: {backup_file}")
-        
+            filename = f"chunks_{timestamp}.chunks"
+        filepath = self.storage_dir / filename
+        with ChunkArchiveWriter(str(filepath), codec=codec, block_size=block_size) as writer:
+            writer.extend(chunks)
+        print(f"Archived {writer.written} chunks to: {filepath}")
+        return str(filepath)
+
+    def iter_chunks_from_archive(self, filepath: str) -> Iterator[ChunkRecord]:
+        """Lazily yield chunks from an archive without loading it into memory"""
+        return iter(ChunkArchiveReader(filepath))
+
+    def get_archived_chunk(self, filepath: str, chunk_id: str) -> Optional[ChunkRecord]:
+        return ChunkArchiveReader(filepath).get(chunk_id)
+
+    def snapshot_collection(self, class_name: str = "rag_chunks", batch_size: int = 10000,
+                            codec: str = None) -> str:
+        """Stream a Milvus collection to compressed binary parts plus a manifest.
+
+        Each part holds `batch_size` rows: vectors as a raw float32 matrix and
+        the remaining fields as JSON lines, so restore needs no re-embedding.
+        """
+        from pymilvus import Collection, DataType
+        MilvusVectorStore.connect()
+        codec = codec or default_codec()
+        collection = Collection(class_name)
+        collection.load()
+        schema = collection.schema
+        vector_field = next(f for f in schema.fields if f.dtype == DataType.FLOAT_VECTOR)
+        dim = vector_field.params["dim"]
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_dir = self.storage_dir / f"snapshot_{class_name}_{timestamp}"
+        snapshot_dir.mkdir(parents=True)
+        print(f"Snapshotting '{class_name}' to {snapshot_dir} ({codec})")
+
+        parts = []
+        total = 0
+        iterator = collection.query_iterator(
+            batch_size=batch_size, expr="", output_fields=["*", vector_field.name]
+        )
         try:
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                backup_data = json.load(f)
-            
-            objects = backup_data.get("objects", [])
-            client = VectorStore.get_client()
-            
-            # Clear existing data
-            VectorStore.clear_all_data()
-            
-            # Restore objects
-            with client.batch as batch:
-                batch.batch_size = 50
-                
-                for obj in objects:
-                    vector = obj.get("_additional", {}).get("vector", [])
-                    properties = {k: v for k, v in obj.items() if not k.startswith("_")}
-                    
-                    batch.add_data_object(
-                        class_name="DocumentChunk",
-                        data_object=properties,
-                        vector=vector
-                    )
-            
-            print(f"Restored {len(objects)} objects")
-            
-        except Exception as e:
-            print(f"Restore failed: {e}")
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                vectors = np.asarray([row.pop(vector_field.name) for row in rows], dtype=np.float32)
+                part = f"part-{len(parts):05d}"
+                scalars = "\n".join(json.dumps(row, ensure_ascii=False, default=str) for row in rows)
+                with open(snapshot_dir / f"{part}.vec", 'wb') as f:
+                    f.write(compress(vectors.tobytes(), codec))
+                with open(snapshot_dir / f"{part}.rows", 'wb') as f:
+                    f.write(compress(scalars.encode("utf-8"), codec))
+                parts.append({"name": part, "rows": len(rows)})
+                total += len(rows)
+                print(f"Wrote {part}: {len(rows)} rows ({total} total)")
+        finally:
+            iterator.close()
+
+        manifest = {
+            "collection": class_name,
+            "created_at": datetime.now().isoformat(),
+            "codec": codec,
+            "vector_field": vector_field.name,
+            "dim": dim,
+            "total_rows": total,
+            "schema": schema.to_dict(),
+            "indexes": [
+                {"field_name": index.field_name, "params": index.params} for index in collection.indexes
+            ],
+            "parts": parts,
+        }
+        # Manifest last: a snapshot without one is incomplete
+        with open(snapshot_dir / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=int)
+        print(f"Snapshot complete: {total} rows in {len(parts)} parts")
+        return str(snapshot_dir)
+
+    def restore_snapshot(self, snapshot_dir: str, class_name: str = None, workers: int = 4,
+                         insert_batch: int = 1000, drop_existing: bool = True) -> int:
+        """Bulk-load a snapshot into Milvus in parallel, reusing the stored vectors.
+
+        With drop_existing=False rows are appended to an existing collection.
+        """
+        from pymilvus import Collection, CollectionSchema, DataType, MilvusClient
+        from project.schema_setup import drop_collection, collection_versions, resolve_alias
+        snapshot_dir = Path(snapshot_dir)
+        with open(snapshot_dir / "manifest.json", 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        class_name = class_name or manifest["collection"]
+        MilvusVectorStore.connect()
+        print(f"Restoring {manifest['total_rows']} rows from {snapshot_dir} into '{class_name}'")
+
+        client = MilvusClient(uri="http://localhost:19530")
+        if drop_existing:
+            # The name may be an alias (see rebuild.py): drop it, the live version and rollback versions
+            drop_collection(client, class_name)
+            for version in collection_versions(client, class_name):
+                client.drop_collection(version)
+            MilvusVectorStore.forget(class_name)
+        if client.has_collection(class_name) or resolve_alias(client, class_name):
+            collection = Collection(class_name)
+        else:
+            schema_dict = manifest["schema"]
+            for field in schema_dict["fields"]:
+                field["type"] = DataType(field["type"])
+            collection = Collection(class_name, schema=CollectionSchema.construct_from_dict(schema_dict))
+            for index in manifest["indexes"]:
+                collection.create_index(index["field_name"], index["params"])
+
+        codec = manifest["codec"]
+        vector_field = manifest["vector_field"]
+        dim = manifest["dim"]
+
+        def load_part(part: Dict[str, Any]) -> int:
+            with open(snapshot_dir / f"{part['name']}.vec", 'rb') as f:
+                vectors = np.frombuffer(decompress(f.read(), codec), dtype=np.float32).reshape(-1, dim)
+            with open(snapshot_dir / f"{part['name']}.rows", 'rb') as f:
+                lines = decompress(f.read(), codec).decode("utf-8").split("\n")
+            rows = [json.loads(line) for line in lines]
+            for row, vector in zip(rows, vectors):
+                row[vector_field] = vector.tolist()
+            for i in range(0, len(rows), insert_batch):
+                collection.insert(rows[i:i + insert_batch])
+            return len(rows)
+
+        restored = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for count in pool.map(load_part, manifest["parts"]):
+                restored += count
+                print(f"Restored {restored}/{manifest['total_rows']} rows")
+        collection.flush()
+        MilvusVectorStore.forget(class_name)
+        # Loaded through the store, so residency accounts for it
+        MilvusVectorStore._collection(class_name)
+        print(f"Restore complete: {restored} rows")
+        return restored
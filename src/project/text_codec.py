@@ -0,0 +1,192 @@
+import argparse
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from project.compression import zstandard
+
+class ChunkTextCodec:
+    """zstd compression of chunks.chunk_text with one trained dictionary per content_type.
+
+    Dictionaries are versioned in the zstd_dicts table. Writes use the
+    newest dictionary of their content_type. The compressed text goes to
+    chunk_text_z (chunk_text is left empty) together with the dictionary
+    it needs. Content types without a dictionary, or a missing
+    `zstandard`, are written as plain text. Reading compressed rows needs
+    `zstandard`.
+    """
+
+    DICT_SIZE = 64 * 1024
+    LEVEL = 9
+    MIN_SAMPLES = 100
+    MAX_SAMPLES = 5000
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._compress_lock = threading.Lock()
+        self._local = threading.local()
+        self._dicts: Dict[int, object] = {}  # dict_id -> ZstdCompressionDict
+        self._latest: Dict[str, Tuple[int, object]] = {}  # content_type -> (dict_id, ZstdCompressor)
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._dicts.clear()
+            self._latest.clear()
+            rows = self.store.reader().execute(
+                "SELECT dict_id, content_type, level, dict_data FROM zstd_dicts ORDER BY version"
+            ).fetchall()
+            if zstandard is not None:
+                for dict_id, content_type, level, data in rows:
+                    self._dicts[dict_id] = zstandard.ZstdCompressionDict(data)
+                    self._latest[content_type] = (
+                        dict_id, zstandard.ZstdCompressor(level=level, dict_data=self._dicts[dict_id])
+                    )
+            elif rows:
+                print("zstd dictionaries present but 'zstandard' is not installed: writing plain text")
+            self._loaded = True
+
+    def reload(self):
+        self._loaded = False
+        self._local = threading.local()
+        self._load()
+
+    def has_dictionary(self, content_type: str) -> bool:
+        self._load()
+        return content_type in self._latest
+
+    def encode(self, text: str, content_type: str) -> Tuple[str, Optional[bytes], Optional[int]]:
+        """(chunk_text, chunk_text_z, text_dict_id) column values for one chunk"""
+        self._load()
+        latest = self._latest.get(content_type)
+        if latest is None:
+            return text, None, None
+        dict_id, compressor = latest
+        with self._compress_lock:
+            blob = compressor.compress(text.encode("utf-8"))
+        return "", blob, dict_id
+
+    def decode(self, blob: bytes, dict_id: int) -> str:
+        self._load()
+        # Decompressors are not thread safe: one per reading thread and dictionary
+        cache = getattr(self._local, "decompressors", None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            if zstandard is None:
+                raise ImportError("compressed chunk text requires the 'zstandard' package")
+            if dict_id not in self._dicts:
+                self.reload()
+            decompressor = cache[dict_id] = zstandard.ZstdDecompressor(dict_data=self._dicts[dict_id])
+        return decompressor.decompress(blob).decode("utf-8")
+
+    def train(self, content_type: str, samples: List[str] = None, dict_size: int = DICT_SIZE,
+              level: int = LEVEL) -> Optional[int]:
+        """Train and store a new dictionary version from a sample of the content type's chunks"""
+        if zstandard is None:
+            raise ImportError("training zstd dictionaries requires the 'zstandard' package")
+        if samples is None:
+            samples = self.store.sample_texts(self.MAX_SAMPLES, content_type)
+        if len(samples) < self.MIN_SAMPLES:
+            print(f"Not enough '{content_type}' chunks to train a dictionary ({len(samples)})")
+            return None
+        data = zstandard.train_dictionary(dict_size, [text.encode("utf-8") for text in samples], level=level)
+        raw = data.as_bytes()
+        with self.store.transaction() as conn:
+            version = conn.execute(
+                "SELECT COALESCE(MAX(version), 0) + 1 FROM zstd_dicts WHERE content_type = ?", (content_type,)
+            ).fetchone()[0]
+            cur = conn.execute(
+                "INSERT INTO zstd_dicts (content_type, version, level, sample_count, dict_hash, dict_data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_type, version, level, len(samples), hashlib.sha256(raw).hexdigest(), raw,
+                 datetime.now().isoformat())
+            )
+        self.reload()
+        print(f"Trained '{content_type}' dictionary v{version}: {len(raw) // 1024} KiB from {len(samples)} chunks")
+        return cur.lastrowid
+
+    def recompress(self, content_type: str, batch_size: int = 2000) -> Dict[str, int]:
+        """Rewrite the content type's chunks that are not on its newest dictionary"""
+        self._load()
+        latest = self._latest.get(content_type)
+        if latest is None:
+            return {"rows": 0}
+        dict_id = latest[0]
+        rows = raw_bytes = stored_bytes = 0
+        while True:
+            batch = self.store.reader().execute(
+                "SELECT chunk_id, chunk_text, chunk_text_z, text_dict_id FROM chunks "
+                "WHERE content_type = ? AND (text_dict_id IS NULL OR text_dict_id != ?) LIMIT ?",
+                (content_type, dict_id, batch_size)
+            ).fetchall()
+            if not batch:
+                break
+            updates = []
+            for chunk_id, text, blob, old_id in batch:
+                if blob is not None:
+                    text = self.decode(blob, old_id)
+                _, new_blob, _ = self.encode(text, content_type)
+                raw_bytes += len(text.encode("utf-8"))
+                stored_bytes += len(new_blob)
+                updates.append((new_blob, dict_id, chunk_id))
+            with self.store.transaction() as conn:
+                conn.executemany(
+                    "UPDATE chunks SET chunk_text = '', chunk_text_z = ?, text_dict_id = ? WHERE chunk_id = ?",
+                    updates
+                )
+            rows += len(updates)
+        self.prune()
+        if rows:
+            print(f"Recompressed {rows} '{content_type}' chunks: {raw_bytes // 1024} KiB -> "
+                  f"{stored_bytes // 1024} KiB ({raw_bytes / max(stored_bytes, 1):.1f}x)")
+        return {"rows": rows, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+    def prune(self):
+        """Drop old dictionary versions no chunk refers to any more"""
+        with self.store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM zstd_dicts WHERE dict_id NOT IN (SELECT DISTINCT text_dict_id FROM chunks "
+                "WHERE text_dict_id IS NOT NULL) AND version < (SELECT MAX(version) FROM zstd_dicts d "
+                "WHERE d.content_type = zstd_dicts.content_type)"
+            )
+
+def compact_text(db_path: str, content_types: List[str] = None, retrain: bool = False,
+                 vacuum: bool = False) -> Dict[str, Dict[str, int]]:
+    """Compress every chunk with its content type's dictionary, optionally VACUUM.
+
+    Content types without a dictionary (or all, with `retrain`) get a new
+    one trained first; otherwise only rows written since are rewritten.
+    """
+    from project.chunk_store import ChunkStore
+    report = {}
+    with ChunkStore(db_path) as store:
+        if content_types is None:
+            content_types = [row[0] for row in store.reader().execute("SELECT DISTINCT content_type FROM chunks")]
+        for content_type in content_types:
+            if retrain or not store.codec.has_dictionary(content_type):
+                store.codec.train(content_type)
+            if store.codec.has_dictionary(content_type):
+                report[content_type] = store.codec.recompress(content_type)
+        if vacuum:
+            # Frees the pages the plain text occupied; rewrites the whole file
+            with store._write_lock:
+                store._writer.execute("VACUUM")
+    return report
+
+if __name__ == "__main__":
+    # python -m project.text_codec [db] [--content-type csv] [--retrain] [--vacuum]
+    from project.chunk_store import SQLITE_DB
+    parser = argparse.ArgumentParser(description="Compress chunk text with per-content-type zstd dictionaries")
+    parser.add_argument("db", nargs="?", default=SQLITE_DB)
+    parser.add_argument("--content-type", action="append", dest="content_types")
+    parser.add_argument("--retrain", action="store_true", help="train new dictionary versions")
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+    compact_text(args.db, args.content_types, args.retrain, args.vacuum)
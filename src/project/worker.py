@@ -0,0 +1,153 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from typing import Any, Dict, Optional
+
+# Default lives in a per-user 0700 directory: anyone who can connect can run `clear` or `process`
+SOCKET_PATH = os.environ.get("RAG_WORKER_SOCKET") or os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/rag-worker-{os.getuid()}", "rag_worker.sock"
+)
+# Query-node memory budget for loaded collections; unset keeps everything loaded
+RESIDENCY_MB = float(os.environ.get("RAG_RESIDENCY_MB", 0))
+RESIDENCY_STATE = os.environ.get("RAG_RESIDENCY_STATE", "residency.json")
+# Comma-separated tenants to load at startup (default: the hottest from RESIDENCY_STATE)
+PREWARM_TENANTS = [t for t in os.environ.get("RAG_PREWARM_TENANTS", "").split(",") if t]
+
+class WorkerClient:
+    """Thin client used by the CLIs to hand work to a running warm worker"""
+
+    def __init__(self, socket_path: str = SOCKET_PATH, timeout: Optional[float] = 600):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            return self.call("ping") == "pong"
+        except OSError:
+            return False
+
+    def call(self, op: str, **args) -> Any:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps({"op": op, "args": args}) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                response = json.loads(reader.readline())
+        if not response.get("ok"):
+            raise RuntimeError(f"Worker error: {response.get('error')}")
+        return response.get("result")
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            result = self.server.worker.dispatch(request["op"], request.get("args", {}))
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response, default=str) + "\n").encode("utf-8"))
+
+class WarmWorker:
+    """Long-lived local process that keeps models and Milvus connections loaded"""
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        self.socket_path = socket_path
+        self._processor = None
+        self._engine = None
+        # Ingest shares one embedding model; run documents one at a time
+        self._process_lock = threading.Lock()
+
+    def warm_up(self):
+        from project.milvus import MilvusVectorStore
+        from project.query_engine import QueryEngine
+        MilvusVectorStore.get_client()
+        MilvusVectorStore.setup_schema()
+        if RESIDENCY_MB:
+            MilvusVectorStore.enable_residency(RESIDENCY_MB, PREWARM_TENANTS, RESIDENCY_STATE)
+        self._engine = QueryEngine()
+        print("Worker warm: embeddings and Milvus connection ready")
+
+    def _get_processor(self):
+        if self._processor is None:
+            from project.processor import DocumentProcessor
+            from project.pydantic_models import ProcessingConfig
+            self._processor = DocumentProcessor(ProcessingConfig())
+        return self._processor
+
+    def dispatch(self, op: str, args: Dict[str, Any]) -> Any:
+        from project.milvus import MilvusVectorStore
+        if op == "ping":
+            return "pong"
+        if op == "stats":
+            from project.deadline import Deadline
+            stats = {**MilvusVectorStore.get_stats(**args), "deadline_timeouts": Deadline.timeout_counts()}
+            if MilvusVectorStore._residency is not None:
+                stats["residency"] = MilvusVectorStore._residency.report()
+            return stats
+        if op == "search":
+            response = self._engine.search_response(args["query"], args.get("limit", 5), args.get("tenant"),
+                                                    args.get("expand_window", 0), args.get("top_documents", 0),
+                                                    args.get("deadline_ms"), args.get("multi_query", False),
+                                                    args.get("variants"), args.get("group_by"),
+                                                    args.get("group_size", 1))
+            if args.get("deadline_ms"):
+                return response.model_dump(mode="json")
+            return [result.model_dump(mode="json") for result in response.results]
+        if op == "process":
+            with self._process_lock:
+                document, chunks = self._get_processor().process_document(args["file_path"],
+                                                                          domain=args.get("domain"))
+            return {"doc_id": document.id, "title": document.title, "chunks": len(chunks)}
+        if op == "finalize":
+            MilvusVectorStore.finalize_ingest(**args)
+            return "finalized"
+        if op == "clear":
+            MilvusVectorStore.clear_all_data(tenant=args.get("tenant"), all_tenants=args.get("all_tenants", False))
+            return "cleared"
+        raise ValueError(f"Unknown op: {op}")
+
+    @staticmethod
+    def _private_dir(path: str):
+        """Create the socket's directory (0700) if missing; refuse one another user owns"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.stat(directory).st_uid != os.getuid():
+            raise PermissionError(f"Socket directory {directory} is owned by another user")
+
+    def serve_forever(self):
+        self.warm_up()
+        self._private_dir(self.socket_path)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # Owner-only from the moment it is bound, not after a chmod
+        umask = os.umask(0o177)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        server.daemon_threads = True
+        server.worker = self
+        print(f"Worker listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            from project.milvus import MilvusVectorStore
+            if MilvusVectorStore._residency is not None:
+                MilvusVectorStore._residency.save()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+if __name__ == "__main__":
+    try:
+        WarmWorker().serve_forever()
+    except KeyboardInterrupt:
+        print("\nWorker stopped")
@@ -0,0 +1,22 @@
+from project.chunk_archive import ChunkArchiveWriter, ChunkArchiveReader
+from project.pydantic_models import ChunkingMethod
+from project.records import ChunkRecord
+
+def records(doc_id, count):
+    return [ChunkRecord(f"{doc_id}_chunk_{i}", doc_id, f"chunk {i} of {doc_id}", i, ChunkingMethod.RECURSIVE)
+            for i in range(count)]
+
+def test_append_after_torn_tail(tmp_path):
+    path = tmp_path / "chunks.arc"
+    with ChunkArchiveWriter(path, block_size=2) as writer:
+        writer.extend(records("a", 4))
+    # An interrupted write: half a block header in the data, half an index line
+    with open(path, 'ab') as f:
+        f.write(b"\x10\x00")
+    with open(f"{path}.idx", 'a', encoding='utf-8') as f:
+        f.write('{"offset": 9')
+    with ChunkArchiveWriter(path, block_size=2) as writer:
+        writer.extend(records("b", 2))
+    reader = ChunkArchiveReader(path)
+    assert [chunk.id for chunk in reader] == [f"a_chunk_{i}" for i in range(4)] + ["b_chunk_0", "b_chunk_1"]
+    assert reader.get("b_chunk_1").content == "chunk 1 of b"
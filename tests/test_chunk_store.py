@@ -0,0 +1,43 @@
+import os
+import pytest
+from project.chunk_store import ChunkStore
+from project.pydantic_models import Document, FileType
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(tmp_path / "chunks.db")
+    yield store
+    store.close()
+
+def add_document(store, doc_id, source_path):
+    document = Document(id=doc_id, title=doc_id, content="x" * 50, file_type=FileType.TXT)
+    store.upsert_document(document, source_path)
+
+def test_documents_for_path_matches_literal_prefix(store):
+    base = os.path.join(os.sep, "data", "my_docs")
+    add_document(store, "inside", os.path.join(base, "a.txt"))
+    add_document(store, "wildcard", os.path.join(os.sep, "data", "myXdocs", "b.txt"))
+    add_document(store, "case", os.path.join(os.sep, "data", "MY_DOCS", "c.txt"))
+    add_document(store, "sibling", base + "_old" + os.sep + "d.txt")
+    docs = store.documents_for_path(base, include_children=True)
+    assert [doc["doc_id"] for doc in docs] == ["inside"]
+
+def add_dictionary(store, content_type, version, data):
+    with store.transaction() as conn:
+        conn.execute(
+            "INSERT INTO zstd_dicts (content_type, version, level, sample_count, dict_hash, dict_data) "
+            "VALUES (?, ?, 9, 100, ?, ?)", (content_type, version, data.hex(), data)
+        )
+
+def test_merge_keeps_main_newest_dictionary(store, tmp_path):
+    add_dictionary(store, "text", 1, b"main-v1")
+    add_dictionary(store, "text", 2, b"main-v2")
+    worker = ChunkStore(tmp_path / "worker.db")
+    add_dictionary(worker, "text", 1, b"worker-v1")
+    worker.close()
+    store.merge_from(tmp_path / "worker.db")
+    rows = store.reader().execute(
+        "SELECT version, dict_data FROM zstd_dicts WHERE content_type = 'text' ORDER BY version DESC"
+    ).fetchall()
+    assert rows[0] == (2, b"main-v2")
+    assert b"worker-v1" in [data for _, data in rows]
@@ -0,0 +1,15 @@
+from project.chunk_tuner import ChunkTuner
+
+def result(chunks, recall, truncated=0, **overrides):
+    return {"file_type": "txt", **overrides, "chunks": chunks, "queries": 3, "recall_at_k": recall,
+            "mrr": recall, "embed_seconds": 0.1, "index_mb": 0.1, "truncated_chunks": truncated}
+
+def test_recommend_skips_candidates_the_embedder_truncates():
+    tuner = ChunkTuner.__new__(ChunkTuner)
+    tuner.tolerance = 0.02
+    results = [
+        result(10, 1.0, truncated=4, chunk_size=2048),
+        result(40, 1.0, chunk_size=512),
+        result(80, 1.0, chunk_size=256),
+    ]
+    assert tuner.recommend(results)["chunk_size"] == 512
@@ -0,0 +1,14 @@
+import json
+from project.chunker import ChunkingService
+from project.pydantic_models import ChunkingMethod, Document, FileType, ProcessingConfig
+
+def test_json_chunking_splits_the_parsed_document(capsys):
+    data = {"items": [{"name": f"item {i}", "description": "d" * 40} for i in range(10)]}
+    document = Document(id="doc", title="doc", content=json.dumps(data), file_type=FileType.JSON)
+    config = ProcessingConfig(chunking_method=ChunkingMethod.JSON, chunk_size=200, chunk_overlap=0)
+    chunks = ChunkingService._json_chunking(document, config)
+    assert "fallback" not in capsys.readouterr().out
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.content) <= 200
+        json.loads(chunk.content)
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+import pytest
+from project.chunk_store import ChunkStore
+from project.context_expander import ContextExpander
+from project.pydantic_models import ChunkingMethod
+from project.records import ChunkRecord, SearchHit, chunk_dicts
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(tmp_path / "chunks.db")
+    chunks = [ChunkRecord(f"a_chunk_{i}", "a", f"chunk number {i} of document a", i, ChunkingMethod.RECURSIVE)
+              for i in range(10)]
+    store.insert_chunks(chunk_dicts(SimpleNamespace(id="a", domain="general", file_type="txt"), chunks))
+    yield store
+    store.close()
+
+def hit(index, rank):
+    chunk = ChunkRecord(f"a_chunk_{index}", "a", "", index, ChunkingMethod.RECURSIVE)
+    return SearchHit(chunk=chunk, similarity_score=1.0 / rank, distance=0.0, rank=rank)
+
+def test_touching_windows_merge_onto_the_best_hit(store):
+    hits = ContextExpander(store).expand([hit(5, 1), hit(2, 2), hit(9, 3)], window=1)
+    # 1-3 and 4-6 touch, so hit 1 carries 1..6; 8-10 runs past the end
+    assert [chunk.chunk_index for chunk in hits[0].context] == [1, 2, 3, 4, 5, 6]
+    assert hits[1].context is None and hits[1].context_of == 1
+    assert [chunk.chunk_index for chunk in hits[2].context] == [8, 9]
+
+def test_windows_are_served_from_the_cache(store):
+    expander = ContextExpander(store)
+    expander.expand([hit(3, 1)], window=1)
+    expander.expand([hit(3, 1)], window=1)
+    assert (expander.hits, expander.misses) == (1, 1)
@@ -0,0 +1,18 @@
+import threading
+import pytest
+from project.deadline import Deadline, DeadlineExceeded, POOL_SIZE
+
+def test_saturated_pool_rejects_instead_of_queueing():
+    release = threading.Event()
+    for _ in range(POOL_SIZE):
+        with pytest.raises(DeadlineExceeded):
+            Deadline(20).run("embed", release.wait)
+    # Every thread still runs an abandoned call: the next one is rejected at once
+    deadline = Deadline(5000)
+    with pytest.raises(DeadlineExceeded):
+        deadline.run("embed", lambda: "too late")
+    assert deadline.elapsed_ms() < 1000 and deadline.missed == ["embed"]
+    release.set()
+    Deadline._pool.shutdown(wait=True)
+    Deadline._pool = None
+    assert Deadline(5000).run("embed", lambda: "ok") == "ok"
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+import pytest
+from project.chunk_store import ChunkStore
+from project.dedup import ChunkDeduplicator
+from project.pydantic_models import ChunkingMethod
+from project.records import ChunkRecord, chunk_dicts
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog near the river bank.",
+    "Milvus stores the vectors while SQLite keeps the chunk text and metadata.",
+    "Chunks are deduplicated by hash and MinHash before they are embedded.",
+]
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(tmp_path / "chunks.db")
+    yield store
+    store.close()
+
+def records(doc_id, texts):
+    return [ChunkRecord(f"{doc_id}_chunk_{i}", doc_id, text, i, ChunkingMethod.RECURSIVE)
+            for i, text in enumerate(texts)]
+
+def stored(store, doc_id, chunks):
+    """What a successful ingest writes to SQLite"""
+    document = SimpleNamespace(id=doc_id, domain="general", file_type="txt")
+    store.insert_chunks(chunk_dicts(document, chunks))
+
+def test_nothing_recorded_until_stored(store):
+    dedup = ChunkDeduplicator(store)
+    kept, report = dedup.deduplicate(records("a", TEXTS))
+    assert len(kept) == 3
+    # Embed/store failed: the retry must not match the first attempt
+    kept, report = dedup.deduplicate(records("a", TEXTS))
+    assert len(kept) == 3 and report.exact_duplicates == 0
+    dedup.record(report)
+    kept, report = dedup.deduplicate(records("b", TEXTS))
+    assert kept == [] and report.exact_duplicates == 3
+
+def test_replaced_document_is_not_a_canonical(store):
+    dedup = ChunkDeduplicator(store)
+    kept, report = dedup.deduplicate(records("v1", TEXTS))
+    dedup.record(report)
+    kept, report = dedup.deduplicate(records("v2", TEXTS[:2] + ["An edited last paragraph of the file."]),
+                                     replacing=["v1"])
+    assert len(kept) == 3 and report.exact_duplicates == 0
+
+def test_rerun_of_same_document_keeps_its_chunks(store):
+    dedup = ChunkDeduplicator(store)
+    kept, report = dedup.deduplicate(records("a", TEXTS))
+    dedup.record(report)
+    # Same file again: same doc_id and chunk_ids, which must be stored (upserted) again
+    kept, report = dedup.deduplicate(records("a", TEXTS))
+    assert len(kept) == 3
+    dedup.record(report)
+    assert store.reader().execute("SELECT COUNT(*) FROM minhash_bands").fetchone()[0] == 3 * 16
+
+def test_delete_promotes_surviving_duplicate(store):
+    dedup = ChunkDeduplicator(store)
+    kept, report = dedup.deduplicate(records("a", TEXTS))
+    stored(store, "a", kept)
+    dedup.record(report)
+    kept, report = dedup.deduplicate(records("b", ["Only in b, long enough to be a chunk.", TEXTS[1]]))
+    assert [chunk.id for chunk in kept] == ["b_chunk_0"]
+    stored(store, "b", kept)
+    dedup.record(report)
+
+    deleted, promoted = store.delete_documents(["a"])
+    assert sorted(deleted) == ["a_chunk_0", "a_chunk_1", "a_chunk_2"]
+    assert [(row["chunk_id"], row["doc_id"], row["chunk_index"], row["chunk_text"]) for row in promoted] == [
+        ("b_chunk_1", "b", 1, TEXTS[1])
+    ]
+    conn = store.reader()
+    assert conn.execute("SELECT COUNT(*) FROM chunk_duplicates").fetchone()[0] == 0
+    assert conn.execute("SELECT doc_id FROM chunk_fingerprints WHERE chunk_id = 'b_chunk_1'").fetchone() == ("b",)
+    # The promoted chunk is now the canonical for later ingests
+    kept, report = dedup.deduplicate(records("c", [TEXTS[1]]))
+    assert kept == [] and report.pending[2][0][3] == "b_chunk_1"
+
+def test_delete_repoints_to_another_copy(store):
+    dedup = ChunkDeduplicator(store)
+    for doc_id, replacing in (("a", ()), ("b", ["a"])):
+        kept, report = dedup.deduplicate(records(doc_id, TEXTS), replacing)
+        stored(store, doc_id, kept)
+        dedup.record(report)
+    kept, report = dedup.deduplicate(records("c", TEXTS[:1]))
+    assert report.pending[2][0][3] == "a_chunk_0"
+    dedup.record(report)
+    deleted, promoted = store.delete_documents(["a"])
+    assert promoted == []
+    assert store.reader().execute(
+        "SELECT canonical_chunk_id FROM chunk_duplicates WHERE chunk_id = 'c_chunk_0'"
+    ).fetchone() == ("b_chunk_0",)
+
+def test_clear_then_reingest_stores_chunks_again(store, monkeypatch):
+    from project.doc_index import DocumentIndex
+    from project.milvus import MilvusVectorStore
+    monkeypatch.setattr("pymilvus.MilvusClient", lambda uri: None)
+    monkeypatch.setattr("project.schema_setup.drop_collection", lambda client, name: None)
+    monkeypatch.setattr("project.schema_setup.collection_versions", lambda client, name: [])
+    monkeypatch.setattr(MilvusVectorStore, "_connected", True)
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", False)
+    monkeypatch.setattr(MilvusVectorStore, "_hydrator", SimpleNamespace(store=store))
+    monkeypatch.setattr(MilvusVectorStore, "create_collection", classmethod(lambda cls, name: None))
+    monkeypatch.setattr(DocumentIndex, "clear", classmethod(lambda cls, tenant=None: None))
+    dedup = ChunkDeduplicator(store)
+    for doc_id in ("a", "b"):
+        kept, report = dedup.deduplicate(records(doc_id, TEXTS))
+        stored(store, doc_id, kept)
+        dedup.record(report)
+
+    MilvusVectorStore.clear_all_data()
+    # "b" first this time: its canonicals in "a" are gone from Milvus
+    kept, report = dedup.deduplicate(records("b", TEXTS))
+    assert len(kept) == 3 and report.exact_duplicates == 0
+    conn = store.reader()
+    for table in ("chunk_fingerprints", "minhash_bands", "chunk_duplicates", "dedup_stats"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
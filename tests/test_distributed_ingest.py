@@ -0,0 +1,40 @@
+from project.distributed_ingest import WorkQueue
+from project.ingest_budget import is_transient
+
+def test_retry_returns_the_file_until_attempts_run_out(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.enqueue(["a.txt"])
+    assert queue.lease("w1") == "a.txt"
+    queue.retry("a.txt", "w1", "transient failure")
+    assert queue.progress() == {"pending": 1}
+    assert queue.lease("w1") == "a.txt"
+    queue.retry("a.txt", "w1", "transient failure")
+    assert queue.progress() == {"failed": 1}
+    queue.close()
+
+def test_only_service_failures_are_transient():
+    assert is_transient(RuntimeError("collection not loaded"), "store")
+    assert is_transient(ConnectionError("refused"), "embed")
+    assert not is_transient(ValueError("bad csv"), "chunk")
+
+def test_reconcile_only_touches_attempted_documents(tmp_path, monkeypatch):
+    from project.chunk_store import ChunkStore
+    from project.distributed_ingest import IngestCoordinator
+    from project.milvus import MilvusVectorStore
+    from project.pydantic_models import Document, FileType
+    deleted = []
+    monkeypatch.setattr(MilvusVectorStore, "connect", classmethod(lambda cls: None))
+    monkeypatch.setattr(MilvusVectorStore, "delete_documents",
+                        classmethod(lambda cls, doc_ids, class_name="rag_chunks": deleted.extend(doc_ids)))
+    worker_dir = tmp_path / "outputs" / "w1"
+    worker_dir.mkdir(parents=True)
+    with ChunkStore(worker_dir / "rag_chunks.db") as worker:
+        for doc_id in ("done", "crashed"):
+            worker.record_attempt(doc_id, f"/data/{doc_id}.txt")
+        worker.upsert_document(Document(id="done", title="done", content="x" * 50, file_type=FileType.TXT),
+                               "/data/done.txt")
+    coordinator = IngestCoordinator(str(tmp_path / "outputs"), db_path=str(tmp_path / "main.db"),
+                                    ndjson_path=str(tmp_path / "main.ndjson"))
+    coordinator.merge()
+    # A document ingested by the CLI has no documents row and no attempt: not an orphan
+    assert coordinator.reconcile_milvus() == 1 and deleted == ["crashed"]
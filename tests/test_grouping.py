@@ -0,0 +1,78 @@
+import pytest
+from pymilvus import DataType, MilvusException
+from pymilvus.client.search_result import Hit
+from project.milvus import MilvusVectorStore
+
+class Field:
+    def __init__(self, name, dtype):
+        self.name, self.dtype = name, dtype
+
+class FakeCollection:
+    """Search stand-in: doc_id groups of three chunks, scored in chunk order"""
+
+    def __init__(self, fields, reject_grouping=False):
+        self.schema = type("Schema", (), {"fields": [Field(name, dtype) for name, dtype in fields]})()
+        self.reject_grouping = reject_grouping
+        self.calls = []
+
+    def search(self, data, limit, offset=0, output_fields=None, **kwargs):
+        self.calls.append({"limit": limit, "offset": offset, "output_fields": output_fields, **kwargs})
+        if "group_by_field" in kwargs and self.reject_grouping:
+            raise MilvusException(message="not supported")
+        hits = [Hit({"chunk_id": f"c{n}", "distance": 1.0 - n / 100, "entity": {"doc_id": f"d{n // 3}"}},
+                    pk_name="chunk_id") for n in range(offset, offset + limit)]
+        return [hits for _ in data]
+
+class FakeHydrator:
+    def __init__(self):
+        self.fetched = []
+
+    def fetch(self, chunk_ids, cached_only=False):
+        self.fetched.extend(chunk_ids)
+        return {chunk_id: {"doc_id": f"d{int(chunk_id[1:]) // 3}", "chunk_index": 0, "chunk_method": "recursive",
+                           "content_type": "txt", "chunk_tokens": 1, "domain": "general", "embedding_model": "m",
+                           "chunk_text": chunk_id} for chunk_id in chunk_ids}
+
+SLIM_FIELDS = [("chunk_id", DataType.VARCHAR), ("doc_id", DataType.VARCHAR),
+               ("embedding_vector", DataType.FLOAT_VECTOR)]
+LANGCHAIN_FIELDS = [("pk", DataType.VARCHAR), ("chunk_text", DataType.VARCHAR),
+                    ("embedding_vector", DataType.FLOAT_VECTOR)]
+
+@pytest.fixture
+def milvus(monkeypatch):
+    collections = {}
+    hydrator = FakeHydrator()
+    monkeypatch.setattr(MilvusVectorStore, "_connected", True)
+    monkeypatch.setattr(MilvusVectorStore, "_slim", True)
+    monkeypatch.setattr(MilvusVectorStore, "_residency", None)
+    monkeypatch.setattr(MilvusVectorStore, "_hydrator", hydrator)
+    monkeypatch.setattr(MilvusVectorStore, "_grouping_fields", {})
+    monkeypatch.setattr(MilvusVectorStore, "_collection", classmethod(lambda cls, name="rag_chunks": collections[name]))
+    monkeypatch.setattr(MilvusVectorStore, "_embed_queries", classmethod(lambda cls, texts, deadline=None: [[0.0]]))
+    return collections, hydrator
+
+def test_grouping_is_decided_per_collection(milvus):
+    collections, _ = milvus
+    collections["dynamic"] = FakeCollection(LANGCHAIN_FIELDS)
+    collections["slim"] = FakeCollection(SLIM_FIELDS)
+    assert not MilvusVectorStore._can_group("dynamic", "doc_id")
+    assert MilvusVectorStore._can_group("slim", "doc_id")
+    MilvusVectorStore.search_hits("q", limit=2, class_name="slim", group_by="doc_id")
+    assert "group_by_field" in collections["slim"].calls[-1]
+
+def test_rejection_only_disables_that_collection(milvus):
+    collections, _ = milvus
+    collections["old"] = FakeCollection(SLIM_FIELDS, reject_grouping=True)
+    collections["new"] = FakeCollection(SLIM_FIELDS)
+    hits = MilvusVectorStore.search_hits("q", limit=2, class_name="old", group_by="doc_id")
+    assert [hit.chunk.doc_id for hit in hits] == ["d0", "d1"]
+    assert not MilvusVectorStore._can_group("old", "doc_id")
+    assert MilvusVectorStore._can_group("new", "doc_id")
+
+def test_overfetch_pages_group_field_and_hydrates_kept_hits(milvus):
+    collections, hydrator = milvus
+    collections["dynamic"] = FakeCollection([("pk", DataType.VARCHAR), ("embedding_vector", DataType.FLOAT_VECTOR)])
+    hits = MilvusVectorStore.search_hits("q", limit=3, class_name="dynamic", group_by="doc_id")
+    assert [hit.chunk.id for hit in hits] == ["c0", "c3", "c6"]
+    assert all(call["output_fields"] == ["doc_id"] for call in collections["dynamic"].calls)
+    assert hydrator.fetched == ["c0", "c3", "c6"]
@@ -0,0 +1,17 @@
+from types import SimpleNamespace
+from project.chunk_store import ChunkStore
+from project.id_filter import ChunkIdIndex
+from project.pydantic_models import ChunkingMethod
+from project.records import ChunkRecord, chunk_dicts
+
+def test_resize_rebuilds_from_sqlite(tmp_path):
+    store = ChunkStore(tmp_path / "chunks.db")
+    chunks = [ChunkRecord(f"a_chunk_{i}", "a", f"stored chunk {i}", i, ChunkingMethod.RECURSIVE) for i in range(5)]
+    store.insert_chunks(chunk_dicts(SimpleNamespace(id="a", domain="general", file_type="txt"), chunks))
+    index = ChunkIdIndex(store, min_capacity=10)
+    index.add(f"b_chunk_{i}" for i in range(20))
+    assert index._filter.capacity >= 20
+    assert index.maybe_present([chunk.id for chunk in chunks]) == [chunk.id for chunk in chunks]
+    # Only the bit array is kept: the filter holds what SQLite has, not every id ever added
+    assert index._filter.count == 5
+    store.close()
@@ -0,0 +1,25 @@
+import json
+from project.doc_index import DocumentIndex
+from project.milvus import MilvusVectorStore
+
+class FakeCollection:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, expr):
+        self.deleted.append(expr)
+
+def test_delete_quotes_doc_ids(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(MilvusVectorStore, "_connected", True)
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", False)
+    monkeypatch.setattr(MilvusVectorStore, "_residency", None)
+    monkeypatch.setattr(MilvusVectorStore, "_hydrator", None)
+    monkeypatch.setattr("pymilvus.utility.has_collection", lambda name: True)
+    monkeypatch.setattr(MilvusVectorStore, "_collection", classmethod(lambda cls, name="rag_chunks": collection))
+    monkeypatch.setattr(DocumentIndex, "delete_documents", classmethod(lambda cls, doc_ids, tenant=None: None))
+    doc_ids = ['plain', 'has "quotes"', 'back\\slash']
+    MilvusVectorStore.delete_documents(doc_ids)
+    expr = collection.deleted[0]
+    assert expr.startswith("doc_id in [")
+    assert json.loads(expr[len("doc_id in "):]) == doc_ids
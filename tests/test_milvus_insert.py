@@ -0,0 +1,147 @@
+from types import SimpleNamespace
+import pytest
+from project.chunker import ChunkingService
+from project.doc_reader import DocumentLoader
+from project.milvus import MilvusVectorStore
+from project.pydantic_models import ChunkingMethod, FileType, ProcessingConfig
+from project.records import ChunkRecord, chunk_dicts
+
+class FakeCollection:
+    def __init__(self, store):
+        self.store = store
+
+    def query(self, expr, output_fields, **kwargs):
+        return [{"pk": chunk_id} for chunk_id in self.store.rows if f'"{chunk_id}"' in expr]
+
+class FakeLangChainStore:
+    """LangChain Milvus contract: `col` is None until the first add creates the collection"""
+    _primary_field = "pk"
+
+    def __init__(self):
+        self.col = None
+        self.rows = {}
+        self.added = 0  # rows added, duplicates included (Milvus does not dedup on insert)
+
+    def add_documents(self, documents, ids=None):
+        self.col = FakeCollection(self)
+        self.rows.update(zip(ids, documents))
+        self.added += len(ids)
+        return ids
+
+    def upsert(self, ids=None, documents=None):
+        assert self.col is not None, "upsert on a collection that does not exist"
+        self.added += len(set(ids) - set(self.rows))
+        self.rows.update(zip(ids, documents))
+
+class SeenIds:
+    """Exact stand-in for the Bloom filter: every id added may be present"""
+
+    def __init__(self):
+        self.ids = set()
+
+    def maybe_present(self, chunk_ids):
+        return [chunk_id for chunk_id in chunk_ids if chunk_id in self.ids]
+
+    def add(self, chunk_ids):
+        self.ids.update(chunk_ids)
+
+class NoIds:
+    def maybe_present(self, chunk_ids):
+        return []
+
+    def add(self, chunk_ids):
+        pass
+
+@pytest.fixture
+def vectorstore(monkeypatch):
+    store = FakeLangChainStore()
+    monkeypatch.setattr(MilvusVectorStore, "_slim", False)
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", False)
+    monkeypatch.setattr(MilvusVectorStore, "_vectorstores", {"rag_chunks": store})
+    monkeypatch.setattr(MilvusVectorStore, "_id_index", NoIds())
+    return store
+
+def records(count, offset=0):
+    return [ChunkRecord(f"d1_chunk_{i}", "d1", f"text of chunk number {i}", i, ChunkingMethod.RECURSIVE)
+            for i in range(offset, offset + count)]
+
+DOCUMENT = SimpleNamespace(id="d1", domain="general", file_type=FileType.TXT)
+
+def test_insert_into_empty_collection(vectorstore):
+    # More than one batch: the first creates the collection, the rest upsert
+    failed = MilvusVectorStore.insert_chunks(chunk_dicts(DOCUMENT, records(120)))
+    assert failed == [] and len(vectorstore.rows) == 120
+
+def test_store_chunks_into_empty_collection(vectorstore):
+    MilvusVectorStore.store_chunks(records(3), DOCUMENT)
+    MilvusVectorStore.store_chunks(records(2, offset=3), DOCUMENT)
+    assert sorted(vectorstore.rows) == [f"d1_chunk_{i}" for i in range(5)]
+
+def test_reprocessing_a_file_adds_no_rows(vectorstore, monkeypatch, tmp_path):
+    monkeypatch.setattr(MilvusVectorStore, "_id_index", SeenIds())
+    path = tmp_path / "notes.txt"
+    path.write_text("\n\n".join(f"Paragraph {i} about something worth retrieving later." for i in range(40)))
+    config = ProcessingConfig(chunk_size=200, chunk_overlap=0, deduplicate=False)
+    for _ in range(2):  # a retry or a re-run loads the file again
+        document = DocumentLoader.load_document(str(path))
+        chunks = ChunkingService.chunk_records(document, config)
+        assert MilvusVectorStore.insert_chunks(chunk_dicts(document, chunks)) == []
+    assert vectorstore.added == len(vectorstore.rows) == len(chunks)
+
+class FakeSlimCollection:
+    def __init__(self, dim=4, fail=False):
+        field = SimpleNamespace(name="embedding_vector", params={"dim": dim})
+        self.schema = SimpleNamespace(fields=[field])
+        self.fail = fail
+        self.entities = []
+
+    def upsert(self, entities):
+        if self.fail:
+            raise ConnectionError("milvus went away")
+        self.entities.extend(entities)
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[0.5] * 4 for _ in texts]
+
+@pytest.fixture
+def slim(monkeypatch, tmp_path):
+    from project.chunk_store import ChunkHydrator, ChunkStore
+    store = ChunkStore(tmp_path / "chunks.db")
+    embeddings = CountingEmbeddings()
+    monkeypatch.setattr(MilvusVectorStore, "_slim", True)
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", False)
+    monkeypatch.setattr(MilvusVectorStore, "_residency", None)
+    monkeypatch.setattr(MilvusVectorStore, "_id_index", NoIds())
+    monkeypatch.setattr(MilvusVectorStore, "_hydrator", ChunkHydrator(store))
+    monkeypatch.setattr(MilvusVectorStore, "load_embeddings", classmethod(lambda cls: embeddings))
+    yield store, embeddings
+    store.close()
+
+def embedded(chunks, dim=4):
+    for chunk in chunks:
+        chunk.embedding = [0.25] * dim
+    return chunks
+
+def test_slim_insert_reuses_chunk_vectors(slim, monkeypatch):
+    store, embeddings = slim
+    collection = FakeSlimCollection()
+    monkeypatch.setattr(MilvusVectorStore, "_collection", classmethod(lambda cls, name="rag_chunks": collection))
+    rows = chunk_dicts(DOCUMENT, embedded(records(3)) + records(1, offset=3))
+    assert MilvusVectorStore.insert_chunks(rows) == []
+    # Only the chunk without a vector is embedded again
+    assert embeddings.texts == ["text of chunk number 3"]
+    assert [entity["embedding_vector"] for entity in collection.entities[:3]] == [[0.25] * 4] * 3
+    assert store.count_chunks() == 4
+
+def test_slim_failed_batch_leaves_no_sqlite_text(slim, monkeypatch):
+    store, _ = slim
+    collection = FakeSlimCollection(fail=True)
+    monkeypatch.setattr(MilvusVectorStore, "_collection", classmethod(lambda cls, name="rag_chunks": collection))
+    failed = MilvusVectorStore.insert_chunks(chunk_dicts(DOCUMENT, embedded(records(3))))
+    assert sorted(failed) == [f"d1_chunk_{i}" for i in range(3)]
+    assert store.count_chunks() == 0
@@ -0,0 +1,47 @@
+from pymilvus import CollectionSchema, DataType, FieldSchema
+from project.milvus import MilvusVectorStore
+from project.rebuild import CollectionRebuilder
+from project.schema_setup import VERSION_PATTERN, create_slim_schema
+
+ROW = {
+    "chunk_id": "d1_chunk_0", "doc_id": "d1", "chunk_index": 0, "chunk_text": "Some chunk text",
+    "chunk_tokens": 3, "chunk_method": "recursive", "domain": "legal", "content_type": "txt",
+}
+
+class FakeClient:
+    def __init__(self, names):
+        self.names = set(names)
+
+    def has_collection(self, name):
+        return name in self.names
+
+def langchain_schema():
+    return CollectionSchema([
+        FieldSchema("chunk_text", DataType.VARCHAR, max_length=65535),
+        FieldSchema("pk", DataType.VARCHAR, is_primary=True, max_length=65535),
+        FieldSchema("embedding_vector", DataType.FLOAT_VECTOR, dim=2),
+    ], enable_dynamic_field=True)
+
+def test_entity_fits_langchain_schema():
+    entity = CollectionRebuilder()._entity(ROW, langchain_schema(), [0.1, 0.2])
+    assert entity["pk"] == "d1_chunk_0" and entity["chunk_text"] == "Some chunk text"
+    assert entity["embedding_vector"] == [0.1, 0.2]
+    assert (entity["doc_id"], entity["chunking_method"], entity["file_type"]) == ("d1", "recursive", "txt")
+
+def test_entity_fits_slim_schema():
+    entity = CollectionRebuilder()._entity(ROW, create_slim_schema(2), [0.1, 0.2])
+    assert set(entity) == {"chunk_id", "doc_id", "chunk_index", "domain", "content_type",
+                           "embedding_model", "embedding_vector"}
+
+def test_same_second_rebuilds_get_distinct_targets(monkeypatch):
+    monkeypatch.setattr("project.rebuild.time.time", lambda: 1700000000.5)
+    first, second = CollectionRebuilder(), CollectionRebuilder()
+    first.client = second.client = FakeClient({"rag_chunks_v1700000000"})
+    assert first._next_target() == "rag_chunks_v1700000001"
+    assert second._next_target() == "rag_chunks_v1700000002"
+
+def test_tenant_names_never_look_like_versions(monkeypatch):
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", True)
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_slugs", {})
+    name = MilvusVectorStore.collection_for("Reports_v2")
+    assert name == "rag_chunks__reports_v2_" and not VERSION_PATTERN.match(name)
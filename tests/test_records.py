@@ -0,0 +1,15 @@
+from project.pydantic_models import ChunkingMethod
+from project.records import ChunkRecord, SearchHit, to_results
+
+def hit(index, rank, score=0.9, context_of=None):
+    chunk = ChunkRecord(f"a_chunk_{index}", "a", f"text of search result chunk {index}", index, ChunkingMethod.RECURSIVE)
+    return SearchHit(chunk=chunk, similarity_score=score, distance=0.1, rank=rank, context_of=context_of)
+
+def test_skipped_hit_renumbers_ranks_and_context_links():
+    hits = [hit(0, 1), hit(5, 2, score="not a number"), hit(1, 3, context_of=1), hit(6, 4, context_of=2)]
+    results = to_results(hits)
+    assert [(result.chunk.id, result.rank) for result in results] == [
+        ("a_chunk_0", 1), ("a_chunk_1", 2), ("a_chunk_6", 3)
+    ]
+    # Still points at its owner; the link to the skipped hit is dropped
+    assert [result.context_of for result in results] == [None, 1, None]
@@ -0,0 +1,69 @@
+import pytest
+from project.milvus import MilvusVectorStore
+from project.residency import ResidencyManager
+
+class FakeCollection:
+    """pymilvus.Collection stand-in tracking which collections the query nodes hold"""
+    loaded = set()
+
+    def __init__(self, name):
+        self.name = name
+
+    def load(self, **kwargs):
+        FakeCollection.loaded.add(self.name)
+
+    def release(self):
+        FakeCollection.loaded.discard(self.name)
+
+@pytest.fixture
+def residency(monkeypatch):
+    FakeCollection.loaded = set()
+    monkeypatch.setattr("pymilvus.Collection", FakeCollection)
+    monkeypatch.setattr("pymilvus.utility.wait_for_loading_complete", lambda name, timeout=None: None)
+    monkeypatch.setattr(ResidencyManager, "resident_mb", classmethod(lambda cls, name: 60.0))
+    manager = ResidencyManager(100, on_release=MilvusVectorStore.forget)
+    monkeypatch.setattr(MilvusVectorStore, "_residency", manager)
+    monkeypatch.setattr(MilvusVectorStore, "_connected", True)
+    monkeypatch.setattr(MilvusVectorStore, "_slim", False)
+    monkeypatch.setattr(MilvusVectorStore, "_collections", {})
+    monkeypatch.setattr(MilvusVectorStore, "_vectorstores", {})
+    return manager
+
+def test_cached_handle_is_reloaded_after_eviction(residency):
+    MilvusVectorStore._collection("a")
+    MilvusVectorStore._collection("b")  # over budget: "a" is released
+    assert FakeCollection.loaded == {"b"}
+    assert "a" not in MilvusVectorStore._collections
+    MilvusVectorStore._collection("a")
+    assert "a" in FakeCollection.loaded
+
+def test_pinned_collection_is_not_evicted(residency):
+    with MilvusVectorStore._in_use("a"):
+        MilvusVectorStore._collection("b")
+        # A search on "a" is still running: it stays loaded, over budget for now
+        assert FakeCollection.loaded == {"a", "b"}
+    assert FakeCollection.loaded == {"b"}
+
+def test_cached_handle_is_touched_on_every_use(residency):
+    residency.budget_mb = 150  # two collections fit
+    MilvusVectorStore._collection("a")
+    MilvusVectorStore._collection("b")
+    # The cached handle counts as a use: "b" is now least recently used
+    MilvusVectorStore._collection("a")
+    MilvusVectorStore._collection("c")
+    assert FakeCollection.loaded == {"a", "c"}
+
+def test_reloaded_tenant_counts_against_the_budget(residency, monkeypatch):
+    monkeypatch.setattr(MilvusVectorStore, "_tenant_routing", False)
+    MilvusVectorStore._collection("a")
+    MilvusVectorStore.reload_tenant(None, class_name="b")
+    assert FakeCollection.loaded == {"b"}
+    assert "b" in residency._resident and "a" not in residency._resident
+
+def test_document_collections_go_through_residency(residency, monkeypatch):
+    from project.doc_index import DocumentIndex
+    monkeypatch.setattr("pymilvus.utility.has_collection", lambda name: True)
+    MilvusVectorStore._collection("a")
+    DocumentIndex._collection("rag_docs")
+    assert FakeCollection.loaded == {"rag_docs"}
+    assert "rag_docs" in residency._resident
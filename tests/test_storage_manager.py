@@ -0,0 +1,56 @@
+import json
+from project.milvus import MilvusVectorStore
+from project.storage_manager import StorageManager
+
+class FakeClient:
+    """An alias rag_chunks -> rag_chunks_v2, with rag_chunks_v1 kept for rollback"""
+
+    def __init__(self, uri=None):
+        self.aliases = {"rag_chunks": "rag_chunks_v2"}
+        self.collections = {"rag_chunks_v1", "rag_chunks_v2", "other"}
+
+    def describe_alias(self, name):
+        return {"collection_name": self.aliases[name]}
+
+    def has_collection(self, name):
+        return name in self.collections
+
+    def list_collections(self):
+        return sorted(self.collections)
+
+    def drop_alias(self, name):
+        del self.aliases[name]
+
+    def drop_collection(self, name):
+        self.collections.remove(name)
+
+class FakeCollection:
+    created = []
+
+    def __init__(self, name, schema=None):
+        FakeCollection.created.append((name, schema))
+
+    def create_index(self, field_name, params):
+        pass
+
+    def flush(self):
+        pass
+
+def test_restore_over_an_alias_drops_every_version(tmp_path, monkeypatch):
+    client = FakeClient()
+    loaded = []
+    monkeypatch.setattr("pymilvus.MilvusClient", lambda uri: client)
+    monkeypatch.setattr("pymilvus.Collection", FakeCollection)
+    monkeypatch.setattr("pymilvus.CollectionSchema.construct_from_dict", staticmethod(lambda schema: "schema"))
+    monkeypatch.setattr(MilvusVectorStore, "_connected", True)
+    monkeypatch.setattr(MilvusVectorStore, "_collections", {"rag_chunks": object()})
+    monkeypatch.setattr(MilvusVectorStore, "_collection", classmethod(lambda cls, name: loaded.append(name)))
+    manifest = {"collection": "rag_chunks", "total_rows": 0, "codec": "zlib", "vector_field": "embedding_vector",
+                "dim": 4, "schema": {"fields": []}, "indexes": [], "parts": []}
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    FakeCollection.created = []
+
+    StorageManager(str(tmp_path / "storage")).restore_snapshot(str(tmp_path))
+    assert client.aliases == {} and client.collections == {"other"}
+    assert FakeCollection.created == [("rag_chunks", "schema")]
+    assert "rag_chunks" not in MilvusVectorStore._collections and loaded == ["rag_chunks"]